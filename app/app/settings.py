@@ -1,5 +1,6 @@
 from pathlib import Path
 import os 
+import tempfile
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -30,6 +31,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     "core" ,
     "user" , 
     'rest_framework.authtoken',
@@ -38,6 +40,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so the time of every other middleware is measured
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.QueryCheckMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -66,6 +71,16 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'app.wsgi.application'
+ASGI_APPLICATION = 'app.asgi.application'
+
+# "wsgi" (uWSGI) or "asgi" (uvicorn), picked by scripts/run.sh
+SERVER_MODE = os.environ.get("SERVER_MODE", "wsgi")
+
+# Route recipe reads and token logins to the async views; they only pay
+# off under ASGI, where a sync view would tie up a thread per request.
+ASYNC_VIEWS = bool(int(
+    os.environ.get("ASYNC_VIEWS", int(SERVER_MODE == "asgi"))
+))
 
 
 # Database
@@ -76,9 +91,112 @@ DATABASES = {
         'ENGINE': 'django.db.backends.postgresql',
         'NAME': os.environ.get("DB_NAME"),
         'HOST': os.environ.get("DB_HOST"),
+        'PORT': os.environ.get("DB_PORT", ""),
         'USER': os.environ.get("DB_USER"),
         'PASSWORD': os.environ.get("DB_PASS"),
+        # Keep connections open between requests instead of paying the
+        # connect + auth round trips on each one. Under ASGI every request
+        # runs its sync code on a fresh thread, so a persistent connection
+        # would never be reused; pool with pgbouncer there instead.
+        'CONN_MAX_AGE': int(
+            os.environ.get("DB_CONN_MAX_AGE")
+            or (60 if SERVER_MODE == "wsgi" else 0)
+        ),
+        # Check a reused connection before the first query of a request
+        # so a restarted database does not fail one request per worker.
+        'CONN_HEALTH_CHECKS': bool(int(
+            os.environ.get("DB_CONN_HEALTH_CHECKS", 1)
+        )),
+        # pgbouncer in transaction mode cannot keep the named cursors
+        # behind QuerySet.iterator() open across transactions.
+        'DISABLE_SERVER_SIDE_CURSORS': bool(int(
+            os.environ.get("DB_DISABLE_SERVER_SIDE_CURSORS", 0)
+        )),
+    }
+}
+
+
+# Caches
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+
+# Optional cache shared by every worker, e.g.
+# SHARED_CACHE_BACKEND=django.core.cache.backends.redis.RedisCache
+# SHARED_CACHE_LOCATION=redis://redis:6379
+if os.environ.get("SHARED_CACHE_BACKEND"):
+    CACHES['shared'] = {
+        'BACKEND': os.environ.get("SHARED_CACHE_BACKEND"),
+        'LOCATION': os.environ.get("SHARED_CACHE_LOCATION", ""),
     }
+
+# Per-view request metrics recorded by core.middleware and served on
+# /metrics; each worker publishes its totals to DIR every FLUSH_INTERVAL
+# seconds. TOKEN is required when enabled and sent as a Bearer token.
+METRICS = {
+    "ENABLED": bool(int(os.environ.get("METRICS_ENABLED", 0))),
+    "DIR": os.environ.get(
+        "METRICS_DIR", os.path.join(tempfile.gettempdir(), "api-metrics")
+    ),
+    "FLUSH_INTERVAL": int(os.environ.get("METRICS_FLUSH_INTERVAL", 5)),
+    "TOKEN": os.environ.get("METRICS_TOKEN", ""),
+    "BUCKETS": [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10],
+}
+
+# N+1 / slow query detector for development and staging, see
+# core.middleware.QueryCheckMiddleware. Flags query shapes repeated
+# REPEAT_THRESHOLD times, statements over SLOW_QUERY_MS and views over
+# their declared query_budget, naming the frame in APPS that ran them.
+# The test runner turns it on with RAISE; see core.test_runner.
+QUERY_CHECK = {
+    "ENABLED": bool(int(os.environ.get("QUERY_CHECK_ENABLED", 0))),
+    "REPEAT_THRESHOLD": int(os.environ.get("QUERY_CHECK_REPEAT", 5)),
+    "SLOW_QUERY_MS": int(os.environ.get("QUERY_CHECK_SLOW_MS", 100)),
+    "APPS": ["recipe", "user"],
+    "RAISE": bool(int(os.environ.get("QUERY_CHECK_RAISE", 0))),
+}
+
+TEST_RUNNER = 'core.test_runner.QueryCheckRunner'
+
+# Token -> user lookups cached by core.authentication
+TOKEN_AUTH_CACHE = {
+    "MAXSIZE": int(os.environ.get("TOKEN_AUTH_CACHE_SIZE", 10000)),
+    "TTL": int(os.environ.get("TOKEN_AUTH_CACHE_TTL", 30)),
+    "SHARED_TTL": int(os.environ.get("TOKEN_AUTH_CACHE_SHARED_TTL", 300)),
+    "BACKEND": "shared" if "shared" in CACHES else None,
+}
+
+# API token lifetime. Stored tokens expire TTL seconds after their last
+# refresh, which requests slide forward at most every REFRESH_AFTER
+# seconds. SIGNED issues stateless HMAC tokens instead of stored ones.
+AUTH_TOKENS = {
+    "TTL": int(os.environ.get("AUTH_TOKEN_TTL", 14 * 24 * 3600)),
+    "REFRESH_AFTER": int(os.environ.get("AUTH_TOKEN_REFRESH_AFTER", 3600)),
+    "SIGNED": bool(int(os.environ.get("AUTH_TOKEN_SIGNED", 0))),
+}
+
+# Serialized list bodies cached by recipe.caching, keyed by ETag
+LIST_RESPONSE_CACHE = {
+    "TTL": int(os.environ.get("LIST_RESPONSE_CACHE_TTL", 300)),
+    "BACKEND": "shared" if "shared" in CACHES else "default",
+}
+
+# ?prefix= / ?fuzzy= lookups on the tag and ingredient lists
+AUTOCOMPLETE = {
+    "LIMIT": int(os.environ.get("AUTOCOMPLETE_LIMIT", 10)),
+    "MAX_LIMIT": int(os.environ.get("AUTOCOMPLETE_MAX_LIMIT", 50)),
+    # Lookups repeat on every keystroke; keep them only briefly.
+    "TTL": int(os.environ.get("AUTOCOMPLETE_TTL", 30)),
+}
+
+# Most used tags / ingredients returned by the usage endpoints
+RECIPE_USAGE = {
+    "LIMIT": int(os.environ.get("RECIPE_USAGE_LIMIT", 20)),
+    "MAX_LIMIT": int(os.environ.get("RECIPE_USAGE_MAX_LIMIT", 200)),
 }
 
 
@@ -100,6 +218,33 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# The first hasher hashes new passwords; the rest still verify existing
+# hashes, which Django upgrades to the first one on the next login.
+# PASSWORD_HASHER=argon2 needs argon2-cffi.
+PASSWORD_HASHER = os.environ.get("PASSWORD_HASHER", "scrypt")
+_PASSWORD_HASHERS = {
+    "scrypt": "django.contrib.auth.hashers.ScryptPasswordHasher",
+    "argon2": "django.contrib.auth.hashers.Argon2PasswordHasher",
+    "pbkdf2": "django.contrib.auth.hashers.PBKDF2PasswordHasher",
+}
+PASSWORD_HASHERS = [_PASSWORD_HASHERS[PASSWORD_HASHER]] + [
+    hasher for name, hasher in _PASSWORD_HASHERS.items()
+    if name != PASSWORD_HASHER
+] + ["django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher"]
+
+# Token bucket limits on /api/user/token/ kept by core.throttling; a
+# burst of 0 turns that limit off.
+LOGIN_RATE_LIMIT = {
+    "EMAIL_BURST": int(os.environ.get("LOGIN_EMAIL_BURST", 5)),
+    "EMAIL_PER_MINUTE": int(os.environ.get("LOGIN_EMAIL_PER_MINUTE", 5)),
+    "IP_BURST": int(os.environ.get("LOGIN_IP_BURST", 20)),
+    "IP_PER_MINUTE": int(os.environ.get("LOGIN_IP_PER_MINUTE", 30)),
+    "MAXSIZE": int(os.environ.get("LOGIN_RATE_LIMIT_SIZE", 100000)),
+}
+
+# Threads the async TokenView hashes passwords on, off the event loop
+LOGIN_THREADS = int(os.environ.get("LOGIN_THREADS", 2))
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/4.2/topics/i18n/
@@ -129,17 +274,92 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL="core.User"
 
+# Keyset pagination for the recipe API
+RECIPE_PAGE_SIZE = int(os.environ.get("RECIPE_PAGE_SIZE", 50))
+RECIPE_MAX_PAGE_SIZE = int(os.environ.get("RECIPE_MAX_PAGE_SIZE", 200))
+# Build recipe list pages from .values() rows (recipe.rows)
+RECIPE_ROW_SERIALIZER = bool(int(os.environ.get("RECIPE_ROW_SERIALIZER", 1)))
+
+# Bulk recipe import / export
+RECIPE_BULK_MAX_ITEMS = int(os.environ.get("RECIPE_BULK_MAX_ITEMS", 5000))
+RECIPE_BULK_CHUNK_SIZE = int(os.environ.get("RECIPE_BULK_CHUNK_SIZE", 500))
+RECIPE_EXPORT_CHUNK_SIZE = int(os.environ.get("RECIPE_EXPORT_CHUNK_SIZE", 1000))
+
+# Resized derivatives generated in the background for uploaded images
+RECIPE_THUMBNAILS = {
+    "WIDTHS": [
+        int(width) for width in
+        os.environ.get("RECIPE_THUMBNAIL_WIDTHS", "160,320,640").split(",")
+    ],
+    "FORMATS": ["webp", "jpeg"],
+    "WORKERS": int(os.environ.get("RECIPE_THUMBNAIL_WORKERS", 2)),
+    # Render inline instead of in the process pool (tests, debugging)
+    "EAGER": bool(int(os.environ.get("RECIPE_THUMBNAILS_EAGER", 0))),
+}
+
+# Limits enforced by recipe.uploads while an image upload streams in
+RECIPE_IMAGE_UPLOAD = {
+    # Matches client_max_body_size in proxy/default.conf.tpl
+    "MAX_BYTES": int(os.environ.get("RECIPE_IMAGE_MAX_BYTES", 10 * 1024 * 1024)),
+    "MAX_PIXELS": int(os.environ.get("RECIPE_IMAGE_MAX_PIXELS", 40_000_000)),
+    "MAX_DIMENSION": int(os.environ.get("RECIPE_IMAGE_MAX_DIMENSION", 10000)),
+    "FORMATS": ["JPEG", "PNG", "WEBP"],
+    # Bytes a user may upload per rolling day; 0 disables the quota
+    "DAILY_QUOTA_BYTES": int(
+        os.environ.get("RECIPE_IMAGE_DAILY_QUOTA_BYTES", 200 * 1024 * 1024)
+    ),
+    "BACKEND": "shared" if "shared" in CACHES else "default",
+}
+
+
+# JSON_BACKEND=orjson needs orjson; without it core.renderers falls back
+# to the stdlib json module.
+JSON_BACKEND = os.environ.get("JSON_BACKEND", "orjson")
+_JSON_BACKENDS = {
+    "orjson": ("core.renderers.ORJSONRenderer", "core.renderers.ORJSONParser"),
+    "json": (
+        "rest_framework.renderers.JSONRenderer",
+        "rest_framework.parsers.JSONParser",
+    ),
+}
+
+# Sliding window request limits kept by core.throttling. "user" and
+# "anon" cover every request of a user / client IP, the other scopes one
+# view action each; an empty rate turns a limit off. BACKEND "uwsgi"
+# keeps the counters in the UWSGI_CACHE shared by the workers of one
+# server (scripts/run.sh creates it) and falls back to the per-process
+# default cache outside uWSGI; any other value names a Django cache.
+API_RATE_LIMIT = {
+    "BACKEND": os.environ.get(
+        "API_RATE_LIMIT_BACKEND", "shared" if "shared" in CACHES else "uwsgi"
+    ),
+    "UWSGI_CACHE": "throttle",
+}
 
 REST_FRAMEWORK = {
     'DEFAULT_PARSER_CLASSES': [
-        'rest_framework.parsers.JSONParser',
+        _JSON_BACKENDS[JSON_BACKEND][1],
         'rest_framework.parsers.FormParser',
         'rest_framework.parsers.MultiPartParser',
     ],
-}
-
-REST_FRAMEWORK = {
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',  # Only allow JSON responses
+        _JSON_BACKENDS[JSON_BACKEND][0],  # Only allow JSON responses
     ],
+    # nginx appends the address it saw to X-Forwarded-For; anything in
+    # front of that entry is sent by the client and can be forged.
+    'NUM_PROXIES': int(os.environ.get("API_NUM_PROXIES", 1)),
+    'DEFAULT_THROTTLE_CLASSES': [
+        'core.throttling.UserRateThrottle',
+        'core.throttling.EndpointRateThrottle',
+    ],
+    'DEFAULT_THROTTLE_RATES': {
+        'user': os.environ.get("API_USER_RATE", "600/min") or None,
+        'anon': os.environ.get("API_ANON_RATE", "60/min") or None,
+        'RecipeViewSet.upload_image':
+            os.environ.get("API_UPLOAD_RATE", "30/min") or None,
+        'RecipeViewSet.bulk':
+            os.environ.get("API_BULK_RATE", "10/min") or None,
+        'RecipeViewSet.export':
+            os.environ.get("API_EXPORT_RATE", "10/min") or None,
+    },
 }
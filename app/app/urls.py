@@ -3,10 +3,13 @@ from django.urls import path, include
 from django.conf.urls.static import static
 from django.conf import settings
 
+from core.views import metrics
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/user/',include('user.urls'),name='user'),
     path('api/recipe/',include('recipe.urls'),name='recipe'),
+    path('metrics', metrics, name='metrics'),
 ]
 
 if settings.DEBUG:
@@ -0,0 +1,65 @@
+"""
+Base class for the async views served under ASGI
+"""
+from django.http import HttpResponse
+from django.views import View
+from rest_framework import status
+from rest_framework.exceptions import (
+    APIException,
+    AuthenticationFailed,
+    NotAuthenticated,
+)
+from rest_framework.settings import api_settings
+
+from core.authentication import CachedTokenAuthentication
+
+
+class AsyncAPIView(View):
+    """Async Django view answering in the same JSON format as the DRF views.
+
+    DRF views are sync only, so async code paths are plain Django views
+    that reuse DRF's renderer, parsers and exceptions.
+    """
+
+    renderer = api_settings.DEFAULT_RENDERER_CLASSES[0]()
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+        # Clients authenticate with tokens, as with every DRF APIView.
+        view.csrf_exempt = True
+        return view
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            return await super().dispatch(request, *args, **kwargs)
+        except APIException as exc:
+            return self.handle_exception(exc)
+
+    async def authenticate(self, request):
+        """Return (user, token) for the request's token or raise 401"""
+        user_auth = await CachedTokenAuthentication().aauthenticate(request)
+        if user_auth is None:
+            raise NotAuthenticated()
+        return user_auth
+
+    def render(self, data, status_code=status.HTTP_200_OK):
+        """Return a JSON response like DRF's Response would render"""
+        return HttpResponse(
+            self.renderer.render(data),
+            status=status_code,
+            content_type=self.renderer.media_type,
+        )
+
+    def handle_exception(self, exc):
+        """Turn an APIException into DRF's error body"""
+        if isinstance(exc.detail, (list, dict)):
+            data = exc.detail
+        else:
+            data = {"detail": exc.detail}
+        response = self.render(data, exc.status_code)
+        if isinstance(exc, (NotAuthenticated, AuthenticationFailed)):
+            response["WWW-Authenticate"] = CachedTokenAuthentication.keyword
+        if getattr(exc, "wait", None):
+            response["Retry-After"] = "%d" % exc.wait
+        return response
@@ -0,0 +1,314 @@
+"""
+Authentication classes for the API
+"""
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.core.cache import caches
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework.authentication import (
+    TokenAuthentication,
+    get_authorization_header,
+)
+from rest_framework.exceptions import AuthenticationFailed
+
+from core.tokens import is_expired, is_signed, refresh_due, unsign_token
+
+
+class LRUCache:
+    """Thread-safe in-process LRU cache whose entries expire after a TTL"""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached value or None if missing or expired"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        """Store a value, evicting the least recently used entry if full"""
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        """Drop a key if present"""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        """Drop every entry"""
+        with self._lock:
+            self._data.clear()
+
+
+class CacheStats:
+    """Hit / miss counters for a cache"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def record(self, outcome):
+        """Count one lookup; outcome is "local", "shared" or "miss" """
+        with self._lock:
+            self.counts[outcome] += 1
+
+    def reset(self):
+        """Zero the counters"""
+        with self._lock:
+            self.counts = {"local": 0, "shared": 0, "miss": 0}
+
+    def snapshot(self):
+        """Return the counters and the overall hit ratio"""
+        with self._lock:
+            counts = dict(self.counts)
+        total = sum(counts.values())
+        hits = counts["local"] + counts["shared"]
+        counts["hit_ratio"] = hits / total if total else 0.0
+        return counts
+
+
+token_cache = LRUCache(
+    settings.TOKEN_AUTH_CACHE["MAXSIZE"],
+    settings.TOKEN_AUTH_CACHE["TTL"],
+)
+token_cache_stats = CacheStats()
+
+
+def _shared_cache():
+    """Return the optional cache backend shared between workers"""
+    alias = settings.TOKEN_AUTH_CACHE["BACKEND"]
+    return caches[alias] if alias else None
+
+
+def token_cache_key(key):
+    """Cache key for a token; the raw token never leaves the process"""
+    return "auth-token:" + hashlib.sha256(key.encode()).hexdigest()
+
+
+def user_cache_key(user_id):
+    """Cache key for the user behind signed tokens"""
+    return f"auth-user:{user_id}"
+
+
+def invalidate_tokens(keys):
+    """Forget the cached users for the given token keys"""
+    _invalidate([token_cache_key(key) for key in keys])
+
+
+def invalidate_user(user_id):
+    """Forget the cached user checked by signed tokens"""
+    _invalidate([user_cache_key(user_id)])
+
+
+def _invalidate(cache_keys):
+    for cache_key in cache_keys:
+        token_cache.delete(cache_key)
+    shared = _shared_cache()
+    if shared is not None and cache_keys:
+        shared.delete_many(cache_keys)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Token authentication that caches the token -> user lookup.
+
+    Lookups hit an in-process LRU first, then the optional shared cache,
+    and only fall back to the database on a miss. Entries are dropped
+    when the token is deleted or its user is saved; other workers' local
+    entries expire after TOKEN_AUTH_CACHE["TTL"] seconds.
+
+    Stored tokens expire AUTH_TOKENS["TTL"] seconds after they were last
+    refreshed, and are refreshed at most every REFRESH_AFTER seconds of
+    use. Signed tokens (see core.tokens) are verified without the token
+    table; only their user is looked up, through the same caches.
+    """
+
+    def authenticate_credentials(self, key):
+        if is_signed(key):
+            user_id, version = self._unsign(key)
+            user = self._cached(
+                user_cache_key(user_id), lambda: self._load_user(user_id)
+            )
+            return self._signed_user(user, version, key)
+
+        cache_key = token_cache_key(key)
+        cached = self._cached(
+            cache_key,
+            lambda: TokenAuthentication.authenticate_credentials(self, key),
+        )
+        now = timezone.now()
+        if self._refresh_due(cached[1], now):
+            self.get_model().objects.filter(key=key).update(created=now)
+            cached = self._refreshed(cached, now)
+            self._store(cache_key, cached)
+        return self._hand_out(cached)
+
+    def _cached(self, cache_key, load):
+        """Return the cached value, calling load() on a miss"""
+        shared = _shared_cache()
+        cached = token_cache.get(cache_key)
+        if cached is not None:
+            token_cache_stats.record("local")
+        elif shared is not None and \
+                (cached := shared.get(cache_key)) is not None:
+            token_cache_stats.record("shared")
+            token_cache.set(cache_key, cached)
+        else:
+            token_cache_stats.record("miss")
+            cached = load()
+            self._store(cache_key, cached)
+        return cached
+
+    def _store(self, cache_key, cached):
+        token_cache.set(cache_key, cached)
+        shared = _shared_cache()
+        if shared is not None:
+            shared.set(
+                cache_key, cached, settings.TOKEN_AUTH_CACHE["SHARED_TTL"]
+            )
+
+    def _load_user(self, user_id):
+        user = get_user_model().objects.filter(pk=user_id).first()
+        if user is None:
+            raise AuthenticationFailed(_("Invalid token."))
+        return user
+
+    def _unsign(self, key):
+        try:
+            return unsign_token(key)
+        except signing.SignatureExpired:
+            raise AuthenticationFailed(_("Token has expired."))
+        except (signing.BadSignature, ValueError):
+            raise AuthenticationFailed(_("Invalid token."))
+
+    def _signed_user(self, user, version, key):
+        """Check a signed token against its user's current state"""
+        if not user.is_active:
+            raise AuthenticationFailed(_("User inactive or deleted."))
+        if user.token_version != version:
+            raise AuthenticationFailed(_("Token has been revoked."))
+        return (copy.copy(user), key)
+
+    def _refresh_due(self, token, now):
+        """Raise if a stored token expired; say if it is due a refresh"""
+        if is_expired(token, now):
+            raise AuthenticationFailed(_("Token has expired."))
+        return refresh_due(token, now)
+
+    def _refreshed(self, cached, now):
+        user, token = cached
+        token = copy.copy(token)
+        token.created = now
+        return (user, token)
+
+    def _hand_out(self, cached):
+        # Hand out copies so a request mutating request.user cannot leak
+        # into the cached instance used by concurrent requests.
+        user, token = (copy.copy(obj) for obj in cached)
+        token.user = user
+        return (user, token)
+
+    async def aauthenticate(self, request):
+        """authenticate() for async views, using the async cache and ORM"""
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) == 1:
+            raise AuthenticationFailed(
+                _("Invalid token header. No credentials provided.")
+            )
+        elif len(auth) > 2:
+            raise AuthenticationFailed(
+                _("Invalid token header. Token string should not contain "
+                  "spaces.")
+            )
+        try:
+            key = auth[1].decode()
+        except UnicodeError:
+            raise AuthenticationFailed(
+                _("Invalid token header. Token string should not contain "
+                  "invalid characters.")
+            )
+        return await self.aauthenticate_credentials(key)
+
+    async def aauthenticate_credentials(self, key):
+        if is_signed(key):
+            user_id, version = self._unsign(key)
+            user = await self._acached(
+                user_cache_key(user_id), lambda: self._aload_user(user_id)
+            )
+            return self._signed_user(user, version, key)
+
+        cache_key = token_cache_key(key)
+        cached = await self._acached(
+            cache_key, lambda: self._aload_token(key)
+        )
+        now = timezone.now()
+        if self._refresh_due(cached[1], now):
+            await self.get_model().objects.filter(key=key).aupdate(
+                created=now
+            )
+            cached = self._refreshed(cached, now)
+            await self._astore(cache_key, cached)
+        return self._hand_out(cached)
+
+    async def _acached(self, cache_key, aload):
+        shared = _shared_cache()
+        cached = token_cache.get(cache_key)
+        if cached is not None:
+            token_cache_stats.record("local")
+        elif shared is not None and \
+                (cached := await shared.aget(cache_key)) is not None:
+            token_cache_stats.record("shared")
+            token_cache.set(cache_key, cached)
+        else:
+            token_cache_stats.record("miss")
+            cached = await aload()
+            await self._astore(cache_key, cached)
+        return cached
+
+    async def _astore(self, cache_key, cached):
+        token_cache.set(cache_key, cached)
+        shared = _shared_cache()
+        if shared is not None:
+            await shared.aset(
+                cache_key, cached, settings.TOKEN_AUTH_CACHE["SHARED_TTL"]
+            )
+
+    async def _aload_user(self, user_id):
+        user = await get_user_model().objects.filter(pk=user_id).afirst()
+        if user is None:
+            raise AuthenticationFailed(_("Invalid token."))
+        return user
+
+    async def _aload_token(self, key):
+        model = self.get_model()
+        try:
+            token = await model.objects.select_related("user").aget(key=key)
+        except model.DoesNotExist:
+            raise AuthenticationFailed(_("Invalid token."))
+        if not token.user.is_active:
+            raise AuthenticationFailed(_("User inactive or deleted."))
+        return (token.user, token)
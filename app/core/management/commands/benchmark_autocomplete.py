@@ -0,0 +1,92 @@
+"""
+Django command to measure tag / ingredient autocomplete latency
+"""
+import random
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from recipe.autocomplete import trigram_available
+from recipe.views import IngredientViewSet, TagViewSet
+
+
+def percentile(timings, pct):
+    ordered = sorted(timings)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class Command(BaseCommand):
+    help = "Report p50 / p99 latency of ?prefix= and ?fuzzy= lookups " \
+           "(seed data first with seed_recipes)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--email",
+                            help="user to query (default: most tags)")
+        parser.add_argument("--requests", type=int, default=200)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def _terms(self, names, mode, rng):
+        """Keystroke-like terms: prefixes, or names with one typo"""
+        terms = []
+        for _ in range(self.requests):
+            name = rng.choice(names)
+            if mode == "prefix":
+                terms.append(name[:rng.randint(1, min(len(name), 6))])
+            else:
+                i = rng.randrange(len(name))
+                terms.append(name[:i] + name[i + 1:] or name)
+        return terms
+
+    def _time(self, viewset, mode, terms, cold):
+        view = viewset.as_view({"get": "list"})
+        factory = APIRequestFactory()
+        cache = caches[settings.LIST_RESPONSE_CACHE["BACKEND"]]
+        host = (settings.ALLOWED_HOSTS or ["localhost"])[0].lstrip(".")
+        timings = []
+        for term in terms:
+            if cold:
+                cache.clear()
+            request = factory.get("/", {mode: term}, HTTP_HOST=host)
+            force_authenticate(request, self.user)
+            start = time.perf_counter()
+            response = view(request)
+            response.render()
+            timings.append((time.perf_counter() - start) * 1000)
+        return timings
+
+    def handle(self, *args, **options):
+        users = get_user_model().objects
+        if options["email"]:
+            self.user = users.get(email=options["email"])
+        else:
+            self.user = users.annotate(n=Count("tag")).order_by("-n").first()
+        if self.user is None:
+            raise CommandError("no users; run seed_recipes first")
+        self.requests = options["requests"]
+        self.stdout.write(
+            f"user={self.user.email} pg_trgm={trigram_available()}"
+        )
+
+        for viewset, related in [(TagViewSet, self.user.tag_set),
+                                 (IngredientViewSet, self.user.ingredient_set)]:
+            names = list(related.values_list("name", flat=True))
+            if not names:
+                continue
+            label = viewset.__name__.replace("ViewSet", "").lower()
+            for mode in ("prefix", "fuzzy"):
+                terms = self._terms(names, mode, random.Random(options["seed"]))
+                for cold in (True, False):
+                    timings = self._time(viewset, mode, terms, cold)
+                    self.stdout.write(
+                        f"{label:<11} {mode:<7} "
+                        f"{'cold' if cold else 'cached':<7} "
+                        f"n={len(names):<6} "
+                        f"p50={statistics.median(timings):7.2f}ms "
+                        f"p99={percentile(timings, 99):7.2f}ms"
+                    )
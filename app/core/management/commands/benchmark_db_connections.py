@@ -0,0 +1,111 @@
+"""
+Django command to measure what per-request database connections cost
+"""
+import io
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.db import connection
+from django.db.models import Count
+from rest_framework.authtoken.models import Token
+
+from core.management.commands.benchmark_autocomplete import percentile
+
+
+class Command(BaseCommand):
+    help = "Report API p50 / p99 latency with and without persistent " \
+           "database connections (seed data first with seed_recipes)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--path", default="/api/recipe/recipes/")
+        parser.add_argument("--requests", type=int, default=500)
+        parser.add_argument("--email",
+                            help="user to query (default: most recipes)")
+
+    def _environ(self, path, token):
+        host = (settings.ALLOWED_HOSTS or ["localhost"])[0].lstrip(".")
+        return {
+            "REQUEST_METHOD": "GET",
+            "PATH_INFO": path,
+            "QUERY_STRING": "",
+            "SERVER_NAME": host,
+            "SERVER_PORT": "80",
+            "HTTP_HOST": host,
+            "HTTP_AUTHORIZATION": f"Token {token.key}",
+            "wsgi.url_scheme": "http",
+            "wsgi.input": io.BytesIO(),
+            "wsgi.errors": io.StringIO(),
+        }
+
+    def _time(self, application, environ):
+        """Run requests through the WSGI handler, which opens and closes
+        connections per CONN_MAX_AGE on request_started / finished"""
+        statuses = []
+
+        def start_response(status, headers):
+            statuses.append(status)
+
+        timings = []
+        for _ in range(self.requests):
+            start = time.perf_counter()
+            response = application(dict(environ), start_response)
+            b"".join(response)
+            response.close()
+            timings.append((time.perf_counter() - start) * 1000)
+        if not statuses[-1].startswith("200"):
+            raise CommandError(f"{environ['PATH_INFO']}: {statuses[-1]}")
+        return timings
+
+    def _connect_timings(self):
+        timings = []
+        for _ in range(min(self.requests, 100)):
+            connection.close()
+            start = time.perf_counter()
+            connection.ensure_connection()
+            timings.append((time.perf_counter() - start) * 1000)
+        return timings
+
+    def handle(self, *args, **options):
+        users = get_user_model().objects
+        if options["email"]:
+            user = users.get(email=options["email"])
+        else:
+            user = users.annotate(n=Count("recipe")).order_by("-n").first()
+        if user is None:
+            raise CommandError("no users; run seed_recipes first")
+        token, created = Token.objects.get_or_create(user=user)
+        self.requests = options["requests"]
+        application = get_wsgi_application()
+        environ = self._environ(options["path"], token)
+
+        timings = self._connect_timings()
+        self.stdout.write(
+            f"connect      p50={statistics.median(timings):7.2f}ms "
+            f"p99={percentile(timings, 99):7.2f}ms"
+        )
+
+        db_settings = connection.settings_dict
+        original = (db_settings["CONN_MAX_AGE"],
+                    db_settings["CONN_HEALTH_CHECKS"])
+        try:
+            for max_age, health_checks in [(0, False), (60, False),
+                                           (60, True)]:
+                connection.close()
+                db_settings["CONN_MAX_AGE"] = max_age
+                db_settings["CONN_HEALTH_CHECKS"] = health_checks
+                self._time(application, environ)  # warm caches
+                timings = self._time(application, environ)
+                self.stdout.write(
+                    f"max_age={max_age:<3} "
+                    f"checks={'on' if health_checks else 'off':<3} "
+                    f"p50={statistics.median(timings):7.2f}ms "
+                    f"p99={percentile(timings, 99):7.2f}ms"
+                )
+        finally:
+            connection.close()
+            db_settings["CONN_MAX_AGE"], db_settings["CONN_HEALTH_CHECKS"] = \
+                original
@@ -0,0 +1,184 @@
+"""
+Django command to measure peak memory of recipe image uploads
+"""
+import multiprocessing
+import os
+import resource
+import struct
+import tempfile
+import warnings
+import zlib
+
+from django.core.management.base import BaseCommand
+
+BOUNDARY = "BenchmarkBoundary"
+
+MODES = {
+    "default": "Django's default upload handlers",
+    "streaming": "recipe.uploads.ImageUploadHandler",
+}
+
+
+def _png_chunk(kind, data):
+    body = kind + data
+    return struct.pack(">I", len(data)) + body + \
+        struct.pack(">I", zlib.crc32(body))
+
+
+def write_png_bomb(fileobj, width, height):
+    """Write a small PNG of zeros that decodes to width x height RGB"""
+    ihdr = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    fileobj.write(b"\x89PNG\r\n\x1a\n" + _png_chunk(b"IHDR", ihdr))
+    compressor = zlib.compressobj(9)
+    row = b"\0" * (1 + width * 3)
+    data = b"".join(compressor.compress(row) for _ in range(height))
+    fileobj.write(_png_chunk(b"IDAT", data + compressor.flush()))
+    fileobj.write(_png_chunk(b"IEND", b""))
+
+
+def write_photo(fileobj, width, height):
+    """Write a noisy JPEG that compresses about as badly as a photo"""
+    from PIL import Image
+
+    pixels = os.urandom(width * height * 3)
+    noise = Image.frombytes("RGB", (width, height), pixels)
+    noise.save(fileobj, format="JPEG", quality=85)
+
+
+def write_body(path, name, image):
+    """Write a multipart body holding the image file"""
+    with open(path, "wb") as body:
+        body.write(
+            f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="image"; '
+            f'filename="{name}"\r\nContent-Type: application/octet-stream'
+            f"\r\n\r\n".encode()
+        )
+        with open(image, "rb") as source:
+            while chunk := source.read(1024 * 1024):
+                body.write(chunk)
+        body.write(f"\r\n--{BOUNDARY}--\r\n".encode())
+
+
+def _status_kb(field):
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith(field + ":"):
+                return int(line.split()[1])
+
+
+def reset_peak():
+    """Reset the peak RSS to the current RSS and return it in KiB"""
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+        return _status_kb("VmRSS")
+    except OSError:
+        # No procfs: fall back to the lifetime peak.
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def peak_kb():
+    """Return the peak RSS since reset_peak() in KiB"""
+    try:
+        return _status_kb("VmHWM")
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def measure(mode, body_path, decode, results):
+    """Parse and validate one upload in a fresh process"""
+    import django
+    django.setup()
+
+    from django import forms
+    from django.conf import settings
+    from django.core.exceptions import ValidationError
+    from django.http.multipartparser import MultiPartParser
+    from django.utils.module_loading import import_string
+    from PIL import Image
+    from rest_framework.exceptions import ValidationError as APIValidationError
+
+    from recipe.uploads import ImageUploadHandler
+
+    # The default path lets a bomb through with only this warning.
+    warnings.simplefilter("ignore", Image.DecompressionBombWarning)
+    if mode == "streaming":
+        handlers = [ImageUploadHandler()]
+    else:
+        handlers = [import_string(h)() for h in settings.FILE_UPLOAD_HANDLERS]
+    meta = {
+        "CONTENT_TYPE": f"multipart/form-data; boundary={BOUNDARY}",
+        "CONTENT_LENGTH": os.path.getsize(body_path),
+    }
+
+    baseline = reset_peak()
+    outcome = "accepted"
+    try:
+        with open(body_path, "rb") as stream:
+            _, files = MultiPartParser(meta, stream, handlers).parse()
+        # What the serializer's ImageField runs on the upload.
+        upload = forms.ImageField().clean(files["image"])
+        if decode:
+            # What the thumbnail worker does with an accepted image.
+            upload.seek(0)
+            with Image.open(upload) as image:
+                image.load()
+    except APIValidationError as exc:
+        outcome = f"rejected: {exc.detail['image'][0]}"
+    except (ValidationError, Image.DecompressionBombError) as exc:
+        outcome = f"rejected: {exc}"
+    results.put((outcome, peak_kb() - baseline))
+
+
+class Command(BaseCommand):
+    help = "Compare peak RSS of image uploads with the default and the " \
+           "streaming upload handlers"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--width", type=int, default=3000,
+                            help="width of the photo upload")
+        parser.add_argument("--height", type=int, default=2000,
+                            help="height of the photo upload")
+        parser.add_argument("--bomb", type=int, default=12000,
+                            help="side of the decompression bomb upload")
+        parser.add_argument("--decode", action="store_true",
+                            help="also decode accepted images as the "
+                                 "thumbnail worker would")
+
+    def _run(self, context, mode, body_path, decode):
+        results = context.Queue()
+        process = context.Process(
+            target=measure, args=(mode, body_path, decode, results)
+        )
+        process.start()
+        outcome, peak = results.get()
+        process.join()
+        return outcome, peak
+
+    def handle(self, *args, **options):
+        context = multiprocessing.get_context("spawn")
+        for mode, description in MODES.items():
+            self.stdout.write(f"{mode:<10} {description}")
+        with tempfile.TemporaryDirectory() as tmp:
+            samples = {}
+            photo = os.path.join(tmp, "photo.jpg")
+            with open(photo, "wb") as fileobj:
+                write_photo(fileobj, options["width"], options["height"])
+            samples["photo"] = photo
+            bomb = os.path.join(tmp, "bomb.png")
+            with open(bomb, "wb") as fileobj:
+                write_png_bomb(fileobj, options["bomb"], options["bomb"])
+            samples["bomb"] = bomb
+
+            for sample, image in samples.items():
+                body_path = os.path.join(tmp, f"{sample}.body")
+                write_body(body_path, os.path.basename(image), image)
+                size = os.path.getsize(image) / 1024 / 1024
+                for mode in MODES:
+                    outcome, peak = self._run(
+                        context, mode, body_path, options["decode"]
+                    )
+                    self.stdout.write(
+                        f"{sample:<6} {size:6.1f}MB {mode:<10} "
+                        f"peak_rss=+{peak / 1024:8.1f}MB {outcome}"
+                    )
@@ -0,0 +1,87 @@
+"""
+Django command to compare JSON rendering and parsing backends
+"""
+import io
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+
+from core.models import Recipe
+from core.renderers import ORJSONParser, ORJSONRenderer, orjson
+from recipe.querysets import optimize_for_serializer
+from recipe.serializers import RecipeSerializer
+
+BACKENDS = [
+    ("json", JSONRenderer(), JSONParser()),
+    ("orjson", ORJSONRenderer(), ORJSONParser()),
+]
+
+
+class Command(BaseCommand):
+    help = "Report render / parse throughput of serialized recipe lists " \
+           "per JSON backend (seed data first with seed_recipes)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--email",
+                            help="user to query (default: most recipes)")
+        parser.add_argument("--sizes", default="100,1000,10000",
+                            help="recipes per rendered list")
+        parser.add_argument("--repeat", type=int, default=10)
+
+    def _median(self, func, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - start) * 1000)
+        return statistics.median(timings)
+
+    def handle(self, *args, **options):
+        users = get_user_model().objects
+        if options["email"]:
+            user = users.get(email=options["email"])
+        else:
+            user = users.annotate(n=Count("recipe")).order_by("-n").first()
+        if user is None:
+            raise CommandError("no users; run seed_recipes first")
+        if orjson is None:
+            self.stdout.write("orjson is not installed; both backends "
+                              "use the stdlib json module")
+
+        request = APIRequestFactory().get("/api/recipe/recipes/")
+        repeat = options["repeat"]
+        for size in [int(size) for size in options["sizes"].split(",")]:
+            serializer = RecipeSerializer(many=True,
+                                          context={"request": request})
+            queryset = optimize_for_serializer(
+                Recipe.objects.filter(user=user).order_by("-id"),
+                serializer.child,
+            )[:size]
+            serializer.instance = queryset
+            start = time.perf_counter()
+            data = serializer.data
+            serialize_ms = (time.perf_counter() - start) * 1000
+
+            body = JSONRenderer().render(data)
+            self.stdout.write(
+                f"recipes={len(data):<6} bytes={len(body):<10} "
+                f"serialize={serialize_ms:9.2f}ms"
+            )
+            for name, renderer, parser in BACKENDS:
+                render_ms = self._median(lambda: renderer.render(data),
+                                         repeat)
+                parse_ms = self._median(
+                    lambda: parser.parse(io.BytesIO(body), None, {}), repeat
+                )
+                self.stdout.write(
+                    f"  {name:<7} render={render_ms:8.2f}ms "
+                    f"({len(body) / render_ms / 1000:7.1f} MB/s) "
+                    f"parse={parse_ms:8.2f}ms "
+                    f"({len(body) / parse_ms / 1000:7.1f} MB/s)"
+                )
@@ -0,0 +1,102 @@
+"""
+Django command to measure token login throughput per password hasher
+"""
+import statistics
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import get_hasher, make_password
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import override_settings
+from rest_framework.test import APIRequestFactory
+
+from core.management.commands.benchmark_autocomplete import percentile
+from user.views import TokenView
+
+EMAIL = "benchmark-login@example.com"
+PASSWORD = "benchmark-pass-123"
+
+
+class Command(BaseCommand):
+    help = "Report TokenView logins per second and latency for each " \
+           "password hasher"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--hashers",
+                            default="pbkdf2_sha256,scrypt,argon2")
+        parser.add_argument("--logins", type=int, default=40)
+        parser.add_argument("--threads", type=int, default=4,
+                            help="concurrent logins, like busy workers")
+
+    def _login(self, view, factory, timings, errors):
+        try:
+            for _ in range(self.logins // self.threads):
+                request = factory.post(
+                    "/api/user/token/",
+                    {"email": EMAIL, "password": PASSWORD},
+                    REMOTE_ADDR="127.0.0.1",
+                )
+                start = time.perf_counter()
+                response = view(request)
+                elapsed = (time.perf_counter() - start) * 1000
+                if response.status_code == 200:
+                    timings.append(elapsed)
+                else:
+                    errors.append(response.status_code)
+        finally:
+            connection.close()
+
+    def handle(self, *args, **options):
+        self.logins = options["logins"]
+        self.threads = options["threads"]
+        user, created = get_user_model().objects.get_or_create(email=EMAIL)
+        view = TokenView.as_view()
+        factory = APIRequestFactory()
+        unlimited = {**settings.LOGIN_RATE_LIMIT, "IP_BURST": 0,
+                     "EMAIL_BURST": 0}
+
+        try:
+            for name in options["hashers"].split(","):
+                hasher = get_hasher(name)
+                path = f"{type(hasher).__module__}.{type(hasher).__name__}"
+                # Prefer it, so logins do not rehash to another hasher.
+                hashers = [path] + [
+                    other for other in settings.PASSWORD_HASHERS
+                    if other != path
+                ]
+                with override_settings(PASSWORD_HASHERS=hashers,
+                                       LOGIN_RATE_LIMIT=unlimited):
+                    try:
+                        user.password = make_password(PASSWORD)
+                    except ValueError as exc:
+                        self.stdout.write(f"{name:<13} {exc}")
+                        continue
+                    user.save(update_fields=["password"])
+
+                    timings, errors = [], []
+                    workers = [
+                        threading.Thread(
+                            target=self._login,
+                            args=(view, factory, timings, errors),
+                        )
+                        for _ in range(self.threads)
+                    ]
+                    start = time.perf_counter()
+                    for worker in workers:
+                        worker.start()
+                    for worker in workers:
+                        worker.join()
+                    elapsed = time.perf_counter() - start
+
+                self.stdout.write(
+                    f"{name:<13} threads={self.threads} "
+                    f"logins/s={len(timings) / elapsed:7.1f} "
+                    f"p50={statistics.median(timings or [0]):7.1f}ms "
+                    f"p99={percentile(timings or [0], 99):7.1f}ms "
+                    f"errors={len(errors)}"
+                )
+        finally:
+            user.delete()
@@ -0,0 +1,73 @@
+"""
+Django command to benchmark the recipe tag / ingredient filters
+"""
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+
+from core.models import Recipe
+from recipe.querysets import related_ids_filter
+
+
+class Command(BaseCommand):
+    help = "Compare join, DISTINCT, EXISTS and match=all recipe filters " \
+           "(seed data first with seed_recipes)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--email",
+                            help="user to query (default: most recipes)")
+        parser.add_argument("--tags", type=int, default=3,
+                            help="number of tag ids to filter on")
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def _time(self, label, queryset, repeat):
+        """Run a query repeatedly and report its median latency"""
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            rows = list(queryset.values_list("id", flat=True))
+            timings.append((time.perf_counter() - start) * 1000)
+        self.stdout.write(
+            f"{label:<28} rows={len(rows):<8} unique={len(set(rows)):<8} "
+            f"median={statistics.median(timings):8.2f}ms "
+            f"max={max(timings):8.2f}ms"
+        )
+
+    def handle(self, *args, **options):
+        users = get_user_model().objects
+        if options["email"]:
+            user = users.get(email=options["email"])
+        else:
+            user = users.annotate(n=Count("recipe")).order_by("-n").first()
+        if user is None:
+            raise CommandError("no users; run seed_recipes first")
+
+        tag_ids = list(
+            user.tag_set.annotate(n=Count("recipe"))
+            .order_by("-n")
+            .values_list("id", flat=True)[:options["tags"]]
+        )
+        base = Recipe.objects.filter(user=user).order_by("-id")
+        self.stdout.write(
+            f"user={user.email} recipes={base.count()} tags={tag_ids}"
+        )
+
+        chained = base
+        for tag_id in tag_ids:
+            chained = chained.filter(tags__id=tag_id)
+
+        repeat = options["repeat"]
+        self._time("any: join", base.filter(tags__id__in=tag_ids), repeat)
+        self._time("any: join + distinct",
+                   base.filter(tags__id__in=tag_ids).distinct(), repeat)
+        self._time("any: exists",
+                   base.filter(related_ids_filter(Recipe, "tags", tag_ids)),
+                   repeat)
+        self._time("all: chained joins", chained, repeat)
+        self._time("all: grouped subquery",
+                   base.filter(related_ids_filter(
+                       Recipe, "tags", tag_ids, match_all=True)),
+                   repeat)
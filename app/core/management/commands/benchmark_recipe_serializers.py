@@ -0,0 +1,72 @@
+"""
+Django command to compare the DRF and .values() recipe list serializers
+"""
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+
+from core.models import Recipe
+from recipe.querysets import optimize_for_serializer
+from recipe.rows import RowSerializer
+from recipe.serializers import RecipeSerializer
+
+
+class Command(BaseCommand):
+    help = "Report the time to load and serialize recipe lists with " \
+           "RecipeSerializer and RowSerializer (seed data first with " \
+           "seed_recipes)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--email",
+                            help="user to query (default: most recipes)")
+        parser.add_argument("--sizes", default="50,1000,10000",
+                            help="recipes per list")
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def _time(self, func, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            data = func()
+            timings.append((time.perf_counter() - start) * 1000)
+        return data, statistics.median(timings)
+
+    def handle(self, *args, **options):
+        users = get_user_model().objects
+        if options["email"]:
+            user = users.get(email=options["email"])
+        else:
+            user = users.annotate(n=Count("recipe")).order_by("-n").first()
+        if user is None:
+            raise CommandError("no users; run seed_recipes first")
+
+        request = APIRequestFactory().get("/api/recipe/recipes/")
+        serializer = RecipeSerializer(context={"request": request})
+        rows = RowSerializer(serializer)
+        base = Recipe.objects.filter(user=user).order_by("-id")
+        renderer = JSONRenderer()
+
+        for size in [int(size) for size in options["sizes"].split(",")]:
+            def drf():
+                queryset = optimize_for_serializer(base, serializer)[:size]
+                return RecipeSerializer(
+                    queryset, many=True, context={"request": request}
+                ).data
+
+            def values():
+                return rows.to_representation(rows.get_queryset(base)[:size])
+
+            drf_data, drf_ms = self._time(drf, options["repeat"])
+            rows_data, rows_ms = self._time(values, options["repeat"])
+            same = renderer.render(drf_data) == renderer.render(rows_data)
+            self.stdout.write(
+                f"recipes={len(drf_data):<6} "
+                f"serializer={drf_ms:9.2f}ms rows={rows_ms:9.2f}ms "
+                f"speedup={drf_ms / rows_ms:5.1f}x "
+                f"identical={'yes' if same else 'NO'}"
+            )
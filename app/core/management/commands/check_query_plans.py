@@ -0,0 +1,114 @@
+"""
+Django command to check the recipe endpoints' queries use indexes
+"""
+import re
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from core.models import Recipe
+from recipe.views import IngredientViewSet, RecipeViewSet, TagViewSet
+
+SEQ_SCAN = re.compile(r'Seq Scan on "?(core_\w+)"?')
+
+
+def endpoint_querysets(user):
+    """Yield (name, queryset) for the queries each list endpoint runs"""
+    recipe = Recipe.objects.filter(user=user).order_by("-id").first()
+    tag_ids = ",".join(
+        str(pk) for pk in recipe.tags.values_list("id", flat=True)
+    ) if recipe else "0"
+    ingredient_ids = ",".join(
+        str(pk) for pk in recipe.ingredients.values_list("id", flat=True)
+    ) if recipe else "0"
+    search = recipe.title.split()[0] if recipe else "recipe"
+
+    endpoints = [
+        ("recipes", RecipeViewSet, {}),
+        ("recipes?q", RecipeViewSet, {"q": search}),
+        ("recipes?tags", RecipeViewSet, {"tags": tag_ids}),
+        ("recipes?ingredients", RecipeViewSet, {"ingredients": ingredient_ids}),
+        ("tags", TagViewSet, {}),
+        ("tags?assigned_only", TagViewSet, {"assigned_only": 1}),
+        ("ingredients", IngredientViewSet, {}),
+        ("ingredients?assigned_only", IngredientViewSet, {"assigned_only": 1}),
+    ]
+    factory = APIRequestFactory()
+    for name, viewset, params in endpoints:
+        view = viewset(action="list", format_kwarg=None, args=(), kwargs={})
+        view.request = Request(factory.get("/", params))
+        view.request.user = user
+        paginator = view.paginator
+        queryset = view.get_queryset()
+        ordering = paginator.get_ordering(view.request, queryset, view)
+        queryset = queryset.order_by(*ordering)
+        yield name, queryset[:paginator.page_size + 1]
+
+
+def seq_scans(plan, min_rows=0):
+    """Return the core tables read with a sequential scan in a plan.
+
+    Tables the planner estimates below ``min_rows`` are ignored: for a
+    handful of pages a sequential scan is the cheapest plan.
+    """
+    tables = sorted(set(SEQ_SCAN.findall(plan)))
+    if not tables or not min_rows:
+        return tables
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT relname FROM pg_class "
+            "WHERE relname = ANY(%s) AND reltuples >= %s",
+            [tables, min_rows],
+        )
+        return sorted(row[0] for row in cursor.fetchall())
+
+
+class Command(BaseCommand):
+    help = "EXPLAIN each recipe endpoint and fail on sequential scans"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--email",
+                            help="user to plan for (default: most recipes)")
+        parser.add_argument("--disable-seqscan", action="store_true",
+                            help="penalise seq scans so small datasets still "
+                                 "show whether a usable index exists")
+        parser.add_argument("--min-rows", type=int, default=1000,
+                            help="ignore seq scans on smaller tables")
+        parser.add_argument("--verbose-plans", action="store_true")
+
+    def _get_user(self, email):
+        users = get_user_model().objects
+        if email:
+            return users.get(email=email)
+        user = users.annotate(n=Count("recipe")).order_by("-n").first()
+        if user is None:
+            raise CommandError("no users; run seed_recipes first")
+        return user
+
+    def handle(self, *args, **options):
+        user = self._get_user(options["email"])
+        failures = []
+        with transaction.atomic():
+            if options["disable_seqscan"]:
+                with connection.cursor() as cursor:
+                    cursor.execute("SET LOCAL enable_seqscan = off")
+            for name, queryset in endpoint_querysets(user):
+                plan = queryset.explain()
+                tables = seq_scans(plan, options["min_rows"])
+                if options["verbose_plans"]:
+                    self.stdout.write(f"-- {name}\n{plan}\n")
+                if tables:
+                    failures.append(f"{name}: seq scan on {', '.join(tables)}")
+                    self.stdout.write(self.style.ERROR(failures[-1]))
+                else:
+                    self.stdout.write(f"{name}: ok")
+
+        if failures:
+            raise CommandError(
+                "sequential scans found:\n" + "\n".join(failures)
+            )
+        self.stdout.write(self.style.SUCCESS("all endpoint queries use indexes"))
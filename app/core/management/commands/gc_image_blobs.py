@@ -0,0 +1,64 @@
+"""
+Django command to repair image blob reference counts
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from core.models import ImageBlob, Recipe
+from core.storage import image_storage
+
+
+class Command(BaseCommand):
+    help = "Recount recipe image references and delete unreferenced blobs"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--min-age", type=int, default=60,
+                            help="skip blobs registered in the last N "
+                                 "minutes (uploads still in flight)")
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **options):
+        counts = dict(
+            Recipe.objects.exclude(image="").exclude(image__isnull=True)
+            .values("image")
+            .annotate(n=Count("id"))
+            .values_list("image", "n")
+        )
+        cutoff = timezone.now() - timedelta(minutes=options["min_age"])
+        fixed = deleted = freed = 0
+
+        candidates = ImageBlob.objects.filter(created_at__lt=cutoff)
+        for blob in candidates.iterator():
+            if counts.get(blob.name, 0) == blob.refcount:
+                continue
+            if options["dry_run"]:
+                self.stdout.write(
+                    f"{blob.name}: refcount {blob.refcount}, "
+                    f"used by {counts.get(blob.name, 0)}"
+                )
+                continue
+            with transaction.atomic():
+                blob = ImageBlob.objects.select_for_update().filter(
+                    pk=blob.pk
+                ).first()
+                if blob is None:
+                    continue
+                # Recount under the lock; the first pass may be stale.
+                refs = Recipe.objects.filter(image=blob.name).count()
+                if refs:
+                    fixed += ImageBlob.objects.filter(pk=blob.pk).update(
+                        refcount=refs
+                    )
+                else:
+                    blob.delete()
+                    image_storage.delete_blob(blob.name)
+                    deleted += 1
+                    freed += blob.size
+
+        self.stdout.write(
+            f"fixed={fixed} deleted={deleted} freed={freed / 1024 / 1024:.1f}MB"
+        )
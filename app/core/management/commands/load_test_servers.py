@@ -0,0 +1,216 @@
+"""
+Django command to compare the uWSGI and ASGI deployments under load
+"""
+import asyncio
+import os
+import shutil
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from rest_framework.authtoken.models import Token
+
+from core.management.commands.benchmark_autocomplete import percentile
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def tree_rss(pid):
+    """Resident memory in bytes of a process and all its descendants"""
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as stat:
+                ppid = int(stat.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+
+    total, pending = 0, [pid]
+    page = os.sysconf("SC_PAGE_SIZE")
+    while pending:
+        current = pending.pop()
+        pending.extend(children.get(current, []))
+        try:
+            with open(f"/proc/{current}/statm") as statm:
+                total += int(statm.read().split()[1]) * page
+        except OSError:
+            pass
+    return total
+
+
+class MemorySampler(threading.Thread):
+    """Record the peak tree RSS of a server while the load runs"""
+
+    def __init__(self, pid):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.peak = 0
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(0.1):
+            self.peak = max(self.peak, tree_rss(self.pid))
+
+
+async def fetch(port, request):
+    """Send one request on a fresh connection; return the status code"""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        writer.write(request)
+        await writer.drain()
+        status_line = await reader.readline()
+        await reader.read()  # Connection: close, so read to EOF
+        return int(status_line.split()[1])
+    finally:
+        writer.close()
+
+
+async def run_load(port, request, concurrency, duration, timeout):
+    """Keep `concurrency` requests in flight for `duration` seconds"""
+    timings, errors = [], 0
+    deadline = time.monotonic() + duration
+
+    async def client():
+        nonlocal errors
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            try:
+                code = await asyncio.wait_for(fetch(port, request), timeout)
+            except (OSError, asyncio.TimeoutError, ValueError, IndexError):
+                code = None
+            if code == 200:
+                timings.append((time.perf_counter() - start) * 1000)
+            else:
+                errors += 1
+
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return timings, errors
+
+
+class Command(BaseCommand):
+    help = "Start uWSGI and uvicorn with the same number of workers and " \
+           "report throughput, latency and memory per concurrency level"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--modes", default="wsgi,asgi")
+        parser.add_argument("--workers", type=int, default=4)
+        parser.add_argument("--concurrency", default="1,16,64,256",
+                            help="comma separated in-flight request counts")
+        parser.add_argument("--duration", type=float, default=10)
+        parser.add_argument("--timeout", type=float, default=10,
+                            help="seconds before a request counts as failed")
+        parser.add_argument("--path", default="/api/recipe/recipes/")
+        parser.add_argument("--email",
+                            help="user to query (default: most recipes)")
+
+    def _command(self, mode, port, workers):
+        if mode == "asgi":
+            return [
+                sys.executable, "-m", "uvicorn", "app.asgi:application",
+                "--host", "127.0.0.1", "--port", str(port),
+                "--workers", str(workers),
+                "--no-access-log", "--log-level", "warning",
+            ]
+        uwsgi = shutil.which("uwsgi")
+        if uwsgi is None:
+            raise CommandError("uwsgi is not installed")
+        # Plain HTTP instead of the uwsgi protocol nginx uses, so one
+        # client can drive both servers.
+        return [
+            uwsgi, "--http-socket", f"127.0.0.1:{port}",
+            "--workers", str(workers), "--master", "--enable-threads",
+            "--module", "app.wsgi", "--disable-logging",
+        ]
+
+    def _start(self, mode, workers):
+        port = free_port()
+        env = {**os.environ, "SERVER_MODE": mode}
+        env.pop("ASYNC_VIEWS", None)
+        server = subprocess.Popen(
+            self._command(mode, port, workers),
+            cwd=settings.BASE_DIR,
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError(f"{mode} server exited on startup")
+            try:
+                socket.create_connection(("127.0.0.1", port), 0.5).close()
+                return server, port
+            except OSError:
+                time.sleep(0.2)
+        server.kill()
+        raise CommandError(f"{mode} server did not start")
+
+    def _stop(self, server):
+        server.send_signal(signal.SIGINT)
+        try:
+            server.wait(10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+            server.wait()
+
+    def handle(self, *args, **options):
+        users = get_user_model().objects
+        if options["email"]:
+            user = users.get(email=options["email"])
+        else:
+            user = users.annotate(n=Count("recipe")).order_by("-n").first()
+        if user is None:
+            raise CommandError("no users; run seed_recipes first")
+        token, created = Token.objects.get_or_create(user=user)
+        request = (
+            f"GET {options['path']} HTTP/1.1\r\n"
+            f"Host: localhost\r\n"
+            f"Authorization: Token {token.key}\r\n"
+            f"Connection: close\r\n\r\n"
+        ).encode()
+        levels = [int(n) for n in options["concurrency"].split(",")]
+        self.stdout.write(
+            f"user={user.email} workers={options['workers']} "
+            f"path={options['path']}"
+        )
+
+        for mode in options["modes"].split(","):
+            server, port = self._start(mode, options["workers"])
+            try:
+                asyncio.run(run_load(port, request, 1, 1, options["timeout"]))
+                idle = tree_rss(server.pid)
+                for concurrency in levels:
+                    sampler = MemorySampler(server.pid)
+                    sampler.start()
+                    timings, errors = asyncio.run(run_load(
+                        port, request, concurrency,
+                        options["duration"], options["timeout"],
+                    ))
+                    sampler.stopped.set()
+                    sampler.join()
+                    self.stdout.write(
+                        f"{mode:<5} c={concurrency:<4} "
+                        f"rps={len(timings) / options['duration']:8.1f} "
+                        f"p50={statistics.median(timings or [0]):8.1f}ms "
+                        f"p99={percentile(timings or [0], 99):8.1f}ms "
+                        f"errors={errors:<5} "
+                        f"rss idle={idle / 1024 / 1024:.0f}MB "
+                        f"peak={sampler.peak / 1024 / 1024:.0f}MB"
+                    )
+            finally:
+                self._stop(server)
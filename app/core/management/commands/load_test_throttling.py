@@ -0,0 +1,165 @@
+"""
+Django command to measure how throttling shields users from an abuser
+"""
+import asyncio
+import os
+import shutil
+import signal
+import socket
+import statistics
+import subprocess
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.authtoken.models import Token
+
+from core.management.commands.benchmark_autocomplete import percentile
+from core.management.commands.load_test_servers import fetch, free_port
+
+# Rate settings turned off for the unthrottled run
+RATE_ENV = ["API_USER_RATE", "API_ANON_RATE", "API_UPLOAD_RATE",
+            "API_BULK_RATE", "API_EXPORT_RATE"]
+
+
+def get_request(path, token):
+    return (
+        f"GET {path} HTTP/1.1\r\n"
+        f"Host: localhost\r\n"
+        f"Authorization: Token {token.key}\r\n"
+        f"Connection: close\r\n\r\n"
+    ).encode()
+
+
+class Command(BaseCommand):
+    help = "Start uWSGI with and without throttling while one user floods " \
+           "the recipe list, and report another user's latency " \
+           "(seed data first with seed_recipes)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4)
+        parser.add_argument("--abusers", type=int, default=32,
+                            help="concurrent requests of the abusive user")
+        parser.add_argument("--interval", type=float, default=0.1,
+                            help="seconds between the normal user's requests")
+        parser.add_argument("--duration", type=float, default=15)
+        parser.add_argument("--user-rate", default="600/min")
+        parser.add_argument("--path",
+                            default="/api/recipe/recipes/?page_size=100")
+
+    def _start(self, env):
+        uwsgi = shutil.which("uwsgi")
+        if uwsgi is None:
+            raise CommandError("uwsgi is not installed")
+        port = free_port()
+        server = subprocess.Popen(
+            [
+                uwsgi, "--http-socket", f"127.0.0.1:{port}",
+                "--workers", str(self.workers), "--master",
+                "--enable-threads", "--module", "app.wsgi",
+                "--disable-logging",
+                "--cache2", "name=throttle,items=10000,blocksize=8",
+            ],
+            cwd=settings.BASE_DIR,
+            env={**os.environ, "SERVER_MODE": "wsgi", **env},
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError("uwsgi exited on startup")
+            try:
+                socket.create_connection(("127.0.0.1", port), 0.5).close()
+                return server, port
+            except OSError:
+                time.sleep(0.2)
+        server.kill()
+        raise CommandError("uwsgi did not start")
+
+    def _stop(self, server):
+        server.send_signal(signal.SIGINT)
+        try:
+            server.wait(10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+            server.wait()
+
+    async def _load(self, port, abuser_token, user_token, path):
+        """Flood with one user while the other sends paced requests"""
+        deadline = time.monotonic() + self.duration
+        abuse, normal, timings = Counter(), Counter(), []
+        separator = "&" if "?" in path else "?"
+
+        async def send(request):
+            try:
+                return await asyncio.wait_for(fetch(port, request), 30)
+            except (OSError, asyncio.TimeoutError, ValueError, IndexError):
+                return None
+
+        async def abuser(n):
+            i = 0
+            while time.monotonic() < deadline:
+                # A new URL each time misses the list response cache.
+                i += 1
+                abuse[await send(get_request(
+                    f"{path}{separator}n={n}-{i}", abuser_token
+                ))] += 1
+
+        async def user():
+            i = 0
+            while time.monotonic() < deadline:
+                i += 1
+                start = time.perf_counter()
+                code = await send(get_request(
+                    f"{path}{separator}u={i}", user_token
+                ))
+                normal[code] += 1
+                if code == 200:
+                    timings.append((time.perf_counter() - start) * 1000)
+                await asyncio.sleep(self.interval)
+
+        await asyncio.gather(user(), *(abuser(n) for n in range(self.abusers)))
+        return abuse, normal, timings
+
+    def handle(self, *args, **options):
+        users = list(get_user_model().objects.order_by("id")[:2])
+        if len(users) < 2:
+            raise CommandError("need two users; run seed_recipes first")
+        abuser_token, _ = Token.objects.get_or_create(user=users[0])
+        user_token, _ = Token.objects.get_or_create(user=users[1])
+        self.workers = options["workers"]
+        self.abusers = options["abusers"]
+        self.interval = options["interval"]
+        self.duration = options["duration"]
+
+        runs = [
+            ("off", {name: "" for name in RATE_ENV}),
+            ("on", {"API_USER_RATE": options["user_rate"]}),
+        ]
+        for label, env in runs:
+            server, port = self._start(env)
+            try:
+                # Let every worker load the app before measuring.
+                asyncio.run(self._warm_up(port, user_token, options["path"]))
+                abuse, normal, timings = asyncio.run(self._load(
+                    port, abuser_token, user_token, options["path"]
+                ))
+            finally:
+                self._stop(server)
+            self.stdout.write(
+                f"throttling={label:<3} "
+                f"abuser 200={abuse[200]:<6} 429={abuse[429]:<6} "
+                f"user 200={normal[200]:<4} "
+                f"other={sum(normal.values()) - normal[200]:<4} "
+                f"p50={statistics.median(timings or [0]):8.1f}ms "
+                f"p99={percentile(timings or [0], 99):8.1f}ms"
+            )
+
+    async def _warm_up(self, port, token, path):
+        await asyncio.gather(*(
+            fetch(port, get_request(path, token))
+            for _ in range(self.workers * 2)
+        ))
@@ -0,0 +1,29 @@
+"""
+Django command to delete expired API tokens
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+
+class Command(BaseCommand):
+    help = "Delete stored tokens not refreshed within AUTH_TOKENS['TTL'] " \
+           "(run periodically, e.g. from cron)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true",
+                            help="only count the expired tokens")
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(
+            seconds=settings.AUTH_TOKENS["TTL"]
+        )
+        expired = Token.objects.filter(created__lte=cutoff)
+        if options["dry_run"]:
+            self.stdout.write(f"{expired.count()} expired tokens")
+            return
+        deleted, _ = expired.delete()
+        self.stdout.write(f"deleted {deleted} expired tokens")
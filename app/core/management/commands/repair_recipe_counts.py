@@ -0,0 +1,53 @@
+"""
+Django command to recompute tag and ingredient recipe counts
+"""
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from core.models import Ingredient, Recipe, Tag
+
+
+def actual_count(field_name):
+    """Number of through rows pointing at the outer tag / ingredient"""
+    field = Recipe._meta.get_field(field_name)
+    through = field.remote_field.through
+    target = f"{field.m2m_reverse_field_name()}_id"
+    counts = (
+        through.objects.filter(**{target: OuterRef("pk")})
+        .values(target)
+        .annotate(n=Count("pk"))
+        .values("n")
+    )
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+class Command(BaseCommand):
+    help = "Recompute Tag / Ingredient recipe_count from the through tables"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true",
+                            help="only report the rows that are off")
+
+    def handle(self, *args, **options):
+        for model, field_name in [(Tag, "tags"), (Ingredient, "ingredients")]:
+            stale = list(
+                model.objects.annotate(actual=actual_count(field_name))
+                .exclude(recipe_count=F("actual"))
+                .values_list("pk", "recipe_count", "actual")
+            )
+            for pk, stored, actual in stale[:20]:
+                self.stdout.write(
+                    f"{model.__name__} {pk}: recipe_count {stored}, "
+                    f"actual {actual}"
+                )
+            if stale and not options["dry_run"]:
+                # Recount in the UPDATE itself so links written since the
+                # first query are included.
+                model.objects.filter(pk__in=[row[0] for row in stale]).update(
+                    recipe_count=actual_count(field_name)
+                )
+            self.stdout.write(
+                f"{model._meta.verbose_name_plural}: {len(stale)} "
+                f"{'to fix' if options['dry_run'] else 'fixed'}"
+            )
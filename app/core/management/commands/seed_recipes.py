@@ -0,0 +1,89 @@
+"""
+Django command to seed a large synthetic recipe dataset
+"""
+import random
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from core.models import Ingredient, Recipe, Tag
+
+
+class Command(BaseCommand):
+    help = "Seed synthetic users, recipes, tags and ingredients"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=10)
+        parser.add_argument("--recipes", type=int, default=10000,
+                            help="recipes per user")
+        parser.add_argument("--tags", type=int, default=50,
+                            help="tags per user")
+        parser.add_argument("--ingredients", type=int, default=200,
+                            help="ingredients per user")
+        parser.add_argument("--per-recipe", type=int, default=4,
+                            help="tags and ingredients per recipe")
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def _link(self, field_name, recipes, objs, per_recipe, batch_size):
+        """Attach random related objects to every recipe"""
+        field = Recipe._meta.get_field(field_name)
+        through = field.remote_field.through
+        source = f"{field.m2m_field_name()}_id"
+        target = f"{field.m2m_reverse_field_name()}_id"
+        rows = [
+            through(**{source: recipe.pk, target: obj.pk})
+            for recipe in recipes
+            for obj in self.random.sample(objs, min(per_recipe, len(objs)))
+        ]
+        through.objects.bulk_create(rows, batch_size=batch_size)
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options["seed"])
+        batch_size = options["batch_size"]
+        start = get_user_model().objects.count()
+
+        for n in range(start, start + options["users"]):
+            with transaction.atomic():
+                user = get_user_model().objects.create_user(
+                    email=f"seed-user-{n}@example.com",
+                    password=None,
+                )
+                tags = Tag.objects.bulk_create(
+                    [Tag(user=user, name=f"tag {i}")
+                     for i in range(options["tags"])],
+                    batch_size=batch_size,
+                )
+                ingredients = Ingredient.objects.bulk_create(
+                    [Ingredient(user=user, name=f"ingredient {i}")
+                     for i in range(options["ingredients"])],
+                    batch_size=batch_size,
+                )
+                for offset in range(0, options["recipes"], batch_size):
+                    count = min(batch_size, options["recipes"] - offset)
+                    recipes = Recipe.objects.bulk_create([
+                        Recipe(
+                            user=user,
+                            title=f"recipe {offset + i}",
+                            description="synthetic recipe",
+                            time_minutes=self.random.randint(5, 240),
+                            price=Decimal(self.random.randint(100, 9999)) / 100,
+                        )
+                        for i in range(count)
+                    ])
+                    self._link("tags", recipes, tags,
+                               options["per_recipe"], batch_size)
+                    self._link("ingredients", recipes, ingredients,
+                               options["per_recipe"], batch_size)
+            self.stdout.write(f"seeded {user.email}")
+
+        tables = [
+            model._meta.db_table
+            for model in (Recipe, Tag, Ingredient,
+                          Recipe.tags.through, Recipe.ingredients.through)
+        ]
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE " + ", ".join(tables))
+        self.stdout.write(self.style.SUCCESS("seeding done"))
@@ -0,0 +1,261 @@
+"""
+Per-view request metrics, aggregated across worker processes
+"""
+import bisect
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from rest_framework import serializers
+
+from core.authentication import token_cache_stats
+
+# Metrics of the request being handled by this thread / task
+current_request = contextvars.ContextVar("current_request", default=None)
+
+
+class RequestMetrics:
+    """Counters collected while one request is handled"""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.serializer_seconds = 0.0
+
+
+def execute_wrapper(execute, sql, params, many, context):
+    """Count and time queries run for the current request.
+
+    The context variable follows the request into sync_to_async()
+    threads, so async views are measured too.
+    """
+    metrics = current_request.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries += 1
+        metrics.db_seconds += time.perf_counter() - start
+
+
+def install_execute_wrapper(sender=None, connection=None, **kwargs):
+    """Keep execute_wrapper() on a connection for its whole life.
+
+    A connection_created receiver; like connection.execute_wrapper(), but
+    without a push and pop per request.
+    """
+    if execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(execute_wrapper)
+
+
+@contextmanager
+def timed(attribute):
+    """Add the time spent in the block to the current request's metrics"""
+    metrics = current_request.get()
+    if metrics is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        setattr(metrics, attribute,
+                getattr(metrics, attribute) + time.perf_counter() - start)
+
+
+def instrument_serializers():
+    """Time Serializer.data and ListSerializer.data per request"""
+    for cls in (serializers.Serializer, serializers.ListSerializer):
+        fget = cls.data.fget
+        if getattr(fget, "timed", False):
+            continue
+
+        def timed_fget(self, fget=fget):
+            with timed("serializer_seconds"):
+                return fget(self)
+        timed_fget.timed = True
+        cls.data = property(wraps(fget)(timed_fget))
+
+
+class MetricsRegistry:
+    """Metrics of this process, published as a JSON file per process.
+
+    Every worker writes its totals to ``directory`` at most every
+    ``interval`` seconds; collect() merges the files so any worker can
+    answer for the whole server. Files of exited workers are kept, so
+    totals never go backwards while the server runs.
+    """
+
+    def __init__(self, directory, interval, buckets):
+        self.directory = directory
+        self.interval = interval
+        self.buckets = buckets
+        self.views = {}
+        self._published = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def path(self):
+        # A property, so forked workers do not share their parent's file.
+        return os.path.join(self.directory, f"{os.getpid()}.json")
+
+    def observe(self, view, status, seconds, metrics, size):
+        """Record one finished request"""
+        with self._lock:
+            stats = self.views.get(view)
+            if stats is None:
+                stats = self.views[view] = {
+                    "buckets": [0] * (len(self.buckets) + 1),
+                    "count": 0,
+                    "seconds": 0.0,
+                    "queries": 0,
+                    "db_seconds": 0.0,
+                    "serializer_seconds": 0.0,
+                    "bytes": 0,
+                    "statuses": {},
+                }
+            stats["buckets"][bisect.bisect_left(self.buckets, seconds)] += 1
+            stats["count"] += 1
+            stats["seconds"] += seconds
+            stats["queries"] += metrics.queries
+            stats["db_seconds"] += metrics.db_seconds
+            stats["serializer_seconds"] += metrics.serializer_seconds
+            stats["bytes"] += size
+            key = str(status)
+            stats["statuses"][key] = stats["statuses"].get(key, 0) + 1
+        if time.monotonic() - self._published >= self.interval:
+            self.publish()
+
+    def snapshot(self):
+        """Return this process's totals as plain data"""
+        with self._lock:
+            views = json.loads(json.dumps(self.views))
+        counts = token_cache_stats.snapshot()
+        counts.pop("hit_ratio")
+        return {"views": views, "token_cache": counts}
+
+    def publish(self):
+        """Write the snapshot where other workers' collect() finds it"""
+        self._published = time.monotonic()
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = f"{self.path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as tmp:
+            json.dump(self.snapshot(), tmp)
+        os.replace(tmp_path, self.path)
+
+    def collect(self):
+        """Merge the snapshots of every process, this one up to date"""
+        snapshots = [self.snapshot()]
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            names = []
+        own = os.path.basename(self.path)
+        for name in names:
+            if not name.endswith(".json") or name == own:
+                continue
+            try:
+                with open(os.path.join(self.directory, name)) as snapshot:
+                    snapshots.append(json.load(snapshot))
+            except (OSError, ValueError):
+                continue  # being replaced or removed
+        return merge_snapshots(snapshots)
+
+    def reset(self):
+        """Forget this process's totals"""
+        with self._lock:
+            self.views = {}
+        self._published = 0.0
+
+
+def merge_snapshots(snapshots):
+    """Sum snapshots of several processes"""
+    views, token_cache = {}, {}
+    for snapshot in snapshots:
+        for view, stats in snapshot["views"].items():
+            total = views.setdefault(view, {
+                "buckets": [0] * len(stats["buckets"]),
+                "statuses": {},
+            })
+            for key, value in stats.items():
+                if key == "buckets":
+                    total["buckets"] = [
+                        a + b for a, b in zip(total["buckets"], value)
+                    ]
+                elif key == "statuses":
+                    for status, count in value.items():
+                        total["statuses"][status] = \
+                            total["statuses"].get(status, 0) + count
+                else:
+                    total[key] = total.get(key, 0) + value
+        for outcome, count in snapshot["token_cache"].items():
+            token_cache[outcome] = token_cache.get(outcome, 0) + count
+    return {"views": views, "token_cache": token_cache}
+
+
+def _sample(name, labels, value):
+    label_text = ",".join(f'{key}="{val}"' for key, val in labels.items())
+    return f"{name}{{{label_text}}} {value}"
+
+
+def render_prometheus(merged, buckets):
+    """Render merged snapshots in the Prometheus text format"""
+    lines = [
+        "# HELP api_request_duration_seconds Time to answer a request.",
+        "# TYPE api_request_duration_seconds histogram",
+    ]
+    views = sorted(merged["views"].items())
+    for view, stats in views:
+        cumulative = 0
+        bounds = [str(bound) for bound in buckets] + ["+Inf"]
+        for bound, count in zip(bounds, stats["buckets"]):
+            cumulative += count
+            lines.append(_sample("api_request_duration_seconds_bucket",
+                                 {"view": view, "le": bound}, cumulative))
+        lines.append(_sample("api_request_duration_seconds_sum",
+                             {"view": view}, stats["seconds"]))
+        lines.append(_sample("api_request_duration_seconds_count",
+                             {"view": view}, stats["count"]))
+
+    lines += [
+        "# HELP api_requests_total Requests answered, by status code.",
+        "# TYPE api_requests_total counter",
+    ]
+    for view, stats in views:
+        for status, count in sorted(stats["statuses"].items()):
+            lines.append(_sample("api_requests_total",
+                                 {"view": view, "status": status}, count))
+
+    for name, key, help_text in [
+        ("api_db_queries_total", "queries", "Database queries run."),
+        ("api_db_seconds_total", "db_seconds", "Time spent in queries."),
+        ("api_serializer_seconds_total", "serializer_seconds",
+         "Time spent building serializer output, its queries included."),
+        ("api_response_bytes_total", "bytes", "Response body bytes."),
+    ]:
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+        for view, stats in views:
+            lines.append(_sample(name, {"view": view}, stats[key]))
+
+    lines += [
+        "# HELP api_token_cache_lookups_total Token cache lookups.",
+        "# TYPE api_token_cache_lookups_total counter",
+    ]
+    for outcome, count in sorted(merged["token_cache"].items()):
+        lines.append(_sample("api_token_cache_lookups_total",
+                             {"outcome": outcome}, count))
+    return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry(
+    settings.METRICS["DIR"],
+    settings.METRICS["FLUSH_INTERVAL"],
+    settings.METRICS["BUCKETS"],
+)
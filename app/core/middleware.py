@@ -0,0 +1,184 @@
+"""
+Middleware for the API
+"""
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from core import querycheck
+from core.metrics import (
+    RequestMetrics,
+    current_request,
+    install_execute_wrapper,
+    instrument_serializers,
+    registry,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def resolve_view(request):
+    """Return the resolved view class and viewset action, if any"""
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return None, None
+    func = match.func
+    cls = getattr(func, "cls", None) or getattr(func, "view_class", None)
+    action = (getattr(func, "actions", None) or {}).get(
+        request.method.lower()
+    )
+    return cls, action
+
+
+def view_label(request):
+    """Name the resolved view, e.g. RecipeViewSet.list or TokenView"""
+    cls, action = resolve_view(request)
+    if cls is None:
+        match = getattr(request, "resolver_match", None)
+        if match is None:
+            return "unmatched"
+        return match.view_name or match.func.__name__
+    return f"{cls.__name__}.{action}" if action else cls.__name__
+
+
+def query_budget(request):
+    """Return the query budget the view declares for this request.
+
+    Views declare ``query_budget = {"list": 4, ...}``, keyed by viewset
+    action or, on plain views, by lower case HTTP method.
+    """
+    cls, action = resolve_view(request)
+    budgets = getattr(cls, "query_budget", None) or {}
+    return budgets.get(action or request.method.lower())
+
+
+class MetricsMiddleware:
+    """Record latency, queries, serializer time and size per view.
+
+    Served by core.views.metrics. With METRICS["ENABLED"] off Django
+    drops the middleware at startup and nothing is instrumented.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.METRICS["ENABLED"]:
+            raise MiddlewareNotUsed()
+        if not settings.METRICS["TOKEN"]:
+            # /metrics is reachable through the proxy like any other URL.
+            raise ImproperlyConfigured(
+                "METRICS_TOKEN must be set when METRICS_ENABLED is on."
+            )
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        connection_created.connect(
+            install_execute_wrapper, dispatch_uid="metrics"
+        )
+        for connection in connections.all(initialized_only=True):
+            install_execute_wrapper(connection=connection)
+        instrument_serializers()
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = current_request.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_request.reset(token)
+        self.observe(request, response, time.perf_counter() - start, metrics)
+        return response
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = current_request.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_request.reset(token)
+        self.observe(request, response, time.perf_counter() - start, metrics)
+        return response
+
+    def observe(self, request, response, seconds, metrics):
+        # Streamed bodies are not buffered just to be measured.
+        size = 0 if response.streaming else len(response.content)
+        registry.observe(
+            view_label(request), response.status_code, seconds, metrics, size
+        )
+
+
+class QueryCheckMiddleware:
+    """Flag N+1 query patterns, slow statements and budget overruns.
+
+    For development and staging: findings are logged as warnings, or
+    raised as QueryCheckError with QUERY_CHECK["RAISE"], naming the
+    recipe/ or user/ code that ran the query. Queries run while a
+    streamed body is sent come after the check and are not seen.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.QUERY_CHECK["ENABLED"]:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        connection_created.connect(
+            querycheck.install_execute_wrapper, dispatch_uid="querycheck"
+        )
+        for connection in connections.all(initialized_only=True):
+            querycheck.install_execute_wrapper(connection=connection)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        log = querycheck.QueryLog(settings.QUERY_CHECK["APPS"])
+        token = querycheck.current_log.set(log)
+        try:
+            response = self.get_response(request)
+        finally:
+            querycheck.current_log.reset(token)
+        self.check(request, log)
+        return response
+
+    async def __acall__(self, request):
+        log = querycheck.QueryLog(settings.QUERY_CHECK["APPS"])
+        token = querycheck.current_log.set(log)
+        try:
+            response = await self.get_response(request)
+        finally:
+            querycheck.current_log.reset(token)
+        self.check(request, log)
+        return response
+
+    def check(self, request, log):
+        options = settings.QUERY_CHECK
+        slow_ms = options["SLOW_QUERY_MS"]
+        findings = log.findings(
+            options["REPEAT_THRESHOLD"],
+            None if slow_ms is None else slow_ms / 1000,
+            query_budget(request),
+        )
+        if not findings:
+            return
+        report = "%s %s (%s):\n%s" % (
+            request.method,
+            request.get_full_path(),
+            view_label(request),
+            "\n".join(str(finding) for finding in findings),
+        )
+        if options["RAISE"]:
+            raise querycheck.QueryCheckError(report)
+        logger.warning(report)
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.1 on 2026-10-18 06:12
+
+from django.db import migrations
+from django.db.models import Count, Min
+
+
+def merge_duplicate_names(apps, schema_editor):
+    """Fold duplicate (user, name) rows into the oldest one"""
+    Recipe = apps.get_model('core', 'Recipe')
+    for model_name, field_name in (('Tag', 'tags'), ('Ingredient', 'ingredients')):
+        model = apps.get_model('core', model_name)
+        through = Recipe._meta.get_field(field_name).remote_field.through
+        column = f'{model_name.lower()}_id'
+        duplicates = (
+            model.objects.values('user', 'name')
+            .annotate(keep=Min('id'), total=Count('id'))
+            .filter(total__gt=1)
+        )
+        for dup in duplicates:
+            others = model.objects.filter(
+                user=dup['user'], name=dup['name']
+            ).exclude(id=dup['keep'])
+            for other_id in others.values_list('id', flat=True):
+                linked = through.objects.filter(
+                    **{column: dup['keep']}
+                ).values('recipe_id')
+                through.objects.filter(
+                    **{column: other_id}
+                ).exclude(recipe_id__in=linked).update(**{column: dup['keep']})
+            others.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_recipe_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_names, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.1 on 2026-10-18 07:02
+
+from django.db import migrations
+
+# The auto-created through tables only index (recipe_id, x_id) and x_id.
+# Filtering recipes by tag / ingredient ids probes the through table by
+# x_id and then needs recipe_id; (x_id, recipe_id) answers that from the
+# index alone.
+INDEXES = [
+    ('core_recipe_tags', 'tag_id', 'recipe_tags_tag_recipe_idx'),
+    ('core_recipe_ingredients', 'ingredient_id', 'recipe_ingr_ingr_recipe_idx'),
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_user_data_version'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=f'CREATE INDEX {name} ON {table} ({column}, recipe_id);',
+            reverse_sql=f'DROP INDEX {name};',
+        )
+        for table, column, name in INDEXES
+    ]
@@ -0,0 +1,136 @@
+# Generated by Django 4.2.1 on 2026-10-18 06:35
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+# Triggers keep core_recipe.search_vector in sync with the recipe's
+# title (A), tag and ingredient names (B) and description (C). They also
+# cover bulk_create, the bulk link inserts and cascade deletes, which
+# send no Django signals. Link changes use statement level triggers, so
+# a bulk insert recomputes each recipe once rather than once per row.
+SEARCH_SQL = """
+CREATE FUNCTION core_recipe_search_vector(rid bigint, title text, description text)
+RETURNS tsvector LANGUAGE sql STABLE AS $$
+    SELECT
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce((
+            SELECT string_agg(t.name, ' ')
+            FROM core_tag t JOIN core_recipe_tags rt ON rt.tag_id = t.id
+            WHERE rt.recipe_id = rid
+        ), '')), 'B') ||
+        setweight(to_tsvector('english', coalesce((
+            SELECT string_agg(i.name, ' ')
+            FROM core_ingredient i
+            JOIN core_recipe_ingredients ri ON ri.ingredient_id = i.id
+            WHERE ri.recipe_id = rid
+        ), '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(description, '')), 'C')
+$$;
+
+CREATE FUNCTION core_recipe_search_row() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    NEW.search_vector := core_recipe_search_vector(
+        NEW.id, NEW.title, NEW.description
+    );
+    RETURN NEW;
+END $$;
+
+CREATE TRIGGER core_recipe_search_row
+BEFORE INSERT OR UPDATE OF title, description ON core_recipe
+FOR EACH ROW EXECUTE FUNCTION core_recipe_search_row();
+
+CREATE FUNCTION core_recipe_search_links() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    UPDATE core_recipe r
+    SET search_vector = core_recipe_search_vector(r.id, r.title, r.description)
+    WHERE r.id IN (SELECT recipe_id FROM changed);
+    RETURN NULL;
+END $$;
+
+CREATE TRIGGER core_recipe_tags_search_insert
+AFTER INSERT ON core_recipe_tags REFERENCING NEW TABLE AS changed
+FOR EACH STATEMENT EXECUTE FUNCTION core_recipe_search_links();
+CREATE TRIGGER core_recipe_tags_search_delete
+AFTER DELETE ON core_recipe_tags REFERENCING OLD TABLE AS changed
+FOR EACH STATEMENT EXECUTE FUNCTION core_recipe_search_links();
+CREATE TRIGGER core_recipe_ingredients_search_insert
+AFTER INSERT ON core_recipe_ingredients REFERENCING NEW TABLE AS changed
+FOR EACH STATEMENT EXECUTE FUNCTION core_recipe_search_links();
+CREATE TRIGGER core_recipe_ingredients_search_delete
+AFTER DELETE ON core_recipe_ingredients REFERENCING OLD TABLE AS changed
+FOR EACH STATEMENT EXECUTE FUNCTION core_recipe_search_links();
+
+CREATE FUNCTION core_tag_search_rename() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    UPDATE core_recipe r
+    SET search_vector = core_recipe_search_vector(r.id, r.title, r.description)
+    WHERE r.id IN (
+        SELECT recipe_id FROM core_recipe_tags WHERE tag_id = NEW.id
+    );
+    RETURN NULL;
+END $$;
+
+CREATE TRIGGER core_tag_search_rename
+AFTER UPDATE OF name ON core_tag
+FOR EACH ROW WHEN (OLD.name IS DISTINCT FROM NEW.name)
+EXECUTE FUNCTION core_tag_search_rename();
+
+CREATE FUNCTION core_ingredient_search_rename() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    UPDATE core_recipe r
+    SET search_vector = core_recipe_search_vector(r.id, r.title, r.description)
+    WHERE r.id IN (
+        SELECT recipe_id FROM core_recipe_ingredients
+        WHERE ingredient_id = NEW.id
+    );
+    RETURN NULL;
+END $$;
+
+CREATE TRIGGER core_ingredient_search_rename
+AFTER UPDATE OF name ON core_ingredient
+FOR EACH ROW WHEN (OLD.name IS DISTINCT FROM NEW.name)
+EXECUTE FUNCTION core_ingredient_search_rename();
+
+UPDATE core_recipe
+SET search_vector = core_recipe_search_vector(id, title, description);
+"""
+
+REVERSE_SQL = """
+DROP TRIGGER core_ingredient_search_rename ON core_ingredient;
+DROP TRIGGER core_tag_search_rename ON core_tag;
+DROP TRIGGER core_recipe_ingredients_search_delete ON core_recipe_ingredients;
+DROP TRIGGER core_recipe_ingredients_search_insert ON core_recipe_ingredients;
+DROP TRIGGER core_recipe_tags_search_delete ON core_recipe_tags;
+DROP TRIGGER core_recipe_tags_search_insert ON core_recipe_tags;
+DROP TRIGGER core_recipe_search_row ON core_recipe;
+DROP FUNCTION core_ingredient_search_rename();
+DROP FUNCTION core_tag_search_rename();
+DROP FUNCTION core_recipe_search_links();
+DROP FUNCTION core_recipe_search_row();
+DROP FUNCTION core_recipe_search_vector(bigint, text, text);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_image_blobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunSQL(SEARCH_SQL, REVERSE_SQL),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='recipe_search_idx'),
+        ),
+    ]
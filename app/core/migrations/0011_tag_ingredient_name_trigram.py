@@ -0,0 +1,44 @@
+from django.db import migrations
+
+# Trigram indexes behind the tag / ingredient ?prefix= and ?fuzzy=
+# lookups. They index UPPER(name) because that is what Django's
+# istartswith compares; trigrams ignore case, so the fuzzy lookup
+# upper-cases both sides to share the index. pg_trgm ships with the
+# postgres image but not with every server, so the migration is a no-op
+# where the extension is unavailable and recipe.autocomplete falls back
+# to plain LIKE matches.
+INDEXES = [
+    ("core_tag", "tag_name_trgm_idx"),
+    ("core_ingredient", "ingredient_name_trgm_idx"),
+]
+
+
+def create_trigram_indexes(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'"
+        )
+        if cursor.fetchone() is None:
+            return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for table, name in INDEXES:
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {name} ON {table} "
+            f"USING gin (UPPER(name) gin_trgm_ops)"
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    for table, name in INDEXES:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_recipe_search_vector'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
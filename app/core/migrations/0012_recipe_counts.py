@@ -0,0 +1,94 @@
+# Generated by Django 4.2.1 on 2026-10-18 06:40
+
+from django.db import migrations, models
+
+# Keep Tag.recipe_count / Ingredient.recipe_count equal to the number of
+# through table rows pointing at them. Like the search_vector triggers
+# (0010) these also see bulk inserts and cascade deletes, which send no
+# m2m_changed signal. A statement applies one delta per tag / ingredient;
+# the rows are locked in id order first so concurrent statements cannot
+# deadlock on them.
+COUNT_SQL = """
+CREATE FUNCTION core_link_recipe_count() RETURNS trigger
+LANGUAGE plpgsql AS $$
+DECLARE
+    target text := TG_ARGV[0];
+    fk text := TG_ARGV[1];
+    delta integer := CASE TG_OP WHEN 'INSERT' THEN 1 ELSE -1 END;
+BEGIN
+    EXECUTE format(
+        'SELECT 1 FROM %I WHERE id IN (SELECT %I FROM changed) '
+        'ORDER BY id FOR UPDATE',
+        target, fk
+    );
+    EXECUTE format(
+        'UPDATE %I t SET recipe_count = t.recipe_count + $1 * d.n '
+        'FROM (SELECT %I AS id, count(*) AS n FROM changed GROUP BY 1) d '
+        'WHERE t.id = d.id',
+        target, fk
+    ) USING delta;
+    RETURN NULL;
+END $$;
+
+CREATE TRIGGER core_recipe_tags_count_insert
+AFTER INSERT ON core_recipe_tags REFERENCING NEW TABLE AS changed
+FOR EACH STATEMENT EXECUTE FUNCTION core_link_recipe_count('core_tag', 'tag_id');
+CREATE TRIGGER core_recipe_tags_count_delete
+AFTER DELETE ON core_recipe_tags REFERENCING OLD TABLE AS changed
+FOR EACH STATEMENT EXECUTE FUNCTION core_link_recipe_count('core_tag', 'tag_id');
+CREATE TRIGGER core_recipe_ingredients_count_insert
+AFTER INSERT ON core_recipe_ingredients REFERENCING NEW TABLE AS changed
+FOR EACH STATEMENT EXECUTE FUNCTION
+    core_link_recipe_count('core_ingredient', 'ingredient_id');
+CREATE TRIGGER core_recipe_ingredients_count_delete
+AFTER DELETE ON core_recipe_ingredients REFERENCING OLD TABLE AS changed
+FOR EACH STATEMENT EXECUTE FUNCTION
+    core_link_recipe_count('core_ingredient', 'ingredient_id');
+
+UPDATE core_tag t SET recipe_count = c.n
+FROM (SELECT tag_id, count(*) AS n FROM core_recipe_tags GROUP BY 1) c
+WHERE t.id = c.tag_id;
+UPDATE core_ingredient i SET recipe_count = c.n
+FROM (
+    SELECT ingredient_id, count(*) AS n FROM core_recipe_ingredients
+    GROUP BY 1
+) c
+WHERE i.id = c.ingredient_id;
+"""
+
+REVERSE_SQL = """
+DROP TRIGGER core_recipe_ingredients_count_delete ON core_recipe_ingredients;
+DROP TRIGGER core_recipe_ingredients_count_insert ON core_recipe_ingredients;
+DROP TRIGGER core_recipe_tags_count_delete ON core_recipe_tags;
+DROP TRIGGER core_recipe_tags_count_insert ON core_recipe_tags;
+DROP FUNCTION core_link_recipe_count();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_tag_ingredient_name_trigram'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredient',
+            name='recipe_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='recipe_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunSQL(COUNT_SQL, REVERSE_SQL),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(fields=['user', '-recipe_count', 'name'], name='ingredient_user_popularity_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['user', '-recipe_count', 'name'], name='tag_user_popularity_idx'),
+        ),
+    ]
@@ -3,8 +3,12 @@ from django.contrib.auth.models import (
     BaseUserManager,
     PermissionsMixin
 )
-from django.db import models
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.db import connection, models
 from django.conf import settings
+from core.storage import get_image_storage
+from core.versioning import bump_data_version
 import uuid
 import os
 
@@ -34,6 +38,24 @@ class UserManager(BaseUserManager) :
         user.is_superuser= True
         user.save(using=self._db)
         return user
+
+    def data_version(self, user_id):
+        """Return the version of the user's recipe data"""
+        return self.filter(pk=user_id).values_list(
+            "data_version", flat=True
+        ).get()
+
+    async def adata_version(self, user_id):
+        """Async data_version() for the ASGI views"""
+        return await self.filter(pk=user_id).values_list(
+            "data_version", flat=True
+        ).aget()
+
+    def bump_data_version(self, *user_ids):
+        """Mark the users' recipe data as changed"""
+        self.filter(pk__in=user_ids).update(
+            data_version=models.F("data_version") + 1
+        )
     
     
 class User(AbstractBaseUser,PermissionsMixin) :
@@ -42,9 +64,43 @@ class User(AbstractBaseUser,PermissionsMixin) :
     username = models.CharField(max_length=255)
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
+    # Bumped whenever the user's recipes, tags or ingredients change;
+    # used to build ETags and cache keys for list responses.
+    data_version = models.PositiveBigIntegerField(default=0, editable=False)
+    # Part of every signed token; bumping it revokes them all.
+    token_version = models.PositiveIntegerField(default=0, editable=False)
    
     USERNAME_FIELD = "email"
     objects = UserManager()
+
+
+class NamedObjectManager(models.Manager):
+    """Manager for per-user objects identified by their name"""
+
+    def get_or_create_by_names(self, user, names):
+        """Return a {name: object} map, creating missing names in bulk"""
+        names = list(dict.fromkeys(names))
+        if not names:
+            return {}
+        found = {
+            obj.name: obj
+            for obj in self.filter(user=user, name__in=names)
+        }
+        missing = [name for name in names if name not in found]
+        if missing:
+            # A concurrent writer may create the same names; the unique
+            # constraint on (user, name) turns those into no-ops.
+            self.bulk_create(
+                [self.model(user=user, name=name) for name in missing],
+                ignore_conflicts=True,
+            )
+            found.update(
+                (obj.name, obj)
+                for obj in self.filter(user=user, name__in=missing)
+            )
+            # bulk_create does not send post_save
+            bump_data_version(user.pk)
+        return found
     
 
 class Recipe(models.Model):
@@ -60,7 +116,21 @@ class Recipe(models.Model):
     link = models.CharField(max_length=255,blank=True) 
     tags = models.ManyToManyField('Tag')
     ingredients = models.ManyToManyField("Ingredient")
-    image = models.ImageField(null=True,upload_to=recipe_image_path)
+    image = models.ImageField(
+        null=True, upload_to=recipe_image_path, storage=get_image_storage
+    )
+    # {format: {width: name}} filled in by recipe.thumbnails
+    thumbnails = models.JSONField(default=dict, blank=True, editable=False)
+    # Title, tag / ingredient names and description; kept up to date by
+    # database triggers (migration 0010) so bulk writes stay covered.
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # Keyset pagination seeks on (user, id).
+            models.Index(fields=["user", "id"], name="recipe_user_id_idx"),
+            GinIndex(fields=["search_vector"], name="recipe_search_idx"),
+        ]
     
     def __str__(self):
         return self.title 
@@ -72,6 +142,28 @@ class Tag(models.Model):
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE
     )  
+    # Recipes using the tag; kept up to date by database triggers on the
+    # through table (migration 0012).
+    recipe_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = NamedObjectManager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["user", "-recipe_count", "name"],
+                name="tag_user_popularity_idx",
+            ),
+        ]
+        constraints = [
+            # Also backs the (name, id) keyset pagination; including id
+            # lets the seeks run as index-only scans.
+            models.UniqueConstraint(
+                fields=["user", "name"],
+                include=["id"],
+                name="tag_unique_user_name",
+            ),
+        ]
     
     def __str__(self):
         return self.name
@@ -83,6 +175,72 @@ class Ingredient(models.Model):
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE
     )    
+    recipe_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = NamedObjectManager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["user", "-recipe_count", "name"],
+                name="ingredient_user_popularity_idx",
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "name"],
+                include=["id"],
+                name="ingredient_unique_user_name",
+            ),
+        ]
     
     def __str__(self):
-        return self.name
\ No newline at end of file
+        return self.name
+
+
+class ImageBlobManager(models.Manager):
+    """Reference counts for content-addressed image files"""
+
+    def acquire(self, name, size):
+        """Add a reference to a blob, registering it on first use"""
+        table = self.model._meta.db_table
+        # One statement, so concurrent uploads of the same file cannot
+        # both register it; the row stays locked until commit.
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {table} (name, size, refcount, created_at)
+                VALUES (%s, %s, 1, now())
+                ON CONFLICT (name)
+                DO UPDATE SET refcount = {table}.refcount + 1
+                """,
+                [name, size],
+            )
+
+    def release(self, name):
+        """Drop a reference; return True if it was the last one.
+
+        Call inside a transaction: the row lock taken here keeps a
+        concurrent acquire() waiting until the caller has removed the
+        file.
+        """
+        updated = self.filter(name=name, refcount__gt=0).update(
+            refcount=models.F("refcount") - 1
+        )
+        if not updated:
+            return False
+        deleted, _ = self.filter(name=name, refcount=0).delete()
+        return bool(deleted)
+
+
+class ImageBlob(models.Model):
+    """An image file shared by every recipe with the same content"""
+    name = models.CharField(max_length=255, unique=True)
+    size = models.PositiveBigIntegerField()
+    refcount = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = ImageBlobManager()
+
+    def __str__(self):
+        return self.name
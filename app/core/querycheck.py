@@ -0,0 +1,145 @@
+"""
+Fingerprint the SQL a request runs and flag N+1 patterns, slow
+statements and endpoints over their query budget
+"""
+import contextvars
+import os
+import re
+import sys
+import time
+
+from django.conf import settings
+
+# Queries of the request being checked by this thread / task
+current_log = contextvars.ContextVar("current_log", default=None)
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%s|\?")
+_VALUES_LIST = re.compile(r"\?(?:\s*,\s*\?)+")
+_VALUES_ROWS = re.compile(r"\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+")
+_SPACE = re.compile(r"\s+")
+
+# Transaction control, repeated by design around every atomic block
+_IGNORED = ("SAVEPOINT", "RELEASE SAVEPOINT", "ROLLBACK TO SAVEPOINT")
+
+
+class QueryCheckError(AssertionError):
+    """A request broke a query check; raised when QUERY_CHECK["RAISE"]"""
+
+
+def fingerprint(sql):
+    """Reduce a statement to its shape, e.g. ``... WHERE "id" IN (...)``
+
+    Literals and placeholders become ``?`` and lists of them ``...``, so
+    the same query for another row or a longer IN list matches.
+    """
+    sql = _STRING.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    sql = _PLACEHOLDER.sub("?", sql)
+    sql = _VALUES_LIST.sub("...", sql)
+    sql = sql.replace("(?)", "(...)")
+    sql = _VALUES_ROWS.sub("(...)", sql)
+    return _SPACE.sub(" ", sql).strip()
+
+
+def app_frame(apps):
+    """Return "path:line in function" of the innermost frame in apps"""
+    roots = tuple(
+        os.path.join(settings.BASE_DIR, app) + os.sep for app in apps
+    )
+    tests = os.sep + "tests" + os.sep
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(roots) and tests not in filename:
+            return "%s:%d in %s" % (
+                os.path.relpath(filename, settings.BASE_DIR),
+                frame.f_lineno,
+                frame.f_code.co_name,
+            )
+        frame = frame.f_back
+    return None
+
+
+class Finding:
+    """One problem found in the queries of a request"""
+
+    def __init__(self, kind, message, sql=None, frame=None):
+        self.kind = kind
+        self.message = message
+        self.sql = sql
+        self.frame = frame
+
+    def __str__(self):
+        text = self.message
+        if self.frame:
+            text += f"\n    at {self.frame}"
+        if self.sql:
+            text += f"\n    {self.sql}"
+        return text
+
+
+class QueryLog:
+    """Statements run while one request is handled"""
+
+    def __init__(self, apps):
+        self.apps = apps
+        self.queries = []
+
+    def record(self, sql, seconds):
+        self.queries.append((sql, seconds, app_frame(self.apps)))
+
+    def findings(self, repeat_threshold, slow_seconds, budget=None):
+        """Return repeated shapes, slow statements and a budget overrun.
+
+        A threshold or budget of None turns that check off.
+        """
+        found = []
+        if budget is not None and len(self.queries) > budget:
+            found.append(Finding(
+                "budget",
+                f"{len(self.queries)} queries, over the budget of {budget}",
+            ))
+
+        shapes = {}
+        for sql, seconds, frame in self.queries:
+            shape = fingerprint(sql)
+            if not shape.startswith(_IGNORED):
+                shapes.setdefault(shape, []).append(frame)
+            if slow_seconds is not None and seconds > slow_seconds:
+                found.append(Finding(
+                    "slow",
+                    f"query took {seconds * 1000:.0f}ms",
+                    sql,
+                    frame,
+                ))
+        if repeat_threshold is None:
+            return found
+        for shape, frames in shapes.items():
+            if len(frames) >= repeat_threshold:
+                found.append(Finding(
+                    "repeated",
+                    f"same query shape ran {len(frames)} times",
+                    shape,
+                    frames[0],
+                ))
+        return found
+
+
+def execute_wrapper(execute, sql, params, many, context):
+    """Log queries run for the request being checked"""
+    log = current_log.get()
+    if log is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        log.record(sql, time.perf_counter() - start)
+
+
+def install_execute_wrapper(sender=None, connection=None, **kwargs):
+    """Keep execute_wrapper() on a connection; see core.metrics"""
+    if execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(execute_wrapper)
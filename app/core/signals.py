@@ -0,0 +1,83 @@
+"""
+Signal handlers for the core models
+"""
+from django.contrib.auth import get_user_model
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_init,
+    post_save,
+)
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from core.authentication import invalidate_tokens, invalidate_user
+from core.models import Ingredient, Recipe, Tag
+from core.storage import image_storage
+from core.versioning import bump_data_version
+
+
+@receiver(post_delete, sender=Token)
+def forget_deleted_token(sender, instance, **kwargs):
+    """Drop a deleted token from the auth cache"""
+    invalidate_tokens([instance.key])
+
+
+@receiver(post_save, sender=get_user_model())
+def forget_user_tokens(sender, instance, created, **kwargs):
+    """Drop cached auth for a user whose account changed"""
+    if created:
+        return
+    invalidate_tokens(
+        Token.objects.filter(user=instance).values_list("key", flat=True)
+    )
+    invalidate_user(instance.pk)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def bump_owner_data_version(sender, instance, **kwargs):
+    """Invalidate the owner's cached list responses"""
+    bump_data_version(instance.user_id)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def bump_data_version_m2m(sender, instance, action, **kwargs):
+    """Invalidate the owner's cached lists when recipe membership changes"""
+    if action in ("post_add", "post_remove", "post_clear"):
+        bump_data_version(instance.user_id)
+
+
+def _stored_image(instance):
+    """Name of the recipe's image as loaded from the database"""
+    value = instance.__dict__.get("image")
+    return getattr(value, "name", value) or None
+
+
+@receiver(post_init, sender=Recipe)
+def remember_image(sender, instance, **kwargs):
+    """Keep the loaded image name to spot replacements on save"""
+    instance._stored_image = _stored_image(instance)
+
+
+@receiver(post_save, sender=Recipe)
+def release_replaced_image(sender, instance, **kwargs):
+    """Drop the reference to an image the recipe no longer uses"""
+    old = getattr(instance, "_stored_image", None)
+    new = _stored_image(instance)
+    if old and old != new:
+        image_storage.release_on_commit(old)
+    instance._stored_image = new
+
+
+@receiver(post_delete, sender=Recipe)
+def release_deleted_image(sender, instance, **kwargs):
+    """Drop the reference held by a deleted recipe"""
+    name = _stored_image(instance)
+    if name:
+        image_storage.release_on_commit(name)
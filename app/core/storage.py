@@ -0,0 +1,90 @@
+"""
+Content-addressed storage for uploaded images
+"""
+import hashlib
+import os
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.utils.deconstruct import deconstructible
+
+# Resized copies of a blob live next to it as thumbs/<stem>-<width>.<fmt>
+THUMBS_DIR = "thumbs"
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """File system storage that names files by the SHA-256 of their bytes.
+
+    Only the directory and extension of the requested name are kept, so
+    ``uploads/recipe/<uuid>.jpg`` is stored as
+    ``uploads/recipe/ab/cd/abcd...ef.jpg``. Identical uploads share one
+    file, counted by ``ImageBlob``; the file and its thumbnails are
+    removed once the last reference is released.
+    """
+
+    def _save(self, name, content):
+        from core.models import ImageBlob
+
+        directory, filename = os.path.split(name)
+        ext = os.path.splitext(filename)[1].lower()
+        os.makedirs(self.path(directory), exist_ok=True)
+
+        # Hash while copying, so the upload is only read once.
+        digest = hashlib.sha256()
+        fd, tmp_path = tempfile.mkstemp(dir=self.path(directory), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as tmp:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    tmp.write(chunk)
+                size = tmp.tell()
+
+            sha = digest.hexdigest()
+            name = os.path.join(directory, sha[:2], sha[2:4], sha + ext)
+            ImageBlob.objects.acquire(name, size)
+            if self.exists(name):
+                return name
+            full_path = self.path(name)
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            os.chmod(tmp_path, self.file_permissions_mode or 0o644)
+            # Same name means same bytes, so a concurrent writer of the
+            # same file is harmless.
+            os.replace(tmp_path, full_path)
+            return name
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def delete_blob(self, name):
+        """Remove a blob and its thumbnails"""
+        self.delete(name)
+        directory, filename = os.path.split(name)
+        thumbs = os.path.join(directory, THUMBS_DIR)
+        prefix = os.path.splitext(filename)[0] + "-"
+        if not self.exists(thumbs):
+            return
+        for thumb in self.listdir(thumbs)[1]:
+            if thumb.startswith(prefix):
+                self.delete(os.path.join(thumbs, thumb))
+
+    def release(self, name):
+        """Drop one reference to a blob, deleting it if it was the last"""
+        from core.models import ImageBlob
+
+        with transaction.atomic():
+            if ImageBlob.objects.release(name):
+                self.delete_blob(name)
+
+    def release_on_commit(self, name):
+        """Release a blob once the current transaction commits"""
+        transaction.on_commit(lambda: self.release(name))
+
+
+image_storage = ContentAddressedStorage()
+
+
+def get_image_storage():
+    """Storage for recipe images"""
+    return image_storage
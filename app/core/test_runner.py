@@ -0,0 +1,46 @@
+"""
+Test runner that runs every test request through the query checks
+"""
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class QueryCheckRunner(DiscoverRunner):
+    """Fail tests whose requests exceed a view's query budget.
+
+    With --query-check, repeated query shapes and slow statements fail
+    them too (thresholds from QUERY_CHECK).
+    """
+
+    def __init__(self, query_check=False, **kwargs):
+        super().__init__(**kwargs)
+        self.query_check = query_check
+        self._override = None
+
+    @classmethod
+    def add_arguments(cls, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            "--query-check",
+            action="store_true",
+            help="Also fail tests on N+1 query patterns and slow queries.",
+        )
+
+    def query_check_settings(self):
+        """Return QUERY_CHECK for the test run"""
+        options = {**settings.QUERY_CHECK, "ENABLED": True, "RAISE": True}
+        if not self.query_check:
+            options.update(REPEAT_THRESHOLD=None, SLOW_QUERY_MS=None)
+        return options
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._override = override_settings(
+            QUERY_CHECK=self.query_check_settings()
+        )
+        self._override.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._override.disable()
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,324 @@
+"""Tests for the cached token authentication"""
+
+import io
+import time
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db.models import F
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.authentication import (
+    LRUCache,
+    token_cache,
+    token_cache_stats,
+)
+from core.throttling import login_buckets
+
+ME_URL = reverse("user:me")
+TOKEN_URL = reverse("user:token")
+REFRESH_URL = reverse("user:token-refresh")
+RECIPES_URL = reverse("recipe:recipe-list")
+
+
+class LRUCacheTests(TestCase):
+    """Test the in-process LRU cache"""
+
+    def test_evicts_least_recently_used(self):
+        """Test the oldest unused entry is evicted when full"""
+        cache = LRUCache(maxsize=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("c"), 3)
+
+    @patch("core.authentication.time.monotonic")
+    def test_entries_expire(self, mock_monotonic):
+        """Test entries are dropped after the TTL"""
+        mock_monotonic.return_value = 100
+        cache = LRUCache(maxsize=2, ttl=10)
+        cache.set("a", 1)
+
+        mock_monotonic.return_value = 111
+
+        self.assertIsNone(cache.get("a"))
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    """Test requests authenticated with a cached token"""
+
+    def setUp(self):
+        token_cache.clear()
+        token_cache_stats.reset()
+        self.user = get_user_model().objects.create_user(
+            email="user@example.com",
+            password="test123",
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+
+    def test_second_request_skips_token_query(self):
+        """Test the token lookup is served from cache after the first hit"""
+        self.client.get(ME_URL)
+
+        with self.assertNumQueries(0):
+            res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["email"], self.user.email)
+        stats = token_cache_stats.snapshot()
+        self.assertEqual(stats["miss"], 1)
+        self.assertEqual(stats["local"], 1)
+        self.assertEqual(stats["hit_ratio"], 0.5)
+
+    def test_deleted_token_is_rejected(self):
+        """Test deleting a token invalidates the cached entry"""
+        self.client.get(ME_URL)
+        self.token.delete()
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_user_is_rejected(self):
+        """Test deactivating a user invalidates the cached entry"""
+        self.client.get(ME_URL)
+        self.user.is_active = False
+        self.user.save()
+
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_profile_update_refreshes_cached_user(self):
+        """Test updating the profile is visible on the next request"""
+        self.client.get(ME_URL)
+
+        self.client.patch(ME_URL, {"username": "new name"})
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.data["username"], "new name")
+
+    def test_profile_update_keeps_data_version(self):
+        """Test a stale cached user does not roll back the data version"""
+        self.client.get(ME_URL)
+        # Recipe writes bump the version without a signal.
+        get_user_model().objects.bump_data_version(self.user.pk)
+        self.user.refresh_from_db()
+        version = self.user.data_version
+
+        self.client.patch(ME_URL, {"username": "new name"})
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.data_version, version)
+        self.assertEqual(self.user.username, "new name")
+
+    def test_invalid_token(self):
+        """Test an unknown token is rejected and not cached"""
+        self.client.credentials(HTTP_AUTHORIZATION="Token invalid")
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(token_cache_stats.snapshot()["miss"], 1)
+
+
+class TokenExpiryTests(TestCase):
+    """Test stored tokens expire, slide and rotate"""
+
+    def setUp(self):
+        token_cache.clear()
+        login_buckets.clear()
+        self.user = get_user_model().objects.create_user(
+            email="user@example.com",
+            password="test123",
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+
+    def _age(self, seconds):
+        Token.objects.filter(pk=self.token.pk).update(
+            created=timezone.now() - timedelta(seconds=seconds)
+        )
+
+    @override_settings(AUTH_TOKENS={
+        "TTL": 600, "REFRESH_AFTER": 60, "SIGNED": False,
+    })
+    def test_expired_token_rejected(self):
+        """Test a token unused for longer than the TTL is rejected"""
+        self._age(601)
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(AUTH_TOKENS={
+        "TTL": 600, "REFRESH_AFTER": 60, "SIGNED": False,
+    })
+    def test_use_slides_expiry(self):
+        """Test using a token past REFRESH_AFTER moves its expiry"""
+        self._age(500)
+
+        res = self.client.get(ME_URL)
+        self.token.refresh_from_db()
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertLess(timezone.now() - self.token.created,
+                        timedelta(seconds=60))
+
+    @override_settings(AUTH_TOKENS={
+        "TTL": 600, "REFRESH_AFTER": 60, "SIGNED": False,
+    })
+    def test_login_replaces_expired_token(self):
+        """Test logging in again hands out a new key once expired"""
+        payload = {"email": "user@example.com", "password": "test123"}
+        res = self.client.post(TOKEN_URL, payload)
+        self.assertEqual(res.data["token"], self.token.key)
+
+        self._age(601)
+        res = self.client.post(TOKEN_URL, payload)
+
+        self.assertNotEqual(res.data["token"], self.token.key)
+        self.assertEqual(Token.objects.get(user=self.user).key,
+                         res.data["token"])
+
+    def test_refresh_rotates_token(self):
+        """Test the refresh endpoint swaps the key and drops the old one"""
+        res = self.client.post(REFRESH_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res.data["token"], self.token.key)
+        self.assertEqual(
+            self.client.get(ME_URL).status_code,
+            status.HTTP_401_UNAUTHORIZED,
+        )
+
+    def test_password_change_revokes_tokens(self):
+        """Test changing the password ends existing tokens"""
+        self.client.get(ME_URL)
+
+        self.client.patch(ME_URL, {"password": "newpass123"})
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.token_version, 1)
+
+    @override_settings(AUTH_TOKENS={
+        "TTL": 600, "REFRESH_AFTER": 60, "SIGNED": False,
+    })
+    def test_purge_deletes_expired(self):
+        """Test the purge command only deletes expired tokens"""
+        other = get_user_model().objects.create_user(
+            email="other@example.com", password="test123"
+        )
+        fresh = Token.objects.create(user=other)
+        self._age(601)
+
+        call_command("purge_tokens", stdout=io.StringIO())
+
+        self.assertEqual(list(Token.objects.all()), [fresh])
+
+
+@override_settings(AUTH_TOKENS={
+    "TTL": 600, "REFRESH_AFTER": 60, "SIGNED": True,
+})
+class SignedTokenTests(TestCase):
+    """Test stateless signed tokens"""
+
+    def setUp(self):
+        token_cache.clear()
+        login_buckets.clear()
+        self.user = get_user_model().objects.create_user(
+            email="user@example.com",
+            password="test123",
+        )
+        self.client = APIClient()
+        res = self.client.post(
+            TOKEN_URL, {"email": "user@example.com", "password": "test123"}
+        )
+        self.key = res.data["token"]
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.key}")
+
+    def test_login_stores_no_token(self):
+        """Test signed logins leave the token table alone"""
+        self.assertFalse(Token.objects.exists())
+        self.assertTrue(self.key.startswith(f"{self.user.pk}.0:"))
+
+    def test_verified_without_queries(self):
+        """Test a cached user makes verification query free"""
+        self.client.get(ME_URL)
+
+        with self.assertNumQueries(0):
+            res = self.client.get(ME_URL)
+
+        self.assertEqual(res.data["email"], self.user.email)
+
+    def test_tampered_token_rejected(self):
+        """Test a token for another user id fails the signature"""
+        forged = "9" + self.key
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {forged}")
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_expired_token_rejected(self):
+        """Test a signed token is rejected after the TTL"""
+        with patch("django.core.signing.time.time",
+                   return_value=time.time() + 601):
+            res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_revoked_by_token_version(self):
+        """Test bumping the user's token version revokes the token"""
+        self.client.get(ME_URL)
+
+        self.client.patch(ME_URL, {"password": "newpass123"})
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_refresh_revokes_old_token(self):
+        """Test a refreshed signed token replaces the old one"""
+        self.client.get(ME_URL)
+
+        res = self.client.post(REFRESH_URL)
+        new_key = res.data["token"]
+
+        self.assertNotEqual(new_key, self.key)
+        self.assertEqual(self.client.get(ME_URL).status_code,
+                         status.HTTP_401_UNAUTHORIZED)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {new_key}")
+        self.assertEqual(self.client.get(ME_URL).status_code,
+                         status.HTTP_200_OK)
+
+    def test_stale_profile_update_keeps_revocation(self):
+        """Test a PATCH from a stale cached user cannot undo a revoke"""
+        self.client.get(ME_URL)
+        # Another worker revokes; this worker's cache keeps version 0.
+        get_user_model().objects.filter(pk=self.user.pk).update(
+            token_version=F("token_version") + 1
+        )
+
+        self.client.patch(ME_URL, {"username": "new name"})
+        token_cache.clear()
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.token_version, 1)
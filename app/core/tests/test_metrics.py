@@ -0,0 +1,187 @@
+"""Tests for the request metrics middleware and /metrics"""
+
+import json
+import os
+import tempfile
+from unittest.mock import patch
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.metrics import merge_snapshots, registry
+from core.middleware import MetricsMiddleware
+from core.views import metrics
+
+METRICS_URL = reverse("metrics")
+RECIPES_URL = reverse("recipe:recipe-list")
+TOKEN_URL = reverse("user:token")
+
+
+def metrics_settings(**overrides):
+    return {**settings.METRICS, "ENABLED": True, "TOKEN": "secret",
+            **overrides}
+
+
+def sample(body, line_start):
+    """Return the value of the first sample line starting with line_start"""
+    for line in body.splitlines():
+        if line.startswith(line_start):
+            return float(line.rsplit(" ", 1)[1])
+    raise AssertionError(f"{line_start} not in metrics")
+
+
+class MetricsDisabledTests(TestCase):
+    """Test metrics are off by default"""
+
+    def test_metrics_not_found(self):
+        """Test /metrics is not served"""
+        res = APIClient().get(METRICS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+
+@override_settings(METRICS=metrics_settings())
+class MetricsTests(TestCase):
+    """Test per-view metrics recorded by MetricsMiddleware"""
+
+    def setUp(self):
+        cache.clear()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.directory = tmp.name
+        patcher = patch.object(registry, "directory", self.directory)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        registry.reset()
+        self.user = get_user_model().objects.create_user(
+            "user@example.com", "testpass123"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def scrape(self):
+        res = APIClient().get(
+            METRICS_URL, HTTP_AUTHORIZATION="Bearer secret"
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res["Content-Type"].startswith("text/plain"))
+        return res.content.decode()
+
+    def test_view_metrics(self):
+        """Test latency, queries, serializer time and size per action"""
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(RECIPES_URL)
+        # The next request resets connection.queries.
+        queries = len(ctx.captured_queries)
+
+        body = self.scrape()
+        view = '{view="RecipeViewSet.list"'
+        self.assertEqual(
+            sample(body, f"api_request_duration_seconds_count{view}}}"), 1
+        )
+        self.assertEqual(
+            sample(body, f'api_request_duration_seconds_bucket{view},'
+                         f'le="+Inf"}}'),
+            1,
+        )
+        self.assertEqual(
+            sample(body, f'api_requests_total{view},status="200"}}'), 1
+        )
+        self.assertEqual(
+            sample(body, f"api_db_queries_total{view}}}"), queries
+        )
+        self.assertGreater(sample(body, f"api_db_seconds_total{view}}}"), 0)
+        self.assertGreater(
+            sample(body, f"api_serializer_seconds_total{view}}}"), 0
+        )
+        self.assertEqual(
+            sample(body, f"api_response_bytes_total{view}}}"),
+            len(res.content),
+        )
+
+    def test_view_labels(self):
+        """Test APIViews are labelled by class and errors by status"""
+        self.client.post(TOKEN_URL, {"email": "user@example.com",
+                                     "password": "wrong"})
+
+        body = self.scrape()
+        self.assertEqual(
+            sample(body, 'api_requests_total{view="TokenView",status="400"}'),
+            1,
+        )
+
+    def test_token_cache_lookups(self):
+        """Test token cache counters are exported"""
+        body = self.scrape()
+
+        self.assertIn('api_token_cache_lookups_total{outcome="miss"}', body)
+
+    def test_merges_other_workers(self):
+        """Test snapshots published by other processes are added"""
+        self.client.get(RECIPES_URL)
+        other = registry.snapshot()
+        with open(os.path.join(self.directory, "999999999.json"), "w") as f:
+            json.dump(other, f)
+
+        body = self.scrape()
+
+        self.assertEqual(
+            sample(body, 'api_request_duration_seconds_count'
+                         '{view="RecipeViewSet.list"}'),
+            2,
+        )
+
+    def test_publishes_snapshot(self):
+        """Test a request writes this process's snapshot file"""
+        self.client.get(RECIPES_URL)
+
+        with open(registry.path) as f:
+            snapshot = json.load(f)
+        self.assertEqual(snapshot["views"]["RecipeViewSet.list"]["count"], 1)
+
+    def test_token_required(self):
+        """Test the token guards /metrics"""
+        client = APIClient()
+
+        self.assertEqual(client.get(METRICS_URL).status_code,
+                         status.HTTP_401_UNAUTHORIZED)
+        res = client.get(METRICS_URL, HTTP_AUTHORIZATION="Bearer wrong")
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(METRICS=metrics_settings(TOKEN=""))
+    def test_token_must_be_configured(self):
+        """Test metrics refuse to start without a token"""
+        with self.assertRaises(ImproperlyConfigured):
+            MetricsMiddleware(lambda request: None)
+        request = RequestFactory().get(
+            METRICS_URL, HTTP_AUTHORIZATION="Bearer "
+        )
+        self.assertEqual(metrics(request).status_code,
+                         status.HTTP_401_UNAUTHORIZED)
+
+
+class MergeSnapshotsTests(TestCase):
+    """Test snapshots of several workers are summed"""
+
+    def test_merge(self):
+        """Test buckets, totals and statuses add up"""
+        snapshot = {
+            "views": {"V.list": {"buckets": [1, 0], "count": 1,
+                                 "seconds": 0.5, "statuses": {"200": 1}}},
+            "token_cache": {"miss": 2},
+        }
+
+        merged = merge_snapshots([snapshot, snapshot])
+
+        self.assertEqual(merged["views"]["V.list"]["buckets"], [2, 0])
+        self.assertEqual(merged["views"]["V.list"]["count"], 2)
+        self.assertEqual(merged["views"]["V.list"]["statuses"], {"200": 2})
+        self.assertEqual(merged["token_cache"], {"miss": 4})
@@ -1,8 +1,11 @@
 """"Test for models"""
 
 
+from io import StringIO
 from unittest.mock import patch
+from django.core.management import call_command
 from django.test import TestCase
+from django.db import IntegrityError
 from django.contrib.auth import get_user_model
 from decimal import Decimal
 from core import models
@@ -81,6 +84,28 @@ class ModelTest (TestCase):
         
         self.assertEqual(str(ingredient),ingredient.name)   
     
+    def test_tag_name_unique_per_user(self):
+        """Test a user cannot have two tags with the same name"""
+        user = create_user()
+        models.Tag.objects.create(user=user, name="Tag1")
+
+        with self.assertRaises(IntegrityError):
+            models.Tag.objects.create(user=user, name="Tag1")
+
+    def test_get_or_create_by_names(self):
+        """Test resolving names creates only the missing objects"""
+        user = create_user()
+        existing = models.Ingredient.objects.create(user=user, name="Salt")
+
+        objs = models.Ingredient.objects.get_or_create_by_names(
+            user, ["Salt", "Pepper", "Salt"]
+        )
+
+        self.assertEqual(list(objs), ["Salt", "Pepper"])
+        self.assertEqual(objs["Salt"], existing)
+        self.assertIsNotNone(objs["Pepper"].pk)
+        self.assertEqual(models.Ingredient.objects.count(), 2)
+
     @patch("core.models.uuid.uuid4")
     def test_recipe_file_name_uuid(self,mock_uuid):
         """Test generating image paths"""
@@ -90,4 +115,70 @@ class ModelTest (TestCase):
         file_path = models.recipe_image_path(None, 'example.jpg')
 
         self.assertEqual(file_path, f'uploads/recipe/{uuid}.jpg')
-        
\ No newline at end of file
+
+
+class RecipeCountTests(TestCase):
+    """Test the trigger maintained recipe_count on tags and ingredients"""
+
+    def setUp(self):
+        self.user = create_user()
+        self.tag = models.Tag.objects.create(user=self.user, name="Vegan")
+        self.other_tag = models.Tag.objects.create(user=self.user, name="Quick")
+        self.salt = models.Ingredient.objects.create(
+            user=self.user, name="Salt"
+        )
+
+    def _recipe(self):
+        return models.Recipe.objects.create(
+            user=self.user, title="Soup", time_minutes=5, price=Decimal("1")
+        )
+
+    def assertCounts(self, tag, other_tag, salt):
+        for obj, expected in [(self.tag, tag), (self.other_tag, other_tag),
+                              (self.salt, salt)]:
+            obj.refresh_from_db()
+            self.assertEqual(obj.recipe_count, expected, obj.name)
+
+    def test_add_remove_set_clear(self):
+        """Test membership changes update the counts"""
+        first, second = self._recipe(), self._recipe()
+        first.tags.add(self.tag, self.other_tag)
+        second.tags.add(self.tag)
+        first.ingredients.add(self.salt)
+        self.assertCounts(2, 1, 1)
+
+        first.tags.remove(self.other_tag)
+        second.tags.remove(self.other_tag)
+        self.assertCounts(2, 0, 1)
+
+        first.tags.set([self.other_tag])
+        self.assertCounts(1, 1, 1)
+
+        first.tags.clear()
+        first.ingredients.clear()
+        self.assertCounts(1, 0, 0)
+
+    def test_recipe_delete(self):
+        """Test deleting recipes drops their links from the counts"""
+        recipe = self._recipe()
+        recipe.tags.add(self.tag)
+        recipe.ingredients.add(self.salt)
+
+        models.Recipe.objects.filter(user=self.user).delete()
+
+        self.assertCounts(0, 0, 0)
+
+    def test_repair_command(self):
+        """Test the repair command recomputes drifted counts"""
+        recipe = self._recipe()
+        recipe.tags.add(self.tag)
+        models.Tag.objects.update(recipe_count=7)
+
+        out = StringIO()
+        call_command("repair_recipe_counts", "--dry-run", stdout=out)
+        self.assertIn("tags: 2 to fix", out.getvalue())
+        self.tag.refresh_from_db()
+        self.assertEqual(self.tag.recipe_count, 7)
+
+        call_command("repair_recipe_counts", stdout=StringIO())
+        self.assertCounts(1, 0, 0)
@@ -0,0 +1,71 @@
+"""Tests for the query plan regression commands"""
+
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from core.management.commands.check_query_plans import seq_scans
+from core.models import Ingredient, Recipe, Tag
+
+
+class QueryPlanTests(TestCase):
+    """Test every recipe endpoint query is served by an index"""
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command(
+            "seed_recipes",
+            users=3,
+            recipes=300,
+            tags=20,
+            ingredients=40,
+            stdout=StringIO(),
+        )
+
+    def test_seed_recipes(self):
+        """Test the seed command creates the requested dataset"""
+        self.assertEqual(Recipe.objects.count(), 900)
+        self.assertEqual(Tag.objects.count(), 60)
+        self.assertEqual(Ingredient.objects.count(), 120)
+        self.assertEqual(Recipe.tags.through.objects.count(), 3600)
+
+    def test_endpoint_queries_use_indexes(self):
+        """Test no endpoint needs a sequential scan"""
+        out = StringIO()
+
+        call_command(
+            "check_query_plans",
+            disable_seqscan=True,
+            min_rows=0,
+            stdout=out,
+        )
+
+        self.assertIn("all endpoint queries use indexes", out.getvalue())
+
+    def test_benchmark_recipe_filters(self):
+        """Test every filter variant agrees on the matching recipes"""
+        out = StringIO()
+
+        call_command("benchmark_recipe_filters", repeat=1, stdout=out)
+
+        unique = {}
+        for line in out.getvalue().splitlines()[1:]:
+            mode = line.split(":")[0]
+            unique.setdefault(mode, set()).add(
+                line.split("unique=")[1].split()[0]
+            )
+        self.assertEqual(set(unique), {"any", "all"})
+        self.assertEqual(len(unique["any"]), 1)
+        self.assertEqual(len(unique["all"]), 1)
+
+    def test_seq_scans_parses_plans(self):
+        """Test sequential scans on core tables are detected"""
+        plan = (
+            "Limit  (cost=3.66..3.79 rows=50 width=22)\n"
+            "  ->  Seq Scan on core_tag  (cost=0.00..2.25 rows=50 width=22)\n"
+            "  ->  Seq Scan on auth_group  (cost=0.00..1.00 rows=1 width=4)\n"
+            "  ->  Index Scan using core_recipe_pkey on core_recipe\n"
+        )
+
+        self.assertEqual(seq_scans(plan), ["core_tag"])
@@ -0,0 +1,213 @@
+"""Tests for the N+1 / slow query detector"""
+
+from unittest.mock import patch
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag
+from core.querycheck import QueryCheckError, QueryLog, fingerprint
+from core.test_runner import QueryCheckRunner
+from recipe.rows import RowSerializer
+
+RECIPES_URL = reverse("recipe:recipe-list")
+
+
+def query_check(**overrides):
+    return {
+        **settings.QUERY_CHECK,
+        "ENABLED": True,
+        "RAISE": True,
+        "REPEAT_THRESHOLD": 3,
+        "SLOW_QUERY_MS": 1000,
+        **overrides,
+    }
+
+
+class FingerprintTests(SimpleTestCase):
+    """Test statements are reduced to their shape"""
+
+    def test_literals_and_placeholders(self):
+        """Test values do not change the shape"""
+        self.assertEqual(
+            fingerprint('SELECT "a" FROM "t" WHERE "id" = 1 AND "n" = \'x\''),
+            fingerprint('SELECT "a" FROM "t" WHERE "id" = %s AND "n" = %s'),
+        )
+
+    def test_in_lists(self):
+        """Test IN lists of any length match"""
+        self.assertEqual(
+            fingerprint('SELECT 1 FROM "t" WHERE "id" IN (%s, %s, %s)'),
+            'SELECT ? FROM "t" WHERE "id" IN (...)',
+        )
+        self.assertEqual(
+            fingerprint('SELECT 1 FROM "t" WHERE "id" IN (%s)'),
+            'SELECT ? FROM "t" WHERE "id" IN (...)',
+        )
+
+    def test_values_rows(self):
+        """Test multi-row inserts match single-row ones"""
+        self.assertEqual(
+            fingerprint('INSERT INTO "t" ("a", "b") VALUES (%s, %s), '
+                        '(%s, %s)'),
+            fingerprint('INSERT INTO "t" ("a", "b") VALUES (%s, %s)'),
+        )
+
+    def test_identifiers_kept(self):
+        """Test digits inside names are not replaced"""
+        self.assertIn('"s140_x1"', fingerprint('SAVEPOINT "s140_x1"'))
+
+
+class QueryLogTests(SimpleTestCase):
+    """Test the findings of a request's queries"""
+
+    def setUp(self):
+        self.log = QueryLog(["recipe", "user"])
+
+    def test_repeated_shape(self):
+        """Test a shape run threshold times is reported once"""
+        for pk in range(3):
+            self.log.record(f'SELECT * FROM "t" WHERE "id" = {pk}', 0)
+        self.log.record('SELECT * FROM "u"', 0)
+
+        findings = self.log.findings(3, 1)
+
+        self.assertEqual([f.kind for f in findings], ["repeated"])
+        self.assertIn("ran 3 times", str(findings[0]))
+        self.assertEqual(findings[0].sql, 'SELECT * FROM "t" WHERE "id" = ?')
+
+    def test_savepoints_ignored(self):
+        """Test transaction control statements are not an N+1"""
+        for _ in range(5):
+            self.log.record('SAVEPOINT "s1_x1"', 0)
+            self.log.record('RELEASE SAVEPOINT "s1_x1"', 0)
+
+        self.assertEqual(self.log.findings(3, 1), [])
+
+    def test_slow_query(self):
+        """Test statements over the time budget are reported"""
+        self.log.record('SELECT * FROM "t"', 0.5)
+        self.log.record('SELECT * FROM "u"', 0.01)
+
+        findings = self.log.findings(3, 0.1)
+
+        self.assertEqual([f.kind for f in findings], ["slow"])
+        self.assertIn("500ms", str(findings[0]))
+
+    def test_budget(self):
+        """Test more queries than the budget are reported"""
+        self.log.record('SELECT * FROM "t"', 0)
+        self.log.record('SELECT * FROM "u"', 0)
+
+        self.assertEqual(self.log.findings(None, None, budget=2), [])
+        findings = self.log.findings(None, None, budget=1)
+        self.assertIn("over the budget of 1", str(findings[0]))
+
+    def test_checks_off(self):
+        """Test None turns the repeat and time checks off"""
+        for _ in range(3):
+            self.log.record('SELECT * FROM "t"', 5)
+
+        self.assertEqual(self.log.findings(None, None), [])
+
+
+class QueryCheckMiddlewareTests(TestCase):
+    """Test requests are checked by QueryCheckMiddleware"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            "user@example.com", "testpass123"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        recipe = Recipe.objects.create(
+            user=self.user, title="Soup", time_minutes=5, price="1.00"
+        )
+        for name in ["a", "b", "c"]:
+            recipe.tags.add(Tag.objects.create(user=self.user, name=name))
+
+    def n_plus_one(self):
+        """Patch the list to load each tag on its own, like a regression"""
+        original = RowSerializer.to_representation
+
+        def to_representation(serializer, rows):
+            for tag in Tag.objects.filter(user=self.user):
+                Tag.objects.get(id=tag.id)
+            return original(serializer, rows)
+        return patch.object(RowSerializer, "to_representation",
+                            to_representation)
+
+    @override_settings(QUERY_CHECK=query_check())
+    def test_n_plus_one_raised(self):
+        """Test repeated shapes name the recipe code that ran them"""
+        with self.n_plus_one(), self.assertRaises(QueryCheckError) as ctx:
+            self.client.get(RECIPES_URL)
+
+        report = str(ctx.exception)
+        self.assertIn("GET /api/recipe/recipes/ (RecipeViewSet.list)", report)
+        self.assertIn("same query shape ran 3 times", report)
+        self.assertIn('WHERE "core_tag"."id" = ?', report)
+        self.assertIn("at recipe/rows.py:", report)
+
+    @override_settings(QUERY_CHECK=query_check(RAISE=False))
+    def test_n_plus_one_logged(self):
+        """Test findings are logged as warnings without RAISE"""
+        with self.n_plus_one(), \
+                self.assertLogs("core.middleware", "WARNING") as logs:
+            res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn("same query shape ran 3 times", logs.output[0])
+
+    @override_settings(QUERY_CHECK=query_check())
+    def test_budget_exceeded(self):
+        """Test a view over its declared budget fails"""
+        budget = {"list": 1}
+        with patch("recipe.views.RecipeViewSet.query_budget", budget), \
+                self.assertRaises(QueryCheckError) as ctx:
+            self.client.get(RECIPES_URL)
+
+        self.assertIn("over the budget of 1", str(ctx.exception))
+
+    @override_settings(QUERY_CHECK=query_check())
+    def test_within_budget(self):
+        """Test the declared budgets hold for the recipe endpoints"""
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    @override_settings(QUERY_CHECK=query_check(ENABLED=False))
+    def test_disabled(self):
+        """Test nothing is checked when disabled"""
+        with self.n_plus_one():
+            res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+
+class QueryCheckRunnerTests(SimpleTestCase):
+    """Test the settings the test runner applies"""
+
+    def test_budgets_only_by_default(self):
+        """Test only budgets are checked without --query-check"""
+        options = QueryCheckRunner().query_check_settings()
+
+        self.assertTrue(options["ENABLED"])
+        self.assertTrue(options["RAISE"])
+        self.assertIsNone(options["REPEAT_THRESHOLD"])
+        self.assertIsNone(options["SLOW_QUERY_MS"])
+
+    def test_query_check_option(self):
+        """Test --query-check adds the repeat and time checks"""
+        options = QueryCheckRunner(query_check=True).query_check_settings()
+
+        self.assertEqual(options["REPEAT_THRESHOLD"],
+                         settings.QUERY_CHECK["REPEAT_THRESHOLD"])
+        self.assertEqual(options["SLOW_QUERY_MS"],
+                         settings.QUERY_CHECK["SLOW_QUERY_MS"])
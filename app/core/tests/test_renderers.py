@@ -0,0 +1,93 @@
+"""Tests for the orjson renderer and parser"""
+
+import io
+import uuid
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ErrorDetail, ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.serializer_helpers import ReturnDict
+
+from core import renderers
+from core.renderers import ORJSONParser, ORJSONRenderer
+
+
+class ORJSONRendererTests(SimpleTestCase):
+    """Test ORJSONRenderer renders the same bytes as JSONRenderer"""
+
+    def assertSameBytes(self, data, accepted_media_type=None):
+        self.assertEqual(
+            ORJSONRenderer().render(data, accepted_media_type),
+            JSONRenderer().render(data, accepted_media_type),
+        )
+
+    def test_plain_types(self):
+        """Test strings, numbers and containers"""
+        self.assertSameBytes({
+            "id": 1,
+            "title": "Crème brûlée \u2028 \u2029 \"quoted\"",
+            "ratio": 0.1,
+            "tags": [{"name": "Vegan"}, None, True],
+            "empty": {},
+        })
+
+    def test_drf_types(self):
+        """Test values DRF's encoder converts"""
+        self.assertSameBytes({
+            "price": Decimal("5.50"),
+            "created": datetime(2023, 5, 1, 8, 30, 1, 123456,
+                                tzinfo=timezone.utc),
+            "day": date(2023, 5, 1),
+            "uuid": uuid.UUID(int=7),
+            "lazy": gettext_lazy("This field is required."),
+            "errors": ReturnDict(
+                {"title": [ErrorDetail("Required.", code="required")]},
+                serializer=None,
+            ),
+            1: "int key",
+        })
+
+    def test_unsupported_falls_back(self):
+        """Test integers orjson rejects and pretty printing"""
+        self.assertSameBytes({"big": 2 ** 70})
+        self.assertSameBytes({"a": [1]}, "application/json; indent=4")
+
+    def test_none(self):
+        """Test an empty body renders nothing"""
+        self.assertEqual(ORJSONRenderer().render(None), b"")
+
+    def test_without_orjson(self):
+        """Test the stdlib renderer is used when orjson is missing"""
+        with patch.object(renderers, "orjson", None):
+            self.assertSameBytes({"price": Decimal("1.00")})
+
+
+class ORJSONParserTests(SimpleTestCase):
+    """Test ORJSONParser parses like JSONParser"""
+
+    def parse(self, parser, body):
+        return parser.parse(io.BytesIO(body), parser_context={})
+
+    def test_parse(self):
+        """Test a UTF-8 body"""
+        body = '{"title": "Crème", "price": "5.50", "tags": [1, 2]}'.encode()
+
+        self.assertEqual(
+            self.parse(ORJSONParser(), body),
+            self.parse(JSONParser(), body),
+        )
+
+    def test_invalid(self):
+        """Test bodies orjson rejects raise DRF's ParseError"""
+        for body in [b'{"x": ', b'{"x": NaN}']:
+            with self.assertRaises(ParseError) as ctx:
+                self.parse(ORJSONParser(), body)
+            with self.assertRaises(ParseError) as expected:
+                self.parse(JSONParser(), body)
+
+            self.assertEqual(str(ctx.exception), str(expected.exception))
@@ -0,0 +1,164 @@
+"""
+Tests for the content-addressed image storage
+"""
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+
+from PIL import Image
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import ImageBlob, Recipe
+from core.storage import THUMBS_DIR, image_storage
+
+
+def image_bytes(color="red"):
+    buffer = io.BytesIO()
+    Image.new("RGB", (10, 10), color).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+class ContentAddressedStorageTests(TestCase):
+    """Tests for storing, sharing and releasing image blobs"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.addCleanup(shutil.rmtree, self.media_root)
+
+        self.user = get_user_model().objects.create_user(
+            "user@gmail.com",
+            "pass123"
+        )
+
+    def _recipe(self, data=None, name="photo.JPG"):
+        recipe = Recipe.objects.create(
+            user=self.user, title="Sample", time_minutes=5, price="5.00"
+        )
+        if data is not None:
+            recipe.image.save(name, ContentFile(data))
+        return recipe
+
+    def test_file_named_by_content(self):
+        """Test the stored name is the SHA-256 of the bytes"""
+        data = image_bytes()
+        sha = hashlib.sha256(data).hexdigest()
+
+        recipe = self._recipe(data)
+
+        self.assertEqual(
+            recipe.image.name,
+            f"uploads/recipe/{sha[:2]}/{sha[2:4]}/{sha}.jpg",
+        )
+        with recipe.image.open("rb") as stored:
+            self.assertEqual(stored.read(), data)
+        blob = ImageBlob.objects.get(name=recipe.image.name)
+        self.assertEqual((blob.size, blob.refcount), (len(data), 1))
+
+    def test_identical_uploads_share_a_blob(self):
+        """Test the same bytes are stored once and counted per recipe"""
+        data = image_bytes()
+
+        first = self._recipe(data, "a.jpg")
+        second = self._recipe(data, "b.jpg")
+
+        self.assertEqual(first.image.name, second.image.name)
+        directory = os.path.dirname(first.image.path)
+        self.assertEqual(os.listdir(directory), [
+            os.path.basename(first.image.name)
+        ])
+        self.assertEqual(ImageBlob.objects.get().refcount, 2)
+
+    def test_delete_releases_blob(self):
+        """Test the file is removed once its last recipe is deleted"""
+        data = image_bytes()
+        first = self._recipe(data)
+        second = self._recipe(data)
+        path = first.image.path
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(ImageBlob.objects.get().refcount, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(ImageBlob.objects.exists())
+
+    def test_replace_releases_old_blob_and_thumbnails(self):
+        """Test replacing an image removes the old file and derivatives"""
+        recipe = self._recipe(image_bytes("red"))
+        old_name = recipe.image.name
+        stem = os.path.splitext(os.path.basename(old_name))[0]
+        thumb = os.path.join(
+            os.path.dirname(old_name), THUMBS_DIR, f"{stem}-160.jpeg"
+        )
+        thumb_path = image_storage.path(thumb)
+        os.makedirs(os.path.dirname(thumb_path))
+        with open(thumb_path, "wb") as thumb_file:
+            thumb_file.write(b"thumb")
+
+        recipe = Recipe.objects.get(pk=recipe.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.image.save("new.jpg", ContentFile(image_bytes("blue")))
+
+        self.assertNotEqual(recipe.image.name, old_name)
+        self.assertFalse(image_storage.exists(old_name))
+        self.assertFalse(os.path.exists(thumb_path))
+        self.assertEqual(
+            list(ImageBlob.objects.values_list("name", flat=True)),
+            [recipe.image.name],
+        )
+
+    def test_gc_repairs_refcounts(self):
+        """Test the gc command recounts refs and drops orphaned blobs"""
+        recipe = self._recipe(image_bytes("red"))
+        orphan = self._recipe(image_bytes("blue"))
+        orphan_name = orphan.image.name
+        Recipe.objects.filter(pk=orphan.pk).update(image="")
+        ImageBlob.objects.filter(name=recipe.image.name).update(refcount=5)
+        ImageBlob.objects.update(
+            created_at=timezone.now() - timedelta(hours=2)
+        )
+
+        call_command("gc_image_blobs", stdout=io.StringIO())
+
+        self.assertEqual(
+            ImageBlob.objects.get(name=recipe.image.name).refcount, 1
+        )
+        self.assertFalse(ImageBlob.objects.filter(name=orphan_name).exists())
+        self.assertFalse(image_storage.exists(orphan_name))
+
+    def test_upload_api_deduplicates(self):
+        """Test uploading the same photo to two recipes stores it once"""
+        client = APIClient()
+        client.force_authenticate(self.user)
+        data = image_bytes()
+        recipes = [self._recipe(), self._recipe()]
+
+        for recipe in recipes:
+            res = client.post(
+                reverse("recipe:recipe-upload-image", args=[recipe.id]),
+                {"image": ContentFile(data, name="photo.jpg")},
+                format="multipart",
+            )
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        names = {recipe.image.name for recipe in Recipe.objects.all()}
+        self.assertEqual(len(names), 1)
+        self.assertEqual(ImageBlob.objects.get().refcount, 2)
@@ -0,0 +1,163 @@
+"""Tests for the sliding window API throttles"""
+
+from unittest.mock import patch
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.throttling import CacheWindowCounter
+
+RECIPES_URL = reverse("recipe:recipe-list")
+EXPORT_URL = reverse("recipe:recipe-export")
+CREATE_USER_URL = reverse("user:create")
+
+
+def rates(**overrides):
+    """REST_FRAMEWORK settings with only the given throttle rates"""
+    return {
+        **settings.REST_FRAMEWORK,
+        "DEFAULT_THROTTLE_RATES": overrides,
+    }
+
+
+@patch("core.throttling.time.time")
+class SlidingWindowCounterTests(SimpleTestCase):
+    """Test the sliding window estimate and wait times"""
+
+    def setUp(self):
+        cache.clear()
+        self.counter = CacheWindowCounter("default")
+
+    def test_limit_within_window(self, mock_time):
+        """Test requests past the limit are refused until the next window"""
+        mock_time.return_value = 600.0
+        waits = [self.counter.hit("k", 3, 60) for _ in range(4)]
+
+        self.assertEqual(waits[:3], [0, 0, 0])
+        # 60s to the next window, then the 3 counted there must decay to 2
+        self.assertAlmostEqual(waits[3], 60 + 20)
+
+    def test_previous_window_weighted(self, mock_time):
+        """Test the previous window counts by its overlap"""
+        mock_time.return_value = 600.0
+        for _ in range(4):
+            self.counter.hit("k", 4, 60)
+
+        # Halfway into the next window 4 * 0.5 = 2 still count.
+        mock_time.return_value = 690.0
+        waits = [self.counter.hit("k", 4, 60) for _ in range(3)]
+
+        self.assertEqual(waits[:2], [0, 0])
+        # 2 counted now; allowed once the old weight is below 1 / 4
+        self.assertAlmostEqual(waits[2], 15)
+
+    def test_refused_not_counted(self, mock_time):
+        """Test refused requests do not extend the wait"""
+        mock_time.return_value = 600.0
+        self.counter.hit("k", 1, 60)
+        first = self.counter.hit("k", 1, 60)
+
+        self.assertEqual(self.counter.hit("k", 1, 60), first)
+
+    def test_zero_limit(self, mock_time):
+        """Test a limit of 0 refuses until the next window"""
+        mock_time.return_value = 630.0
+
+        self.assertEqual(self.counter.hit("k", 0, 60), 30)
+
+    def test_keys_independent(self, mock_time):
+        """Test each key has its own counters"""
+        mock_time.return_value = 600.0
+        self.counter.hit("a", 1, 60)
+
+        self.assertEqual(self.counter.hit("b", 1, 60), 0)
+
+
+class APIThrottleTests(TestCase):
+    """Test the default throttles on the API views"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            "user@example.com", "testpass123"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    @override_settings(REST_FRAMEWORK=rates(user="2/min"))
+    def test_user_rate(self):
+        """Test a user is limited across endpoints with Retry-After"""
+        self.client.get(RECIPES_URL)
+        self.client.get(EXPORT_URL)
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertGreaterEqual(int(res["Retry-After"]), 1)
+
+        other = get_user_model().objects.create_user(
+            "other@example.com", "testpass123"
+        )
+        self.client.force_authenticate(other)
+        self.assertEqual(
+            self.client.get(RECIPES_URL).status_code, status.HTTP_200_OK
+        )
+
+    @override_settings(REST_FRAMEWORK=rates(**{"RecipeViewSet.export":
+                                               "1/min"}))
+    def test_endpoint_rate(self):
+        """Test an action limit leaves the other actions alone"""
+        self.client.get(EXPORT_URL)
+        res = self.client.get(EXPORT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(
+            self.client.get(RECIPES_URL).status_code, status.HTTP_200_OK
+        )
+
+    @override_settings(REST_FRAMEWORK=rates(anon="1/min"))
+    def test_anon_rate(self):
+        """Test anonymous clients are limited per IP"""
+        client = APIClient()
+        payload = {"email": "new@example.com", "password": "testpass123",
+                   "name": "New"}
+        client.post(CREATE_USER_URL, payload)
+        res = client.post(CREATE_USER_URL, {**payload,
+                                             "email": "new2@example.com"})
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    @override_settings(REST_FRAMEWORK=rates(user="0/min"))
+    def test_zero_rate(self):
+        """Test a zero rate refuses every request with 429"""
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertGreaterEqual(int(res["Retry-After"]), 1)
+
+    @override_settings(REST_FRAMEWORK=rates(anon="1/min"))
+    def test_anon_rate_ignores_forged_forwarded_for(self):
+        """Test a forged X-Forwarded-For does not reset the anon limit"""
+        client = APIClient()
+        for i, forged in enumerate(["1.1.1.1", "2.2.2.2"]):
+            res = client.post(
+                CREATE_USER_URL,
+                {"email": f"new{i}@example.com", "password": "testpass123",
+                 "name": "New"},
+                # The client's header, then the address nginx appended
+                HTTP_X_FORWARDED_FOR=f"{forged}, 203.0.113.7",
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    @override_settings(REST_FRAMEWORK=rates())
+    def test_no_rates(self):
+        """Test scopes without a rate are not limited"""
+        for _ in range(5):
+            res = self.client.get(EXPORT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
@@ -0,0 +1,246 @@
+"""
+Rate limiting for the API and the login endpoint
+"""
+import math
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle, SimpleRateThrottle
+
+try:
+    import uwsgi
+except ImportError:
+    uwsgi = None
+
+
+class TokenBuckets:
+    """Thread-safe in-process token buckets, one per key.
+
+    A bucket holds up to ``capacity`` tokens and refills at ``rate``
+    tokens per second; the least recently used buckets are dropped past
+    ``maxsize`` keys.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, rate):
+        """Take a token; return 0 or the seconds until one is available"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            wait = 0 if tokens >= 1 else (1 - tokens) / rate
+            self._buckets[key] = (tokens - 1 if wait == 0 else tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+            return wait
+
+    def clear(self):
+        """Drop every bucket"""
+        with self._lock:
+            self._buckets.clear()
+
+
+login_buckets = TokenBuckets(settings.LOGIN_RATE_LIMIT["MAXSIZE"])
+
+
+class LoginRateThrottle(BaseThrottle):
+    """Limit login attempts per client IP and per submitted email.
+
+    Every attempt costs a password hash, so failed and successful logins
+    both take a token. Buckets live in the worker process.
+    """
+
+    def allow_request(self, request, view):
+        limits = settings.LOGIN_RATE_LIMIT
+        data = request.data
+        email = str(data.get("email", "")) if hasattr(data, "get") else ""
+        checks = [("ip:" + self.get_ident(request),
+                   limits["IP_BURST"], limits["IP_PER_MINUTE"])]
+        if email.strip():
+            checks.append(("email:" + email.strip().lower(),
+                           limits["EMAIL_BURST"], limits["EMAIL_PER_MINUTE"]))
+        self.wait_seconds = 0
+        for key, burst, per_minute in checks:
+            if burst and per_minute:
+                self.wait_seconds = login_buckets.take(
+                    key, burst, per_minute / 60
+                )
+                if self.wait_seconds:
+                    return False
+        return True
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class SlidingWindowCounter(ABC):
+    """Approximate sliding window request counts.
+
+    Each key has one counter per fixed window of ``duration`` seconds.
+    The count over the last ``duration`` seconds is estimated as the
+    current window's count plus the previous one's, weighted by the share
+    of it still inside the sliding window. That is two integers and two
+    store round trips per request, where DRF's throttles keep and rewrite
+    a list of timestamps per key.
+    """
+
+    @abstractmethod
+    def get_counts(self, keys):
+        """Return {key: count} for the keys that exist"""
+
+    @abstractmethod
+    def incr(self, key, timeout):
+        """Add one to a counter, creating it with the timeout"""
+
+    def hit(self, key, limit, duration):
+        """Count a request; return 0 or the seconds until one is allowed.
+
+        Refused requests are not counted. Concurrent requests may both
+        pass the check, so a key can go a little over its limit.
+        """
+        now = time.time()
+        window = int(now // duration)
+        elapsed = now - window * duration
+        if limit <= 0:
+            # A "0/min" rate refuses everything; ask again next window.
+            return duration - elapsed
+        current, previous = f"{key}:{window}", f"{key}:{window - 1}"
+        counts = self.get_counts([current, previous])
+        count, previous_count = counts.get(current, 0), counts.get(previous, 0)
+        weight = (duration - elapsed) / duration
+        if previous_count * weight + count + 1 <= limit:
+            self.incr(current, duration * 2)
+            return 0
+
+        room = limit - 1
+        if count <= room:
+            # Wait for the previous window's weight to drop far enough.
+            return duration * (1 - (room - count) / previous_count) - elapsed
+        # Wait for the next window, then for this one's weight to drop.
+        return duration - elapsed + duration * (1 - room / count)
+
+
+class CacheWindowCounter(SlidingWindowCounter):
+    """Counters in a Django cache, shared if the cache is"""
+
+    def __init__(self, alias):
+        self.alias = alias
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def get_counts(self, keys):
+        return self.cache.get_many(keys)
+
+    def incr(self, key, timeout):
+        if not self.cache.add(key, 1, timeout):
+            try:
+                self.cache.incr(key)
+            except ValueError:  # expired since add()
+                self.cache.set(key, 1, timeout)
+
+
+class UwsgiWindowCounter(SlidingWindowCounter):
+    """Counters in a uWSGI cache, in memory shared by the server's workers.
+
+    uWSGI increments under the cache lock; while the cache is full new
+    counters are not stored and their requests are let through.
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def get_counts(self, keys):
+        return {key: uwsgi.cache_num(key, self.name) for key in keys}
+
+    def incr(self, key, timeout):
+        uwsgi.cache_inc(key, 1, int(timeout), self.name)
+
+
+def get_api_counter():
+    """Return the counter store API_RATE_LIMIT selects"""
+    backend = settings.API_RATE_LIMIT["BACKEND"]
+    if backend == "uwsgi":
+        if uwsgi is not None:
+            return UwsgiWindowCounter(settings.API_RATE_LIMIT["UWSGI_CACHE"])
+        # runserver, uvicorn and tests run without uWSGI
+        backend = "default"
+    return CacheWindowCounter(backend)
+
+
+api_counter = get_api_counter()
+
+
+class SlidingWindowRateThrottle(SimpleRateThrottle, ABC):
+    """SimpleRateThrottle counting with a SlidingWindowCounter.
+
+    Rates are read from DEFAULT_THROTTLE_RATES by get_scope(); scopes
+    without a rate are not limited.
+    """
+
+    def __init__(self):
+        pass
+
+    @abstractmethod
+    def get_scope(self, request, view):
+        """Return the DEFAULT_THROTTLE_RATES key for the request"""
+
+    def get_rate(self):
+        return api_settings.DEFAULT_THROTTLE_RATES.get(self.scope)
+
+    def get_cache_key(self, request, view):
+        user = request.user
+        if user and user.is_authenticated:
+            ident = user.pk
+        else:
+            ident = self.get_ident(request)
+        return self.cache_format % {"scope": self.scope, "ident": ident}
+
+    def allow_request(self, request, view):
+        self.wait_seconds = 0
+        self.scope = self.get_scope(request, view)
+        self.rate = self.get_rate()
+        if self.rate is None:
+            return True
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        self.wait_seconds = api_counter.hit(
+            self.get_cache_key(request, view),
+            self.num_requests,
+            self.duration,
+        )
+        return not self.wait_seconds
+
+    def wait(self):
+        # Retry-After is a whole number of seconds; never round to 0.
+        return math.ceil(self.wait_seconds)
+
+
+class UserRateThrottle(SlidingWindowRateThrottle):
+    """Limit all requests of a user, or of a client IP if anonymous"""
+
+    def get_scope(self, request, view):
+        user = request.user
+        return "user" if user and user.is_authenticated else "anon"
+
+
+class EndpointRateThrottle(SlidingWindowRateThrottle):
+    """Limit the requests of a user to one view action.
+
+    The scope is ``<view class>.<action>``, e.g. ``RecipeViewSet.bulk``,
+    or the lowercase method name for views without actions.
+    """
+
+    def get_scope(self, request, view):
+        action = getattr(view, "action", None) or request.method.lower()
+        return f"{type(view).__name__}.{action}"
@@ -0,0 +1,40 @@
+"""
+Per-user data versions used to invalidate cached list responses
+"""
+import threading
+from contextlib import contextmanager
+
+from django.contrib.auth import get_user_model
+
+_state = threading.local()
+
+
+def bump_data_version(user_id):
+    """Mark a user's recipe data as changed"""
+    pending = getattr(_state, "pending", None)
+    if pending is not None:
+        pending.add(user_id)
+        return
+    get_user_model().objects.bump_data_version(user_id)
+
+
+@contextmanager
+def batch_data_version_bumps():
+    """Fold every bump inside the block into one UPDATE at the end.
+
+    Writes such as creating a recipe with tags and ingredients fire
+    several signals; batching them keeps it to a single version bump.
+    Nothing is bumped if the block raises, as its writes roll back.
+    """
+    if getattr(_state, "pending", None) is not None:
+        yield
+        return
+
+    _state.pending = set()
+    try:
+        yield
+        pending = _state.pending
+    finally:
+        _state.pending = None
+    if pending:
+        get_user_model().objects.bump_data_version(*pending)
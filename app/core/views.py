@@ -0,0 +1,27 @@
+"""
+Views for the core app
+"""
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from django.utils.crypto import constant_time_compare
+
+from core.metrics import registry, render_prometheus
+
+
+def metrics(request):
+    """Serve the metrics of every worker in the Prometheus text format.
+
+    Requires ``Authorization: Bearer <METRICS_TOKEN>``; without a token
+    configured nothing is served.
+    """
+    config = settings.METRICS
+    if not config["ENABLED"]:
+        raise Http404()
+    if not config["TOKEN"] or not constant_time_compare(
+        request.headers.get("Authorization", ""), f"Bearer {config['TOKEN']}"
+    ):
+        return HttpResponse(status=401)
+    return HttpResponse(
+        render_prometheus(registry.collect(), config["BUCKETS"]),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )
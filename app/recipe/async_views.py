@@ -0,0 +1,127 @@
+"""
+Async read views for the recipe API, routed in place of the viewset's
+GET handlers when settings.ASYNC_VIEWS is on
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.exceptions import NotFound
+from rest_framework.request import Request
+
+from core.async_views import AsyncAPIView
+
+from .caching import list_cache_key, list_etag
+from .views import RecipeViewSet
+
+
+class AsyncRecipeView(AsyncAPIView):
+    """Answer GET with the async ORM and hand other methods to the sync
+    RecipeViewSet, so the URL keeps its full API.
+
+    The viewset still builds the queryset and serializers; only the
+    database round trips are awaited. Subclasses implement
+    ``async read(viewset)``, which returns the response for the
+    authenticated and throttled viewset.
+    """
+
+    action = None
+    sync_view = None
+
+    async def dispatch(self, request, *args, **kwargs):
+        if request.method not in ("GET", "HEAD"):
+            view = sync_to_async(self.sync_view)
+            return await view(request, *args, **kwargs)
+        return await super().dispatch(request, *args, **kwargs)
+
+    async def get(self, request, *args, **kwargs):
+        user, token = await self.authenticate(request)
+        drf_request = Request(request)
+        drf_request.user, drf_request.auth = user, token
+        viewset = RecipeViewSet(
+            request=drf_request,
+            args=args,
+            kwargs=kwargs,
+            format_kwarg=None,
+            action=self.action,
+        )
+        # Throttle counters may live in a network cache.
+        await sync_to_async(viewset.check_throttles, thread_sensitive=False)(
+            drf_request
+        )
+        return await self.read(viewset)
+
+
+class AsyncRecipeListView(AsyncRecipeView):
+    """Recipe list with the same ETag and cache entries as the sync list"""
+
+    action = "list"
+    sync_view = staticmethod(
+        RecipeViewSet.as_view({"get": "list", "post": "create"})
+    )
+
+    async def read(self, viewset):
+        request = viewset.request
+        version = await get_user_model().objects.adata_version(request.user.pk)
+        etag = list_etag(
+            request.user.pk,
+            version,
+            type(viewset).__name__,
+            request.build_absolute_uri(),
+            self.renderer.media_type,
+        )
+
+        if etag in parse_etags(request.headers.get("If-None-Match", "")):
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            cache = caches[settings.LIST_RESPONSE_CACHE["BACKEND"]]
+            cache_key = list_cache_key(etag)
+            data = await cache.aget(cache_key)
+            if data is None:
+                paginator = viewset.paginator
+                rows = viewset.get_row_serializer()
+                queryset = viewset.get_queryset()
+                if rows is not None:
+                    queryset = rows.get_queryset(queryset)
+                # DRF pagination has no async API; it slices and lists
+                # the queryset itself.
+                page = await sync_to_async(paginator.paginate_queryset)(
+                    queryset, request, viewset
+                )
+                if rows is not None:
+                    results = await sync_to_async(rows.to_representation)(
+                        page
+                    )
+                else:
+                    results = viewset.get_serializer(page, many=True).data
+                data = paginator.get_paginated_response(results).data
+                await cache.aset(cache_key, data, viewset.get_list_cache_ttl())
+            response = self.render(data)
+
+        response["ETag"] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+
+class AsyncRecipeDetailView(AsyncRecipeView):
+    """Single recipe fetched with afirst()"""
+
+    action = "retrieve"
+    sync_view = staticmethod(RecipeViewSet.as_view({
+        "get": "retrieve",
+        "put": "update",
+        "patch": "partial_update",
+        "delete": "destroy",
+    }))
+
+    async def read(self, viewset):
+        recipe = await viewset.get_queryset().filter(
+            pk=viewset.kwargs["pk"]
+        ).afirst()
+        if recipe is None:
+            raise NotFound()
+        return self.render(viewset.get_serializer(recipe).data)
@@ -0,0 +1,99 @@
+"""
+Autocomplete lookups for tags and ingredients
+"""
+from django.conf import settings
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.db import connection
+from django.db.models.functions import Length, Upper
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+_trigram_available = None
+
+
+def trigram_available():
+    """Return True if the pg_trgm extension is installed.
+
+    Migration 0011 only creates the trigram indexes where the extension
+    can be installed; elsewhere lookups fall back to plain LIKE matches.
+    """
+    global _trigram_available
+    if _trigram_available is None:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'"
+            )
+            _trigram_available = cursor.fetchone() is not None
+    return _trigram_available
+
+
+def prefix_matches(queryset, prefix):
+    """Names starting with the prefix, shortest first"""
+    return queryset.filter(name__istartswith=prefix).order_by(
+        Length("name"), "name"
+    )
+
+
+def fuzzy_matches(queryset, term):
+    """Names resembling the term, most similar first.
+
+    Uses pg_trgm word similarity so typos still match; both sides are
+    upper-cased to share the UPPER(name) trigram index with the prefix
+    lookup. Without the extension this is a substring match.
+    """
+    if not trigram_available():
+        return queryset.filter(name__icontains=term).order_by(
+            Length("name"), "name"
+        )
+    return (
+        queryset.alias(upper_name=Upper("name"))
+        .filter(upper_name__trigram_word_similar=term.upper())
+        .annotate(similarity=TrigramWordSimilarity(term, "name"))
+        .order_by("-similarity", Length("name"), "name")
+    )
+
+
+class AutocompleteMixin:
+    """Answer ``?prefix=`` and ``?fuzzy=`` on the list action with the top
+    matches instead of a page of everything.
+
+    Placed after ``VersionedListCacheMixin`` so the short lists are cached
+    per user and data version like any other list response.
+    """
+
+    def _autocomplete_term(self):
+        params = self.request.query_params
+        for mode in ("prefix", "fuzzy"):
+            term = params.get(mode, "").strip()
+            if term:
+                return mode, term
+        return None, None
+
+    def _autocomplete_limit(self):
+        limits = settings.AUTOCOMPLETE
+        try:
+            limit = int(self.request.query_params.get("limit", limits["LIMIT"]))
+        except ValueError:
+            raise ValidationError({"limit": ["Expected a number."]})
+        return max(1, min(limit, limits["MAX_LIMIT"]))
+
+    def get_list_cache_ttl(self):
+        """Keep lookups AUTOCOMPLETE["TTL"] seconds; see the caching mixin"""
+        if self._autocomplete_term()[0]:
+            return settings.AUTOCOMPLETE["TTL"]
+        later = getattr(super(), "get_list_cache_ttl", None)
+        return later() if later is not None else None
+
+    def list(self, request, *args, **kwargs):
+        mode, term = self._autocomplete_term()
+        if mode is None:
+            return super().list(request, *args, **kwargs)
+
+        limit = self._autocomplete_limit()
+        queryset = self.get_queryset()
+        if mode == "prefix":
+            queryset = prefix_matches(queryset, term)
+        else:
+            queryset = fuzzy_matches(queryset, term)
+        serializer = self.get_serializer(queryset[:limit], many=True)
+        return Response({"results": serializer.data})
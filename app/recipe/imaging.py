@@ -0,0 +1,50 @@
+"""
+Image derivatives for recipe uploads.
+
+Runs inside the thumbnail worker processes, so it only depends on Pillow
+and plain file paths and never imports Django models.
+"""
+import os
+
+from PIL import Image, ImageOps, features
+
+FORMATS = {
+    "webp": {"format": "WEBP", "quality": 80, "method": 4},
+    "jpeg": {"format": "JPEG", "quality": 80, "optimize": True,
+             "progressive": True},
+}
+
+
+def supported_formats(formats):
+    """Drop formats this Pillow build cannot encode"""
+    return [fmt for fmt in formats if fmt != "webp" or features.check("webp")]
+
+
+def render_thumbnails(source_path, target_dir, stem, widths, formats):
+    """Write resized copies of an image at each width and format.
+
+    EXIF orientation is applied to the pixels and the metadata is not
+    copied to the derivatives. Widths larger than the original are
+    skipped rather than upscaled. Returns {format: {width: filename}}
+    relative to ``target_dir``.
+    """
+    os.makedirs(target_dir, exist_ok=True)
+    with Image.open(source_path) as original:
+        image = ImageOps.exif_transpose(original).convert("RGB")
+
+    derivatives = {}
+    for width in sorted(widths):
+        if width > image.width:
+            continue
+        height = max(1, round(image.height * width / image.width))
+        resized = image.resize((width, height), Image.LANCZOS)
+        for fmt in supported_formats(formats):
+            filename = f"{stem}-{width}.{fmt}"
+            path = os.path.join(target_dir, filename)
+            # Derivatives of a shared blob may be served while another
+            # recipe re-renders them, so never expose a partial file.
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            resized.save(tmp_path, **FORMATS[fmt])
+            os.replace(tmp_path, path)
+            derivatives.setdefault(fmt, {})[str(width)] = filename
+    return derivatives
@@ -0,0 +1,28 @@
+"""
+Pagination for the recipe API
+"""
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class RecipeCursorPagination(CursorPagination):
+    """Keyset pagination for recipes with opaque cursors.
+
+    Each page seeks past the last row of the previous one on the
+    ``(user_id, id)`` index, so deep pages cost the same as the first.
+    """
+    ordering = "-id"
+    page_size = settings.RECIPE_PAGE_SIZE
+    page_size_query_param = "page_size"
+    max_page_size = settings.RECIPE_MAX_PAGE_SIZE
+
+    def get_ordering(self, request, queryset, view):
+        """Order search results by rank, ties by id"""
+        if "rank" in queryset.query.annotations:
+            return ("-rank", "-id")
+        return super().get_ordering(request, queryset, view)
+
+
+class RecipeAttrCursorPagination(RecipeCursorPagination):
+    """Keyset pagination for tags and ingredients on (name, id)"""
+    ordering = ("-name", "-id")
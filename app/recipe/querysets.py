@@ -0,0 +1,117 @@
+"""
+Queryset helpers for the recipe API
+"""
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import (
+    Count,
+    Exists,
+    F,
+    FloatField,
+    OuterRef,
+    Prefetch,
+    Q,
+)
+from django.db.models.functions import Cast
+from rest_framework import serializers
+
+# Must match the configuration the search_vector triggers use.
+SEARCH_CONFIG = "english"
+
+
+def _model_columns(serializer):
+    """Return the concrete model columns a nested serializer reads"""
+    model = serializer.Meta.model
+    concrete = {f.name for f in model._meta.concrete_fields}
+    return [
+        field.source for field in serializer.fields.values()
+        if not field.write_only and field.source in concrete
+    ]
+
+
+def optimize_for_serializer(queryset, serializer):
+    """Apply select_related / prefetch_related for the serializer in use.
+
+    Nested many serializers become ``Prefetch`` objects that only load
+    the columns the nested serializer renders, nested single serializers
+    become ``select_related`` joins, so rendering a page of objects costs
+    a fixed number of queries instead of one per row.
+    """
+    for field in serializer.fields.values():
+        if field.write_only:
+            continue
+        if isinstance(field, serializers.ListSerializer) and \
+                isinstance(field.child, serializers.ModelSerializer):
+            child = field.child
+            related = child.Meta.model.objects.only(*_model_columns(child))
+            queryset = queryset.prefetch_related(
+                Prefetch(field.source, queryset=related)
+            )
+        elif isinstance(field, serializers.ManyRelatedField):
+            queryset = queryset.prefetch_related(field.source)
+        elif isinstance(field, serializers.ModelSerializer):
+            queryset = queryset.select_related(field.source)
+    return queryset
+
+
+def only_for_serializer(queryset, serializer):
+    """Defer every column the (pruned) serializer does not render"""
+    columns = _model_columns(serializer)
+    for name, needed in serializer.field_columns.items():
+        if name in serializer.fields:
+            columns.extend(needed)
+    return queryset.only(*columns)
+
+
+def related_ids_filter(model, field_name, ids, match_all=False):
+    """Build a filter on the ids of a many-to-many relation.
+
+    Matching any id is an ``EXISTS`` semi-join against the through table,
+    so a row matching several ids is still returned once and no
+    ``DISTINCT`` sort is needed. Matching all ids is a single grouped
+    subquery over the through table instead of one join per id.
+    """
+    field = model._meta.get_field(field_name)
+    through = field.remote_field.through
+    source = f"{field.m2m_field_name()}_id"
+    target = f"{field.m2m_reverse_field_name()}_id"
+    ids = set(ids)
+    rows = through.objects.filter(**{f"{target}__in": ids})
+
+    if match_all:
+        matching = (
+            rows.values(source)
+            .annotate(matched=Count("pk"))
+            .filter(matched=len(ids))
+            .values(source)
+        )
+        return Q(pk__in=matching)
+    return Q(Exists(rows.filter(**{source: OuterRef("pk")})))
+
+
+def prefix_search_query(text):
+    """Build a tsquery matching every word, the last one as a prefix.
+
+    The prefix lets results follow the user while they type. Returns
+    None if the text holds no words.
+    """
+    words = re.findall(r"\w+", text)
+    if not words:
+        return None
+    words[-1] += ":*"
+    return SearchQuery(" & ".join(words), search_type="raw",
+                       config=SEARCH_CONFIG)
+
+
+def search_recipes(queryset, text):
+    """Filter recipes on the search_vector GIN index, annotating rank.
+
+    The rank is cast to double precision so its value survives the
+    round trip through a pagination cursor unchanged.
+    """
+    query = prefix_search_query(text)
+    if query is None:
+        return queryset.none()
+    rank = Cast(SearchRank(F("search_vector"), query), FloatField())
+    return queryset.filter(search_vector=query).annotate(rank=rank)
@@ -0,0 +1,201 @@
+"""
+List responses built from .values() rows instead of model instances
+"""
+from types import SimpleNamespace
+
+from rest_framework import serializers
+from rest_framework.response import Response
+
+from core.metrics import timed
+
+# Field types whose to_representation() leaves database values unchanged
+PASSTHROUGH_FIELDS = (
+    serializers.BooleanField,
+    serializers.CharField,
+    serializers.IntegerField,
+)
+
+
+def _column_names(serializer):
+    """Return the names of a nested serializer's fields if they all read
+    plain columns unchanged, else None"""
+    concrete = {
+        f.name for f in serializer.Meta.model._meta.concrete_fields
+        if not f.is_relation
+    }
+    names = []
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        if field.source not in concrete or \
+                not isinstance(field, PASSTHROUGH_FIELDS):
+            return None
+        names.append(name)
+    return names
+
+
+class RowSerializer:
+    """Render the output of a ModelSerializer from ``.values()`` rows.
+
+    Building model instances and walking DRF fields per row dominates the
+    cost of large list pages. The serializer's fields are compiled once
+    into converters over dicts: plain columns reuse the DRF field's own
+    to_representation(), nested many serializers become one
+    ``values_list()`` query per relation and method fields listed in
+    ``field_columns`` are called with the row as attributes. The output
+    renders to the same bytes as ``serializer.data``.
+    """
+
+    def __init__(self, serializer):
+        self.serializer = serializer
+        self.model = serializer.Meta.model
+        self.pk_name = self.model._meta.pk.attname
+        self.columns = {self.pk_name}
+        self.relations = {}
+        self.converters = []
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if isinstance(field, serializers.ListSerializer):
+                self.relations[name] = self._relation(field)
+                convert = None
+            elif isinstance(field, serializers.SerializerMethodField):
+                self.columns.update(serializer.field_columns[name])
+                convert = self._method(field)
+            else:
+                self.columns.add(field.source)
+                convert = self._column(field)
+            self.converters.append((name, convert))
+
+    @classmethod
+    def supports(cls, serializer):
+        """True if every field the serializer renders can be compiled"""
+        if not isinstance(serializer, serializers.ModelSerializer):
+            return False
+        concrete = {
+            f.name for f in serializer.Meta.model._meta.concrete_fields
+            if not f.is_relation
+        }
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if isinstance(field, serializers.ListSerializer):
+                if not isinstance(field.child, serializers.ModelSerializer) \
+                        or _column_names(field.child) is None:
+                    return False
+            elif isinstance(field, serializers.SerializerMethodField):
+                if name not in getattr(serializer, "field_columns", {}):
+                    return False
+            elif field.source not in concrete:
+                return False
+        return True
+
+    def _column(self, field):
+        source = field.source
+        if isinstance(field, serializers.FileField):
+            return self._file(field)
+        if isinstance(field, PASSTHROUGH_FIELDS):
+            return lambda row: row[source]
+        to_representation = field.to_representation
+
+        def convert(row):
+            value = row[source]
+            return None if value is None else to_representation(value)
+        return convert
+
+    def _file(self, field):
+        """Mirror FileField.to_representation() for a stored file name"""
+        source = field.source
+        storage = self.model._meta.get_field(source).storage
+        request = self.serializer.context.get("request")
+        use_url = getattr(field, "use_url", True)
+
+        def convert(row):
+            name = row[source]
+            if not name:
+                return None
+            if not use_url:
+                return name
+            url = storage.url(name)
+            return url if request is None else request.build_absolute_uri(url)
+        return convert
+
+    def _method(self, field):
+        method = getattr(self.serializer, field.method_name)
+        return lambda row: method(SimpleNamespace(**row))
+
+    def _relation(self, field):
+        """Return a function loading {pk: [item, ...]} for a page of pks.
+
+        It runs the query the prefetch in optimize_for_serializer() runs,
+        joining the through table, so items come back in the same order.
+        """
+        child = field.child
+        model_field = self.model._meta.get_field(field.source)
+        related_name = model_field.related_query_name()
+        names = _column_names(child)
+        columns = [child.fields[name].source for name in names]
+        child_model = child.Meta.model
+        # Filtering on the pk column skips the per-value model lookup
+        # normalization, which adds up for thousands of pks.
+        lookup = f"{related_name}__{self.model._meta.pk.name}__in"
+
+        def load(pks):
+            items = {}
+            rows = child_model.objects.filter(
+                **{lookup: pks}
+            ).values_list(related_name, *columns)
+            for pk, *values in rows:
+                items.setdefault(pk, []).append(dict(zip(names, values)))
+            return items
+        return load
+
+    def get_queryset(self, queryset):
+        """Turn the list queryset into one returning the needed columns.
+
+        Annotations such as the search rank are kept for the pagination
+        cursor.
+        """
+        columns = self.columns | set(queryset.query.annotations)
+        return queryset.prefetch_related(None).values(*sorted(columns))
+
+    def to_representation(self, rows):
+        """Return the serialized list for rows of get_queryset()"""
+        with timed("serializer_seconds"):
+            return self._to_representation(list(rows))
+
+    def _to_representation(self, rows):
+        pks = [row[self.pk_name] for row in rows]
+        related = {
+            name: load(pks) if pks else {}
+            for name, load in self.relations.items()
+        }
+        data = []
+        for row in rows:
+            item = {}
+            for name, convert in self.converters:
+                if convert is None:
+                    item[name] = related[name].get(row[self.pk_name], [])
+                else:
+                    item[name] = convert(row)
+            data.append(item)
+        return data
+
+
+class RowListMixin:
+    """Serve list() through get_row_serializer() when it returns one"""
+
+    def get_row_serializer(self):
+        """Return a RowSerializer for this list, or None"""
+        return None
+
+    def list(self, request, *args, **kwargs):
+        rows = self.get_row_serializer()
+        if rows is None:
+            return super().list(request, *args, **kwargs)
+
+        queryset = rows.get_queryset(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(rows.to_representation(page))
+        return Response(rows.to_representation(queryset))
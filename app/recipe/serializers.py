@@ -1,12 +1,34 @@
 """
 Serializer for recipe Api
 """
+from functools import partial
 
+from django.conf import settings
+from django.db import transaction
 from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
 from core.models import Recipe, Tag, Ingredient
+from core.storage import image_storage
+from core.versioning import batch_data_version_bumps, bump_data_version
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class RecipeAttrSerializer(serializers.ModelSerializer):
+    """Base serializer for tags and ingredients"""
+
+    def update(self, instance, validated_data):
+        """Save only the edited fields.
+
+        recipe_count is kept by a database trigger; writing back the
+        value loaded with the instance would undo its updates.
+        """
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        if validated_data:
+            instance.save(update_fields=list(validated_data))
+        return instance
+
+
+class IngredientSerializer(RecipeAttrSerializer):
     """Serializer for ingredients"""
     class Meta:
         model = Ingredient
@@ -14,82 +36,216 @@ class IngredientSerializer(serializers.ModelSerializer):
         read_only_fields = ["id"]
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(RecipeAttrSerializer):
     """Serializer for tags"""
     class Meta:
         model = Tag
         fields = ["id", "name"]  
         read_only_fields = ["id"] 
 
-class RecipeSerializer(serializers.ModelSerializer):
+
+class IngredientUsageSerializer(IngredientSerializer):
+    """Ingredient with the number of recipes using it"""
+    class Meta(IngredientSerializer.Meta):
+        fields = IngredientSerializer.Meta.fields + ["recipe_count"]
+
+
+class TagUsageSerializer(TagSerializer):
+    """Tag with the number of recipes using it"""
+    class Meta(TagSerializer.Meta):
+        fields = TagSerializer.Meta.fields + ["recipe_count"]
+
+
+class SparseFieldsMixin:
+    """Render a subset of the fields for ``?fields=`` / ``?expand=`` reads.
+
+    ``fields`` keeps only the named fields; ``expand`` adds fields from
+    ``expandable_fields`` that are left out by default.
+    """
+    expandable_fields = {}
+    # Extra columns a method field reads, for only_for_serializer()
+    field_columns = {}
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pruned = fields is not None
+        expand = set(expand or ())
+        if fields is not None:
+            expand |= set(fields) & set(self.expandable_fields)
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+        for name in sorted(expand - set(self.fields)):
+            self.fields[name] = self.expandable_fields[name]()
+
+    @classmethod
+    def sparse_kwargs(cls, query_params):
+        """Parse ?fields= and ?expand= into serializer kwargs"""
+        expandable = set(cls.expandable_fields)
+        kwargs = {}
+        for param, allowed in [("fields", set(cls.Meta.fields) | expandable),
+                               ("expand", expandable)]:
+            value = query_params.get(param)
+            if value is None:
+                continue
+            names = [name.strip() for name in value.split(",") if name.strip()]
+            if not names:
+                # "?fields=" names nothing; render as if it were absent.
+                continue
+            unknown = sorted(set(names) - allowed)
+            if unknown:
+                raise ValidationError(
+                    {param: [f"Unknown field(s): {', '.join(unknown)}."]}
+                )
+            kwargs[param] = names
+        return kwargs
+
+
+class RecipeSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer for recipe"""
     tags = TagSerializer(many=True, required=False)
     ingredients = IngredientSerializer(many=True, required=False)
+    thumbnails = serializers.SerializerMethodField()
+
+    expandable_fields = {
+        "description": partial(serializers.CharField, read_only=True),
+    }
+    field_columns = {"thumbnails": ["thumbnails"]}
     
     class Meta:
         model = Recipe
-        fields = ["id", "title", "time_minutes", "price", "link", "tags", "ingredients","image"]
-        read_only_fields = ["id"]
+        fields = ["id", "title", "time_minutes", "price", "link", "tags", "ingredients","image","thumbnails"]
+        # The image is only set through the upload-image action
+        read_only_fields = ["id", "image"]
+
+    def get_thumbnails(self, recipe):
+        """Return {format: {width: url}} for the generated derivatives"""
+        request = self.context.get('request')
+        thumbnails = {}
+        for fmt, sizes in recipe.thumbnails.items():
+            thumbnails[fmt] = {}
+            for width, name in sizes.items():
+                url = image_storage.url(name)
+                if request is not None:
+                    url = request.build_absolute_uri(url)
+                thumbnails[fmt][width] = url
+        return thumbnails
     
-    def _get_or_create_tags(self, tags, recipe):
+    def _get_or_create_tags(self, tags):
         """Handle getting or creating tags"""
         auth_user = self.context['request'].user
-        for tag in tags:
-            tag_obj, created = Tag.objects.get_or_create(
-                user=auth_user,
-                **tag
-            )
-            recipe.tags.add(tag_obj)
+        tag_objs = Tag.objects.get_or_create_by_names(
+            auth_user,
+            [tag["name"] for tag in tags]
+        )
+        return list(tag_objs.values())
     
-    def _get_or_create_ingredients(self, ingredients, recipe):
+    def _get_or_create_ingredients(self, ingredients):
         """Handle getting or creating ingredients"""
         auth_user = self.context['request'].user
-        for ingr in ingredients:
-            ingredient_obj, created = Ingredient.objects.get_or_create(
-                user=auth_user,
-                **ingr
-            )
-            recipe.ingredients.add(ingredient_obj)  # Use lowercase 'ingredients'
+        ingredient_objs = Ingredient.objects.get_or_create_by_names(
+            auth_user,
+            [ingr["name"] for ingr in ingredients]
+        )
+        return list(ingredient_objs.values())
     
+    @transaction.atomic
+    @batch_data_version_bumps()
     def create(self, validated_data):
         """Create a recipe"""
         tags = validated_data.pop("tags", [])
         ingredients = validated_data.pop("ingredients", [])
         recipe = Recipe.objects.create(**validated_data)
-        self._get_or_create_tags(tags, recipe)
-        self._get_or_create_ingredients(ingredients, recipe)
+        recipe.tags.add(*self._get_or_create_tags(tags))
+        recipe.ingredients.add(*self._get_or_create_ingredients(ingredients))
         
         return recipe
     
+    @transaction.atomic
+    @batch_data_version_bumps()
     def update(self, instance, validated_data):
         """Update a recipe"""
         tags = validated_data.pop("tags", None)
         ingredients = validated_data.pop("ingredients", None)  # Use lowercase 'ingredients'
           
-        # Clear and update tags if provided
+        # set() only inserts / deletes the membership that changed
         if tags is not None:
-            instance.tags.clear()
-            self._get_or_create_tags(tags, instance)
+            instance.tags.set(self._get_or_create_tags(tags))
         
-        # Clear and update ingredients if provided
         if ingredients is not None:
-            instance.ingredients.clear()
-            self._get_or_create_ingredients(ingredients, instance)
+            instance.ingredients.set(
+                self._get_or_create_ingredients(ingredients)
+            )
         
         # Update other attributes
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
         
-        instance.save()
+        # Only the columns written here: image and thumbnails belong to
+        # upload_image and the thumbnail jobs, which may have run since
+        # the instance was loaded.
+        if validated_data:
+            instance.save(update_fields=list(validated_data))
         return instance
                 
         
         
+class RecipeBulkSerializer(serializers.ListSerializer):
+    """Create many recipes with batched writes"""
+
+    def _link(self, recipes, items, model, field_name):
+        """Attach tags or ingredients to recipes with one bulk insert"""
+        auth_user = self.context['request'].user
+        objs = model.objects.get_or_create_by_names(
+            auth_user,
+            [item["name"] for recipe_items in items for item in recipe_items]
+        )
+        field = Recipe._meta.get_field(field_name)
+        through = field.remote_field.through
+        pairs = {
+            (recipe.pk, objs[item["name"]].pk)
+            for recipe, recipe_items in zip(recipes, items)
+            for item in recipe_items
+        }
+        through.objects.bulk_create([
+            through(**{
+                f"{field.m2m_field_name()}_id": recipe_id,
+                f"{field.m2m_reverse_field_name()}_id": obj_id,
+            })
+            for recipe_id, obj_id in pairs
+        ])
+
+    def _create_chunk(self, validated_data):
+        """Create one chunk of recipes and their relations"""
+        tags = [item.pop("tags", []) for item in validated_data]
+        ingredients = [item.pop("ingredients", []) for item in validated_data]
+        recipes = Recipe.objects.bulk_create(
+            [Recipe(**item) for item in validated_data]
+        )
+        self._link(recipes, tags, Tag, "tags")
+        self._link(recipes, ingredients, Ingredient, "ingredients")
+        return recipes
+
+    @transaction.atomic
+    def create(self, validated_data):
+        """Create the recipes chunk by chunk"""
+        size = settings.RECIPE_BULK_CHUNK_SIZE
+        recipes = []
+        with batch_data_version_bumps():
+            for start in range(0, len(validated_data), size):
+                recipes.extend(
+                    self._create_chunk(validated_data[start:start + size])
+                )
+            # bulk_create does not send post_save / m2m_changed
+            bump_data_version(self.context['request'].user.pk)
+        return recipes
+
+
 class RecipeDetailSerializer(RecipeSerializer):
     """becuase recipedetailserializer is extention of recipeserializer"""
     
     class Meta(RecipeSerializer.Meta):
         fields = RecipeSerializer.Meta.fields + ['description']
+        list_serializer_class = RecipeBulkSerializer
         
 class RecipeImageSerializer(serializers.ModelSerializer):
     
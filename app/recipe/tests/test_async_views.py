@@ -0,0 +1,147 @@
+"""
+Tests for the async recipe views served under ASGI
+"""
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import AsyncRequestFactory, TestCase, override_settings
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.authentication import token_cache
+from core.models import Recipe
+from recipe.async_views import AsyncRecipeDetailView, AsyncRecipeListView
+from recipe.tests.test_recipe_api import (
+    RECIPES_URL,
+    create_recipe,
+    detail_url,
+)
+
+list_view = AsyncRecipeListView.as_view()
+detail_view = AsyncRecipeDetailView.as_view()
+
+
+class AsyncRecipeViewTests(TestCase):
+    """Test the async views answer like the RecipeViewSet"""
+
+    def setUp(self):
+        cache.clear()
+        token_cache.clear()
+        self.user = get_user_model().objects.create_user(
+            "user@example.com",
+            "testpass123"
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.headers = {"Authorization": f"Token {self.token.key}"}
+        self.factory = AsyncRequestFactory()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+        self.recipes = [create_recipe(self.user, title=f"Recipe {i}")
+                        for i in range(3)]
+
+    async def _sync_get(self, url, **extra):
+        return await sync_to_async(self.client.get)(url, **extra)
+
+    async def test_list_requires_token(self):
+        """Test an anonymous list request is rejected with 401"""
+        res = await list_view(self.factory.get(RECIPES_URL))
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(res["WWW-Authenticate"], "Token")
+
+    async def test_list_matches_sync_view(self):
+        """Test the async list body and ETag equal the viewset's"""
+        expected = await self._sync_get(RECIPES_URL)
+        cache.clear()
+
+        res = await list_view(
+            self.factory.get(RECIPES_URL, headers=self.headers)
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.content, expected.content)
+        self.assertEqual(res["ETag"], expected["ETag"])
+
+    async def test_list_not_modified(self):
+        """Test a matching If-None-Match is answered with 304"""
+        res = await list_view(
+            self.factory.get(RECIPES_URL, headers=self.headers)
+        )
+
+        res = await list_view(self.factory.get(
+            RECIPES_URL,
+            headers={**self.headers, "If-None-Match": res["ETag"]},
+        ))
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    async def test_list_invalid_filter(self):
+        """Test bad query parameters give DRF's 400 body"""
+        res = await list_view(
+            self.factory.get(RECIPES_URL, {"tags": "x"}, headers=self.headers)
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn(b"tags", res.content)
+
+    async def test_detail_matches_sync_view(self):
+        """Test the async detail body equals the viewset's"""
+        url = detail_url(self.recipes[0].id)
+        expected = await self._sync_get(url)
+
+        res = await detail_view(
+            self.factory.get(url, headers=self.headers),
+            pk=self.recipes[0].id,
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.content, expected.content)
+
+    async def test_detail_other_user_not_found(self):
+        """Test another user's recipe is a 404"""
+        other = await get_user_model().objects.acreate(email="o@example.com")
+        recipe = await Recipe.objects.acreate(
+            user=other, title="Other", time_minutes=1, price="1.00"
+        )
+
+        res = await detail_view(
+            self.factory.get(detail_url(recipe.id), headers=self.headers),
+            pk=recipe.id,
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    async def test_writes_use_sync_viewset(self):
+        """Test non-GET methods fall through to the RecipeViewSet"""
+        payload = {"title": "Posted", "time_minutes": 5, "price": "5.00"}
+
+        res = await list_view(self.factory.post(
+            RECIPES_URL,
+            payload,
+            content_type="application/json",
+            headers=self.headers,
+        ))
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        recipes = Recipe.objects.filter(title="Posted", user=self.user)
+        self.assertTrue(await recipes.aexists())
+
+    @override_settings(REST_FRAMEWORK={
+        **settings.REST_FRAMEWORK,
+        "DEFAULT_THROTTLE_RATES": {"user": "1/min"},
+    })
+    async def test_reads_throttled(self):
+        """Test async reads apply the viewset's throttles"""
+        await list_view(self.factory.get(RECIPES_URL, headers=self.headers))
+        res = await detail_view(
+            self.factory.get(detail_url(self.recipes[0].id),
+                             headers=self.headers),
+            pk=self.recipes[0].id,
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertGreaterEqual(int(res["Retry-After"]), 1)
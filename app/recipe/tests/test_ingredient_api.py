@@ -58,7 +58,7 @@ class PrivateIngredientsTests(TestCase):
         
                 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(serializer.data,res.data)
+        self.assertEqual(serializer.data,res.data["results"])
         
         
     def test_ingredients_limited_to_user(self):
@@ -73,9 +73,9 @@ class PrivateIngredientsTests(TestCase):
         res = self.client.get(INGREDIENT_URL)
         
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data),1)
-        self.assertEqual(res.data[0]['name'],ingredient.name)
-        self.assertEqual(res.data[0]['id'],ingredient.id)
+        self.assertEqual(len(res.data["results"]),1)
+        self.assertEqual(res.data["results"][0]['name'],ingredient.name)
+        self.assertEqual(res.data["results"][0]['id'],ingredient.id)
         
     def test_update_ingredients(self):
         """Test updating an ingredient,  """  
@@ -120,5 +120,5 @@ class PrivateIngredientsTests(TestCase):
         s1 = IngredientSerializer(in1)
         s2 = IngredientSerializer(in2)
         
-        self.assertIn(s1.data, res.data)
-        self.assertNotIn(s2.data, res.data)
\ No newline at end of file
+        self.assertIn(s1.data, res.data["results"])
+        self.assertNotIn(s2.data, res.data["results"])
\ No newline at end of file
@@ -3,13 +3,21 @@ Test for recipe API
 """
 
 from decimal import Decimal
+import json
 import tempfile
 import os
+from concurrent.futures.process import BrokenProcessPool
+from unittest.mock import patch
 from PIL import Image
 
 from django.contrib.auth import get_user_model
 from django.urls import reverse
-from django.test import TestCase
+from django.conf import settings
+from django.core.cache import caches
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
 from rest_framework import status
 from rest_framework.test import APIClient
@@ -20,6 +28,13 @@ from recipe.serializers import (
     RecipeDetailSerializer,
     IngredientSerializer
 )
+from recipe import thumbnails
+from recipe.imaging import render_thumbnails, supported_formats
+from recipe.pagination import RecipeCursorPagination
+from recipe.rows import RowSerializer
+from recipe.tests.utils import QueryCountMixin
+from recipe.views import RecipeViewSet
+
 RECIPES_URL = reverse('recipe:recipe-list')
 
 
@@ -27,6 +42,10 @@ def detail_url(recipe_id):
     """Return a single recipe detail URL"""
     return reverse("recipe:recipe-detail", args=[recipe_id])
 
+BULK_URL = reverse("recipe:recipe-bulk")
+EXPORT_URL = reverse("recipe:recipe-export")
+
+
 def image_upload_url(recipe_id):
     """Create and return an image upload url"""
     return reverse("recipe:recipe-upload-image",args=[recipe_id])
@@ -80,7 +99,7 @@ class PrivateRecipeAPITests(TestCase):
         recipes = Recipe.objects.filter(user=self.user).order_by("-id")
         serializer = RecipeSerializer(recipes, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data["results"], serializer.data)
 
     def test_recipe_list_limited_to_user(self):
         """Test that recipe list is limited to the authenticated user"""
@@ -93,7 +112,7 @@ class PrivateRecipeAPITests(TestCase):
         recipes = Recipe.objects.filter(user=self.user)
         serializer = RecipeSerializer(recipes, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data["results"], serializer.data)
 
     def test_get_recipe_detail(self):
         """Test retrieving a recipe detail"""
@@ -399,9 +418,9 @@ class PrivateRecipeAPITests(TestCase):
         s2 = RecipeSerializer(r2)
         s3 = RecipeSerializer(r3)
         
-        self.assertIn(s1.data, res.data)
-        self.assertIn(s2.data, res.data)
-        self.assertNotIn(s3.data, res.data) 
+        self.assertIn(s1.data, res.data["results"])
+        self.assertIn(s2.data, res.data["results"])
+        self.assertNotIn(s3.data, res.data["results"]) 
     
     def test_filer_by_ingredients(self):
         """Test filtering recipes by ingredients"""
@@ -422,11 +441,607 @@ class PrivateRecipeAPITests(TestCase):
         s2 = RecipeSerializer(r2)
         s3 = RecipeSerializer(r3)
         
-        self.assertIn(s1.data, res.data)
-        self.assertIn(s2.data, res.data)
-        self.assertNotIn(s3.data, res.data) 
-     
+        self.assertIn(s1.data, res.data["results"])
+        self.assertIn(s2.data, res.data["results"])
+        self.assertNotIn(s3.data, res.data["results"]) 
+
+
+class RecipePaginationTests(TestCase):
+    """Test keyset pagination of the recipe list"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email="user@example.com", password="test123")
+        self.client.force_authenticate(self.user)
+
+    def test_pages_follow_cursor(self):
+        """Test walking every page with the next cursor"""
+        recipes = [
+            create_recipe(user=self.user, title=f"recipe {i}")
+            for i in range(5)
+        ]
+
+        res = self.client.get(RECIPES_URL, {"page_size": 2})
+        seen = [r["id"] for r in res.data["results"]]
+        self.assertEqual(len(seen), 2)
+        self.assertIsNone(res.data["previous"])
+        while res.data["next"]:
+            res = self.client.get(res.data["next"])
+            seen.extend(r["id"] for r in res.data["results"])
+
+        self.assertEqual(seen, sorted((r.id for r in recipes), reverse=True))
+
+    def test_page_size_is_capped(self):
+        """Test page_size cannot exceed the configured maximum"""
+        pagination = RecipeCursorPagination
+        for i in range(3):
+            create_recipe(user=self.user, title=f"recipe {i}")
+
+        with patch.object(pagination, "max_page_size", 2):
+            res = self.client.get(RECIPES_URL, {"page_size": 100})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data["results"]), 2)
+        self.assertIsNotNone(res.data["next"])
+
+    def test_invalid_cursor(self):
+        """Test a tampered cursor is rejected"""
+        res = self.client.get(RECIPES_URL, {"cursor": "garbage"})
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class RecipeListCacheTests(QueryCountMixin, TestCase):
+    """Test ETags and cached bodies for the list endpoints"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email="user@example.com", password="test123")
+        self.client.force_authenticate(self.user)
+        create_recipe(user=self.user)
+
+    def test_list_returns_etag(self):
+        """Test the list response carries a strong ETag"""
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res["ETag"].startswith('"'))
+        self.assertIn("private", res["Cache-Control"])
+
+    def test_if_none_match_returns_304(self):
+        """Test a matching ETag is answered without the recipe tables"""
+        etag = self.client.get(RECIPES_URL)["ETag"]
+
+        res = self.assertEndpointQueries(
+            1, "get", RECIPES_URL, HTTP_IF_NONE_MATCH=etag
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res["ETag"], etag)
+        self.assertEqual(res.content, b"")
+
+    def test_repeated_get_served_from_cache(self):
+        """Test an unchanged list is served from the cache"""
+        first = self.client.get(RECIPES_URL)
+
+        res = self.assertEndpointQueries(1, "get", RECIPES_URL)
+
+        self.assertEqual(res.data, first.data)
+
+    def test_changes_invalidate_etag(self):
+        """Test writes to recipes, tags and m2m change the ETag"""
+        recipe = Recipe.objects.get(user=self.user)
+        etags = [self.client.get(RECIPES_URL)["ETag"]]
+
+        create_recipe(user=self.user, title="second")
+        etags.append(self.client.get(RECIPES_URL)["ETag"])
+        tag = Tag.objects.create(user=self.user, name="Dinner")
+        etags.append(self.client.get(RECIPES_URL)["ETag"])
+        recipe.tags.add(tag)
+        etags.append(self.client.get(RECIPES_URL)["ETag"])
+        tag.delete()
+        res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etags[-1])
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        etags.append(res["ETag"])
+        self.assertEqual(len(set(etags)), len(etags))
+        self.assertEqual(len(res.data["results"]), 2)
+
+    def test_etag_is_per_user(self):
+        """Test another user's ETag does not match"""
+        etag = self.client.get(RECIPES_URL)["ETag"]
+        other = create_user(email="other@example.com", password="test123")
+        self.client.force_authenticate(other)
+
+        res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["results"], [])
+
+    def test_api_write_bumps_version_once(self):
+        """Test creating a recipe with tags bumps the version once"""
+        payload = {
+            "title": "Tagged",
+            "time_minutes": 5,
+            "price": Decimal("1.00"),
+            "tags": [{"name": "Lunch"}],
+            "ingredients": [{"name": "Salt"}],
+        }
+        version = get_user_model().objects.data_version(self.user.pk)
+
+        self.client.post(RECIPES_URL, payload, format="json")
+
+        self.assertEqual(
+            get_user_model().objects.data_version(self.user.pk),
+            version + 1,
+        )
+
+
+class RecipeBulkTests(QueryCountMixin, TestCase):
+    """Test bulk import and export of recipes"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email="user@example.com", password="test123")
+        self.client.force_authenticate(self.user)
+
+    def _payload(self, count):
+        """Return a list of recipes sharing a few tags and ingredients"""
+        return [
+            {
+                "title": f"recipe {i}",
+                "time_minutes": 10 + i,
+                "price": "4.50",
+                "description": "imported",
+                "tags": [{"name": "Imported"}, {"name": f"tag {i % 3}"}],
+                "ingredients": [{"name": f"ing {i % 4}"}],
+            }
+            for i in range(count)
+        ]
+
+    def test_bulk_create_json(self):
+        """Test creating recipes from a JSON array"""
+        res = self.client.post(BULK_URL, self._payload(5), format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data["created"], 5)
+        recipes = Recipe.objects.filter(user=self.user)
+        self.assertEqual(set(res.data["ids"]), set(recipes.values_list("id", flat=True)))
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 4)
+        self.assertEqual(Ingredient.objects.filter(user=self.user).count(), 4)
+        recipe = recipes.get(title="recipe 4")
+        self.assertEqual(recipe.description, "imported")
+        self.assertEqual(
+            sorted(recipe.tags.values_list("name", flat=True)),
+            ["Imported", "tag 1"],
+        )
+
+    def test_bulk_create_ndjson(self):
+        """Test creating recipes from newline delimited JSON"""
+        body = "\n".join(json.dumps(item) for item in self._payload(3))
+
+        res = self.client.post(
+            BULK_URL, body, content_type="application/x-ndjson"
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 3)
+
+    def test_bulk_create_invalid_ndjson(self):
+        """Test a malformed NDJSON line is rejected"""
+        body = json.dumps(self._payload(1)[0]) + "\n{not json"
+
+        res = self.client.post(
+            BULK_URL, body, content_type="application/x-ndjson"
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_bulk_create_validation_error(self):
+        """Test one invalid recipe rejects the whole batch"""
+        payload = self._payload(2)
+        del payload[1]["title"]
+
+        res = self.client.post(BULK_URL, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("title", res.data[1])
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_bulk_create_queries_do_not_grow(self):
+        """Test bulk create runs a fixed number of queries per chunk"""
+        self.assertEndpointQueries(
+            12, "post", BULK_URL, self._payload(2), format="json"
+        )
+        Recipe.objects.all().delete()
+        Tag.objects.all().delete()
+        Ingredient.objects.all().delete()
+
+        self.assertEndpointQueries(
+            12, "post", BULK_URL, self._payload(40), format="json"
+        )
+
+    def test_export_streams_ndjson(self):
+        """Test exporting the user's recipes as NDJSON"""
+        other = create_user(email="other@example.com", password="test123")
+        create_recipe(user=other)
+        for i in range(3):
+            recipe = create_recipe(user=self.user, title=f"recipe {i}")
+            recipe.tags.add(Tag.objects.create(user=self.user, name=f"t{i}"))
+
+        res = self.client.get(EXPORT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res["Content-Type"], "application/x-ndjson")
+        lines = b"".join(res.streaming_content).decode().splitlines()
+        items = [json.loads(line) for line in lines]
+        recipes = Recipe.objects.filter(user=self.user).order_by("-id")
+        expected = RecipeDetailSerializer(recipes, many=True).data
+        self.assertEqual(items, json.loads(json.dumps(expected)))
+
+    def test_export_round_trips_through_bulk(self):
+        """Test an export can be imported again"""
+        recipe = create_recipe(user=self.user)
+        recipe.tags.add(Tag.objects.create(user=self.user, name="Dinner"))
+        body = b"".join(self.client.get(EXPORT_URL).streaming_content)
+
+        res = self.client.post(
+            BULK_URL, body, content_type="application/x-ndjson"
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        copy = Recipe.objects.get(id=res.data["ids"][0])
+        self.assertEqual(copy.title, recipe.title)
+        self.assertEqual(list(copy.tags.all()), list(recipe.tags.all()))
+
+
+class RecipeQueryCountTests(QueryCountMixin, TestCase):
+    """Test the number of queries issued by the recipe endpoints"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email="user@example.com", password="test123")
+        self.client.force_authenticate(self.user)
+
+    def _create_recipes(self, count):
+        """Create recipes with a couple of tags and ingredients each"""
+        recipes = []
+        start = Recipe.objects.count()
+        for i in range(start, start + count):
+            recipe = create_recipe(user=self.user, title=f"recipe {i}")
+            recipe.tags.add(
+                Tag.objects.create(user=self.user, name=f"tag {i}"),
+                Tag.objects.create(user=self.user, name=f"other tag {i}"),
+            )
+            recipe.ingredients.add(
+                Ingredient.objects.create(user=self.user, name=f"ing {i}")
+            )
+            recipes.append(recipe)
+        return recipes
+
+    def test_list_queries_do_not_grow_with_recipes(self):
+        """Test listing recipes prefetches tags and ingredients"""
+        self._create_recipes(2)
+        self.assertEndpointQueries(4, "get", RECIPES_URL)
+
+        self._create_recipes(5)
+        res = self.assertEndpointQueries(4, "get", RECIPES_URL)
+        self.assertEqual(len(res.data["results"]), 7)
+
+    def test_detail_queries(self):
+        """Test retrieving a recipe prefetches tags and ingredients"""
+        recipe = self._create_recipes(1)[0]
+
+        res = self.assertEndpointQueries(3, "get", detail_url(recipe.id))
+
+        self.assertEqual(len(res.data["tags"]), 2)
+        self.assertEqual(len(res.data["ingredients"]), 1)
+
+    def test_create_with_many_tags_and_ingredients(self):
+        """Test tags and ingredients are resolved in bulk on create"""
+        Tag.objects.create(user=self.user, name="tag 0")
+        Ingredient.objects.create(user=self.user, name="ing 0")
+        payload = {
+            "title": "Big recipe",
+            "time_minutes": 30,
+            "price": Decimal("5.00"),
+            "tags": [{"name": f"tag {i}"} for i in range(20)],
+            "ingredients": [{"name": f"ing {i}"} for i in range(30)],
+        }
+
+        res = self.assertEndpointQueries(
+            16, "post", RECIPES_URL, payload, format="json"
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        recipe = Recipe.objects.get(id=res.data["id"])
+        self.assertEqual(recipe.tags.count(), 20)
+        self.assertEqual(recipe.ingredients.count(), 30)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 20)
+
+    def test_create_with_duplicate_tag_names(self):
+        """Test repeated names in the payload create a single tag"""
+        payload = {
+            "title": "Twice tagged",
+            "time_minutes": 10,
+            "price": Decimal("1.00"),
+            "tags": [{"name": "Lunch"}, {"name": "Lunch"}],
+        }
+
+        res = self.client.post(RECIPES_URL, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 1)
+        self.assertEqual(len(res.data["tags"]), 1)
+
+    def _m2m_writes(self, ctx):
+        """Return the through-table writes captured in ctx"""
+        return [
+            q["sql"] for q in ctx.captured_queries
+            if q["sql"].startswith(("INSERT", "DELETE"))
+            and ('"core_recipe_tags"' in q["sql"]
+                 or '"core_recipe_ingredients"' in q["sql"])
+        ]
+
+    def test_unchanged_patch_skips_m2m_writes(self):
+        """Test re-sending the current tags and ingredients writes nothing"""
+        recipe = self._create_recipes(1)[0]
+        res = self.client.get(detail_url(recipe.id))
+        payload = {
+            "tags": [{"name": t["name"]} for t in res.data["tags"]],
+            "ingredients": [
+                {"name": i["name"]} for i in res.data["ingredients"]
+            ],
+        }
+
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.patch(
+                detail_url(recipe.id), payload, format="json"
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(self._m2m_writes(ctx), [])
+        self.assertEqual(recipe.tags.count(), 2)
+        self.assertEqual(recipe.ingredients.count(), 1)
+
+    def test_patch_writes_only_the_delta(self):
+        """Test swapping one tag deletes and inserts a single row each"""
+        recipe = create_recipe(user=self.user)
+        keep = Tag.objects.create(user=self.user, name="Keep")
+        drop = Tag.objects.create(user=self.user, name="Drop")
+        recipe.tags.add(keep, drop)
+        payload = {"tags": [{"name": "Keep"}, {"name": "New"}]}
+
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.patch(
+                detail_url(recipe.id), payload, format="json"
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        writes = self._m2m_writes(ctx)
+        self.assertEqual(len(writes), 2)
+        delete = next(w for w in writes if w.startswith("DELETE"))
+        self.assertIn(str(drop.id), delete)
+        self.assertEqual(
+            sorted(recipe.tags.values_list("name", flat=True)),
+            ["Keep", "New"],
+        )
+
+    def test_prefetch_only_loads_rendered_columns(self):
+        """Test nested tags are loaded with only the rendered columns"""
+        self._create_recipes(1)
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(RECIPES_URL)
+
+        tag_query = next(
+            q["sql"] for q in ctx.captured_queries
+            if 'FROM "core_tag"' in q["sql"]
+        )
+        self.assertNotIn('"core_tag"."user_id"', tag_query)
+
          
+class RecipeFilterTests(TestCase):
+    """Test filtering recipes by several tags and ingredients"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email="user@example.com", password="test123")
+        self.client.force_authenticate(self.user)
+        self.vegan = Tag.objects.create(user=self.user, name="Vegan")
+        self.quick = Tag.objects.create(user=self.user, name="Quick")
+        self.both = create_recipe(user=self.user, title="Quick vegan")
+        self.both.tags.add(self.vegan, self.quick)
+        self.vegan_only = create_recipe(user=self.user, title="Slow vegan")
+        self.vegan_only.tags.add(self.vegan)
+        self.untagged = create_recipe(user=self.user, title="Plain")
+
+    def _ids(self, res):
+        return [recipe["id"] for recipe in res.data["results"]]
+
+    def test_filter_any_returns_each_recipe_once(self):
+        """Test a recipe matching several tags is not duplicated"""
+        params = {"tags": f"{self.vegan.id},{self.quick.id}"}
+
+        res = self.client.get(RECIPES_URL, params)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(self._ids(res), [self.vegan_only.id, self.both.id])
+
+    def test_filter_all_requires_every_tag(self):
+        """Test match=all only returns recipes having every tag"""
+        params = {
+            "tags": f"{self.vegan.id},{self.quick.id}",
+            "match": "all",
+        }
+
+        res = self.client.get(RECIPES_URL, params)
+
+        self.assertEqual(self._ids(res), [self.both.id])
+
+    def test_filter_all_ignores_repeated_ids(self):
+        """Test repeating an id does not make match=all impossible"""
+        params = {"tags": f"{self.vegan.id},{self.vegan.id}", "match": "all"}
+
+        res = self.client.get(RECIPES_URL, params)
+
+        self.assertEqual(self._ids(res), [self.vegan_only.id, self.both.id])
+
+    def test_filter_all_tags_and_ingredients(self):
+        """Test match=all applies to tags and ingredients together"""
+        salt = Ingredient.objects.create(user=self.user, name="Salt")
+        self.vegan_only.ingredients.add(salt)
+        params = {
+            "tags": str(self.vegan.id),
+            "ingredients": str(salt.id),
+            "match": "all",
+        }
+
+        res = self.client.get(RECIPES_URL, params)
+
+        self.assertEqual(self._ids(res), [self.vegan_only.id])
+
+    def test_filter_invalid_ids(self):
+        """Test non numeric ids are rejected"""
+        res = self.client.get(RECIPES_URL, {"tags": "1,abc"})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_filter_invalid_match(self):
+        """Test an unknown match mode is rejected"""
+        res = self.client.get(
+            RECIPES_URL, {"tags": str(self.vegan.id), "match": "some"}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_filter_uses_exists(self):
+        """Test the tag filter is a semi-join rather than a join"""
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(RECIPES_URL, {"tags": str(self.vegan.id)})
+
+        recipe_query = next(
+            q["sql"] for q in ctx.captured_queries
+            if q["sql"].startswith('SELECT "core_recipe"')
+        )
+        self.assertIn("EXISTS", recipe_query)
+        self.assertNotIn("DISTINCT", recipe_query)
+
+
+class RecipeSearchTests(QueryCountMixin, TestCase):
+    """Test full-text search of recipes"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email="user@example.com", password="test123")
+        self.client.force_authenticate(self.user)
+        self.curry = create_recipe(
+            user=self.user, title="Chicken curry", description="Spicy"
+        )
+        self.soup = create_recipe(
+            user=self.user, title="Tomato soup",
+            description="Good with chicken bread",
+        )
+        self.salad = create_recipe(
+            user=self.user, title="Green salad", description="Fresh"
+        )
+
+    def _search(self, q, **params):
+        res = self.client.get(RECIPES_URL, {"q": q, **params})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [recipe["id"] for recipe in res.data["results"]]
+
+    def test_search_ranks_title_above_description(self):
+        """Test title matches rank above description matches"""
+        self.assertEqual(
+            self._search("chicken"), [self.curry.id, self.soup.id]
+        )
+
+    def test_search_prefix(self):
+        """Test the last word matches as a prefix"""
+        self.assertEqual(self._search("tomato so"), [self.soup.id])
+        self.assertEqual(self._search("sal"), [self.salad.id])
+
+    def test_search_tags_and_ingredients(self):
+        """Test tag and ingredient names are searchable"""
+        vegan = Tag.objects.create(user=self.user, name="Vegan")
+        self.salad.tags.add(vegan)
+        cumin = Ingredient.objects.create(user=self.user, name="Cumin")
+        self.curry.ingredients.add(cumin)
+
+        self.assertEqual(self._search("vegan"), [self.salad.id])
+        self.assertEqual(self._search("cumin"), [self.curry.id])
+
+        self.salad.tags.remove(vegan)
+        self.assertEqual(self._search("vegan"), [])
+
+    def test_search_follows_renames(self):
+        """Test renaming a tag or editing a recipe updates the index"""
+        tag = Tag.objects.create(user=self.user, name="Weeknight")
+        self.soup.tags.add(tag)
+        tag.name = "Winter"
+        tag.save()
+        self.salad.title = "Winter salad"
+        self.salad.save()
+
+        self.assertEqual(self._search("weeknight"), [])
+        self.assertEqual(
+            sorted(self._search("winter")), [self.soup.id, self.salad.id]
+        )
+
+    def test_search_bulk_created(self):
+        """Test recipes from the bulk endpoint are searchable"""
+        payload = [{
+            "title": "Imported pie",
+            "time_minutes": 10,
+            "price": "4.50",
+            "tags": [{"name": "Dessert"}],
+            "ingredients": [{"name": "Rhubarb"}],
+        }]
+        res = self.client.post(BULK_URL, payload, format="json")
+
+        self.assertEqual(self._search("rhubarb"), res.data["ids"])
+        self.assertEqual(self._search("dessert"), res.data["ids"])
+
+    def test_search_other_users_excluded(self):
+        """Test search only returns the user's own recipes"""
+        other = create_user(email="other@example.com", password="test123")
+        create_recipe(user=other, title="Chicken pie")
+
+        self.assertEqual(
+            self._search("chicken"), [self.curry.id, self.soup.id]
+        )
+
+    def test_search_without_words(self):
+        """Test a query with no words returns nothing"""
+        self.assertEqual(self._search("?!"), [])
+
+    def test_search_pages_by_rank(self):
+        """Test paging through ranked results returns each match once"""
+        for i in range(5):
+            create_recipe(
+                user=self.user,
+                title="Chicken " * (i % 3 + 1),
+                description="chicken",
+            )
+        expected = self._search("chicken", page_size=50)
+
+        ids = []
+        url, params = RECIPES_URL, {"q": "chicken", "page_size": 2}
+        while url:
+            res = self.client.get(url, params)
+            ids.extend(recipe["id"] for recipe in res.data["results"])
+            url, params = res.data["next"], None
+
+        self.assertEqual(len(expected), 7)
+        self.assertEqual(ids, expected)
+
+    def test_search_query_count(self):
+        """Test search costs the same queries as a plain list"""
+        self.assertEndpointQueries(4, "get", RECIPES_URL, {"q": "chicken"})
+
+
 class ImageUploadTest (TestCase):
     """Tests for the image upload API"""
     
@@ -467,4 +1082,354 @@ class ImageUploadTest (TestCase):
         res = self.client.post(url,payload,format="multipart")
         
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
-            
\ No newline at end of file
+
+
+@override_settings(RECIPE_THUMBNAILS={
+    **settings.RECIPE_THUMBNAILS,
+    "WIDTHS": [160, 320, 640],
+    "EAGER": True,
+})
+class ThumbnailTests(TestCase):
+    """Tests for the thumbnail pipeline of uploaded images"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            "user@gmail.com",
+            "pass123"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.recipe = create_recipe(user=self.user)
+
+    def tearDown(self):
+        self.recipe.refresh_from_db()
+        for sizes in self.recipe.thumbnails.values():
+            for name in sizes.values():
+                default_storage.delete(name)
+        self.recipe.image.delete()
+
+    def _upload(self, size=(800, 600), exif=None):
+        """Upload a JPEG and run the on-commit thumbnail job"""
+        with tempfile.NamedTemporaryFile(suffix=".jpg") as image_file:
+            img = Image.new("RGB", size, color="red")
+            img.save(image_file, format="JPEG", exif=exif or Image.Exif())
+            image_file.seek(0)
+            with self.captureOnCommitCallbacks(execute=True):
+                res = self.client.post(
+                    image_upload_url(self.recipe.id),
+                    {"image": image_file},
+                    format="multipart",
+                )
+        self.recipe.refresh_from_db()
+        return res
+
+    def test_update_keeps_concurrent_image_writes(self):
+        """Test a PATCH does not write back a stale image or thumbnails"""
+        thumbnails = {"jpeg": {"320": "uploads/recipe/thumbs/x-320.jpg"}}
+        get_object = RecipeViewSet.get_object
+
+        def stale_get_object(view):
+            # An upload and its thumbnails land after the recipe loaded.
+            recipe = get_object(view)
+            Recipe.objects.filter(pk=recipe.pk).update(
+                image="uploads/recipe/x.jpg", thumbnails=thumbnails
+            )
+            return recipe
+
+        with patch.object(RecipeViewSet, "get_object", stale_get_object):
+            res = self.client.patch(
+                detail_url(self.recipe.id), {"title": "New title"}
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        recipe = Recipe.objects.get(pk=self.recipe.pk)
+        self.assertEqual(recipe.title, "New title")
+        self.assertEqual(recipe.image.name, "uploads/recipe/x.jpg")
+        self.assertEqual(recipe.thumbnails, thumbnails)
+        Recipe.objects.filter(pk=recipe.pk).update(image="", thumbnails={})
+
+    def test_upload_generates_thumbnails(self):
+        """Test derivatives are written for every width and format"""
+        exif = Image.Exif()
+        exif[0x010F] = "Camera maker"
+
+        res = self._upload(exif=exif)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        formats = supported_formats(["webp", "jpeg"])
+        self.assertEqual(sorted(self.recipe.thumbnails), sorted(formats))
+        for fmt in formats:
+            sizes = self.recipe.thumbnails[fmt]
+            self.assertEqual(sorted(sizes, key=int), ["160", "320", "640"])
+            for width, name in sizes.items():
+                with Image.open(default_storage.path(name)) as thumb:
+                    self.assertEqual(thumb.width, int(width))
+                    self.assertEqual(thumb.height, int(width) * 3 // 4)
+                    self.assertEqual(len(thumb.getexif()), 0)
+
+    def test_small_images_are_not_upscaled(self):
+        """Test widths above the original are skipped"""
+        self._upload(size=(200, 100))
+
+        self.assertEqual(list(self.recipe.thumbnails["jpeg"]), ["160"])
+
+    def test_list_exposes_thumbnail_urls(self):
+        """Test the recipe list renders absolute thumbnail URLs"""
+        self._upload()
+
+        res = self.client.get(RECIPES_URL)
+
+        thumbnails = res.data["results"][0]["thumbnails"]
+        self.assertTrue(
+            thumbnails["jpeg"]["320"].startswith("http://testserver/")
+        )
+        self.assertTrue(thumbnails["jpeg"]["320"].endswith("-320.jpeg"))
+
+    @override_settings(RECIPE_THUMBNAILS={
+        **settings.RECIPE_THUMBNAILS, "EAGER": False,
+    })
+    @patch("recipe.thumbnails.get_executor")
+    def test_new_upload_resets_thumbnails(self, mock_get_executor):
+        """Test replacing the image drops the old derivatives"""
+        self.recipe.thumbnails = {"jpeg": {"160": "uploads/recipe/x.jpeg"}}
+        self.recipe.save()
+
+        self._upload()
+
+        self.assertEqual(self.recipe.thumbnails, {})
+
+    @override_settings(RECIPE_THUMBNAILS={
+        **settings.RECIPE_THUMBNAILS, "EAGER": False,
+    })
+    @patch("recipe.thumbnails.get_executor")
+    def test_upload_submits_to_worker_pool(self, mock_get_executor):
+        """Test uploads hand the work to the process pool"""
+        res = self._upload()
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        executor = mock_get_executor.return_value
+        executor.submit.assert_called_once()
+        self.assertEqual(
+            executor.submit.call_args.args[0], render_thumbnails
+        )
+        self.assertEqual(self.recipe.thumbnails, {})
+
+    def _pool_upload(self):
+        """Upload on the real pool and wait for its job to finish"""
+        with patch("recipe.thumbnails._on_done") as on_done:
+            res = self._upload()
+            executor = thumbnails.get_executor()
+            # Waits for the job and runs its done callback.
+            executor.shutdown(wait=True)
+        thumbnails.discard_executor(executor)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        recipe_id, user_id, image_name, used, future = \
+            on_done.call_args.args
+        self.assertIs(used, executor)
+        # The callback's own connection cannot see this test's rows.
+        thumbnails._record(recipe_id, user_id, image_name, future.result())
+        self.recipe.refresh_from_db()
+
+    @override_settings(RECIPE_THUMBNAILS={
+        **settings.RECIPE_THUMBNAILS, "WIDTHS": [160], "EAGER": False,
+    })
+    def test_upload_renders_in_pool_process(self):
+        """Test a spawned pool process renders the thumbnails"""
+        self._pool_upload()
+
+        self.assertEqual(list(self.recipe.thumbnails["jpeg"]), ["160"])
+
+    @override_settings(RECIPE_THUMBNAILS={
+        **settings.RECIPE_THUMBNAILS, "WIDTHS": [160], "EAGER": False,
+    })
+    def test_broken_pool_is_replaced(self):
+        """Test a pool whose process died is rebuilt for the next job"""
+        broken = thumbnails.get_executor()
+        self.addCleanup(thumbnails.discard_executor, broken)
+        with self.assertRaises(BrokenProcessPool):
+            broken.submit(os._exit, 1).result()
+
+        self._pool_upload()
+
+        self.assertEqual(list(self.recipe.thumbnails["jpeg"]), ["160"])
+
+    @override_settings(RECIPE_THUMBNAILS={
+        **settings.RECIPE_THUMBNAILS, "EAGER": False,
+    })
+    @patch("recipe.thumbnails._start", side_effect=OSError("no processes"))
+    def test_pool_errors_do_not_fail_upload(self, mock_start):
+        """Test an upload succeeds when its job cannot be submitted"""
+        with self.assertLogs("recipe.thumbnails", "ERROR"):
+            res = self._upload()
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(self.recipe.image)
+        self.assertEqual(self.recipe.thumbnails, {})
+
+    def test_pool_python_under_uwsgi(self):
+        """Test pool processes run the python next to the uwsgi binary"""
+        with tempfile.TemporaryDirectory() as directory:
+            for name in ("uwsgi", "python"):
+                path = os.path.join(directory, name)
+                with open(path, "w"):
+                    pass
+                os.chmod(path, 0o755)
+            uwsgi = os.path.join(directory, "uwsgi")
+            with patch("recipe.thumbnails.sys.executable", uwsgi):
+                self.assertEqual(
+                    thumbnails.python_executable(),
+                    os.path.join(directory, "python"),
+                )
+
+
+class SparseFieldsTests(QueryCountMixin, TestCase):
+    """Test ?fields= and ?expand= on the recipe reads"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email="user@example.com", password="test123")
+        self.client.force_authenticate(self.user)
+        self.recipe = create_recipe(user=self.user, description="Slow")
+        self.recipe.tags.add(Tag.objects.create(user=self.user, name="Vegan"))
+
+    def test_list_fields(self):
+        """Test only the requested fields are rendered and loaded"""
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(RECIPES_URL, {"fields": "id,title"})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(res.data["results"][0]), {"id", "title"})
+        # data version + one page, no tag / ingredient prefetches
+        self.assertEqual(len(ctx.captured_queries), 2)
+        select = ctx.captured_queries[-1]["sql"]
+        self.assertNotIn('"link"', select)
+        self.assertNotIn('"price"', select)
+
+    def test_list_fields_keep_prefetch_for_relations(self):
+        """Test a requested relation is still prefetched"""
+        res = self.assertEndpointQueries(
+            3, "get", RECIPES_URL, {"fields": "id,tags"}
+        )
+
+        self.assertEqual(res.data["results"][0]["tags"][0]["name"], "Vegan")
+        self.assertNotIn("ingredients", res.data["results"][0])
+
+    def test_list_expand(self):
+        """Test ?expand= adds the description to list items"""
+        res = self.client.get(RECIPES_URL, {"expand": "description"})
+
+        item = res.data["results"][0]
+        self.assertEqual(item["description"], "Slow")
+        self.assertIn("tags", item)
+
+    def test_fields_may_name_expandable(self):
+        """Test an expandable field listed in ?fields= is rendered"""
+        res = self.client.get(RECIPES_URL, {"fields": "title,description"})
+
+        self.assertEqual(
+            res.data["results"][0],
+            {"title": self.recipe.title, "description": "Slow"},
+        )
+
+    def test_empty_fields(self):
+        """Test an empty ?fields= renders every field"""
+        full = self.client.get(RECIPES_URL).data["results"][0]
+
+        for value in ["", ","]:
+            res = self.client.get(RECIPES_URL, {"fields": value})
+            self.assertEqual(res.data["results"][0], full)
+        res = self.client.get(detail_url(self.recipe.id), {"fields": ""})
+        self.assertIn("description", res.data)
+
+    def test_detail_fields(self):
+        """Test ?fields= prunes the detail response"""
+        res = self.client.get(detail_url(self.recipe.id), {"fields": "title"})
+
+        self.assertEqual(res.data, {"title": self.recipe.title})
+
+    def test_unknown_field(self):
+        """Test unknown names are rejected"""
+        res = self.client.get(RECIPES_URL, {"fields": "id,secret"})
+        expand = self.client.get(RECIPES_URL, {"expand": "title"})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("fields", res.data)
+        self.assertEqual(expand.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class RowSerializerParityTests(TestCase):
+    """Test list pages built from .values() rows match the serializers"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email="user@example.com", password="test123")
+        self.client.force_authenticate(self.user)
+        vegan = Tag.objects.create(user=self.user, name="Vegan")
+        quick = Tag.objects.create(user=self.user, name="Quick")
+        salt = Ingredient.objects.create(user=self.user, name="Salt")
+        for i in range(5):
+            recipe = create_recipe(
+                user=self.user,
+                title=f"Crème brûlée {i}",
+                price=Decimal("5.5") + i,
+                link="" if i % 2 else "http://example.com",
+            )
+            if i % 2:
+                recipe.tags.add(quick, vegan)
+            if i:
+                recipe.ingredients.add(salt)
+            if i == 2:
+                Recipe.objects.filter(pk=recipe.pk).update(
+                    image="uploads/recipe/ab/cd/abcd.jpg",
+                    thumbnails={"jpeg": {"160": "thumbs/abcd-160.jpeg"}},
+                )
+
+    def assertSameContent(self, params):
+        """Compare response bytes with the row path off and on"""
+        cache = caches[settings.LIST_RESPONSE_CACHE["BACKEND"]]
+        responses = []
+        for enabled in (False, True):
+            cache.clear()
+            with override_settings(RECIPE_ROW_SERIALIZER=enabled):
+                res = self.client.get(RECIPES_URL, params)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            responses.append(res.content)
+
+        self.assertEqual(responses[0], responses[1])
+        return json.loads(responses[1])
+
+    def test_list(self):
+        """Test the default list"""
+        data = self.assertSameContent({})
+
+        self.assertEqual(len(data["results"]), 5)
+
+    def test_rows_used_for_list(self):
+        """Test the list goes through RowSerializer by default"""
+        with patch.object(
+            RowSerializer, "to_representation", autospec=True,
+            side_effect=RowSerializer.to_representation,
+        ) as to_representation:
+            self.client.get(RECIPES_URL)
+
+        to_representation.assert_called_once()
+
+    def test_pages(self):
+        """Test cursor pages and their links"""
+        data = self.assertSameContent({"page_size": 2})
+        cursor = data["next"].split("cursor=")[1].split("&")[0]
+
+        self.assertSameContent({"page_size": 2, "cursor": cursor})
+
+    def test_search_and_filters(self):
+        """Test ranked search results and tag filters"""
+        tag = Tag.objects.get(name="Vegan")
+
+        self.assertSameContent({"q": "brûlée"})
+        self.assertSameContent({"tags": str(tag.id)})
+
+    def test_sparse_fields(self):
+        """Test ?fields= and ?expand="""
+        self.assertSameContent({"fields": "id,image,thumbnails"})
+        self.assertSameContent({"fields": "title,tags,description"})
+        self.assertSameContent({"expand": "description"})
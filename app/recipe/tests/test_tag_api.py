@@ -2,16 +2,24 @@
 Test tags API
 """
 from decimal import Decimal
+from unittest.mock import patch
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from rest_framework import status
 from rest_framework.test import APIClient
 from core.models import Tag, Recipe
+from recipe.autocomplete import fuzzy_matches
 from recipe.serializers import TagSerializer
+from recipe.views import TagViewSet
 
 TAGS_URL = reverse("recipe:tag-list")
+TAG_USAGE_URL = reverse("recipe:tag-usage")
 
 
 def detail_url(tag_id):
@@ -54,7 +62,7 @@ class PrivateTagApiTests(TestCase):
         serializer = TagSerializer(tags,many=True)
         
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data,serializer.data)
+        self.assertEqual(res.data["results"],serializer.data)
         
     def test_tag_limitedd_to_user(self):
         """Test list of tags is limited to authenticatd user"""
@@ -65,9 +73,9 @@ class PrivateTagApiTests(TestCase):
         res = self.client.get(TAGS_URL)
         
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data),1)
-        self.assertEqual(res.data[0]['id'],tag.id)
-        self.assertEqual(res.data[0]['name'],tag.name)
+        self.assertEqual(len(res.data["results"]),1)
+        self.assertEqual(res.data["results"][0]['id'],tag.id)
+        self.assertEqual(res.data["results"][0]['name'],tag.name)
                
     def test_upadate_tag(self):
         """test updating a tag"""
@@ -83,6 +91,42 @@ class PrivateTagApiTests(TestCase):
         tag.refresh_from_db()
         self.assertEqual(tag.name,payload["name"])
         
+    def test_update_tag_duplicate_name(self):
+        """Test renaming a tag to an existing name is rejected"""
+        Tag.objects.create(user=self.user, name="Dessert")
+        tag = Tag.objects.create(user=self.user, name="define")
+
+        res = self.client.patch(detail_url(tag.id), {"name": "Dessert"})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        tag.refresh_from_db()
+        self.assertEqual(tag.name, "define")
+
+    def test_update_keeps_recipe_count(self):
+        """Test a rename does not write back a stale recipe_count"""
+        tag = Tag.objects.create(user=self.user, name="Dinner")
+        recipe = Recipe.objects.create(
+            user=self.user, title="Soup", time_minutes=5,
+            price=Decimal("1.00"),
+        )
+        get_object = TagViewSet.get_object
+
+        def stale_get_object(view):
+            # A recipe is tagged after the tag was loaded.
+            obj = get_object(view)
+            recipe.tags.add(tag)
+            return obj
+
+        # The simulated concurrent write runs inside the request.
+        with patch.object(TagViewSet, "get_object", stale_get_object), \
+                patch.object(TagViewSet, "query_budget", {}):
+            res = self.client.patch(detail_url(tag.id), {"name": "Supper"})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        tag.refresh_from_db()
+        self.assertEqual(tag.name, "Supper")
+        self.assertEqual(tag.recipe_count, 1)
+
     def test_delete__tag(self):
         """Test deleting a tag"""
         tag = Tag.objects.create(user=self.user,name="define")
@@ -113,5 +157,161 @@ class PrivateTagApiTests(TestCase):
         s1 = TagSerializer(tag1)
         s2 = TagSerializer(tag2)
         
-        self.assertIn(s1.data,res.data)
-        self.assertNotIn(s2.data,res.data)
\ No newline at end of file
+        self.assertIn(s1.data,res.data["results"])
+        self.assertNotIn(s2.data,res.data["results"])
+
+    def test_filter_assigned_tags_unique(self):
+        """Test a tag used by several recipes is listed once"""
+        tag = Tag.objects.create(user=self.user, name="Vegan")
+        Tag.objects.create(user=self.user, name="Unused")
+        for title in ["Soup", "Salad"]:
+            recipe = Recipe.objects.create(
+                user=self.user, title=title, time_minutes=5,
+                price=Decimal("1"),
+            )
+            recipe.tags.add(tag)
+
+        res = self.client.get(TAGS_URL, {"assigned_only": 1})
+
+        self.assertEqual(
+            res.data["results"], [{"id": tag.id, "name": "Vegan"}]
+        )
+
+    def test_tag_usage(self):
+        """Test the usage endpoint lists used tags, most used first"""
+        tags = {
+            name: Tag.objects.create(user=self.user, name=name)
+            for name in ["Dinner", "Quick", "Vegan", "Unused"]
+        }
+        for i in range(3):
+            recipe = Recipe.objects.create(
+                user=self.user, title=f"r{i}", time_minutes=5,
+                price=Decimal("1"),
+            )
+            names = ["Dinner", "Quick", "Vegan"][:i + 1]
+            recipe.tags.add(*[tags[name] for name in names])
+        other = create_user(email="other@gmail.com")
+        Tag.objects.create(user=other, name="Other")
+
+        res = self.client.get(TAG_USAGE_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["results"], [
+            {"id": tags["Dinner"].id, "name": "Dinner", "recipe_count": 3},
+            {"id": tags["Quick"].id, "name": "Quick", "recipe_count": 2},
+            {"id": tags["Vegan"].id, "name": "Vegan", "recipe_count": 1},
+        ])
+        res = self.client.get(TAG_USAGE_URL, {"limit": 1})
+        self.assertEqual(len(res.data["results"]), 1)
+
+    def test_tags_paginated_by_name(self):
+        """Test tags are paged in descending name order"""
+        names = ["Breakfast", "Dinner", "Lunch", "Snack", "Vegan"]
+        for name in names:
+            Tag.objects.create(user=self.user, name=name)
+
+        res = self.client.get(TAGS_URL, {"page_size": 2})
+        seen = [tag["name"] for tag in res.data["results"]]
+        while res.data["next"]:
+            res = self.client.get(res.data["next"])
+            seen.extend(tag["name"] for tag in res.data["results"])
+
+        self.assertEqual(seen, sorted(names, reverse=True))
+
+    def test_tag_list_not_modified(self):
+        """Test the tag list honours If-None-Match until a tag changes"""
+        tag = Tag.objects.create(user=self.user, name="Vegan")
+        etag = self.client.get(TAGS_URL)["ETag"]
+
+        res = self.client.get(TAGS_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.client.patch(detail_url(tag.id), {"name": "Vegetarian"})
+        res = self.client.get(TAGS_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["results"][0]["name"], "Vegetarian")
+
+
+class TagAutocompleteTests(TestCase):
+    """Test ?prefix= and ?fuzzy= lookups on tags"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = create_user()
+        self.client.force_authenticate(self.user)
+        for name in ["Vegetarian", "Vegan", "Veggie burgers", "Dessert"]:
+            Tag.objects.create(user=self.user, name=name)
+        other = create_user(email="other@gmail.com")
+        Tag.objects.create(user=other, name="Vegan")
+
+    def _names(self, params):
+        res = self.client.get(TAGS_URL, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [tag["name"] for tag in res.data["results"]]
+
+    def test_prefix_shortest_first(self):
+        """Test prefix matches ignore case and list short names first"""
+        self.assertEqual(
+            self._names({"prefix": "veg"}),
+            ["Vegan", "Vegetarian", "Veggie burgers"],
+        )
+
+    def test_prefix_limit(self):
+        """Test the number of matches is capped"""
+        self.assertEqual(
+            self._names({"prefix": "veg", "limit": 2}), ["Vegan", "Vegetarian"]
+        )
+        with self.settings(AUTOCOMPLETE={"LIMIT": 10, "MAX_LIMIT": 1,
+                                         "TTL": 30}):
+            self.assertEqual(
+                self._names({"prefix": "ve", "limit": 50}), ["Vegan"]
+            )
+
+    def test_invalid_limit(self):
+        """Test a non numeric limit is rejected"""
+        res = self.client.get(TAGS_URL, {"prefix": "veg", "limit": "x"})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @patch("recipe.autocomplete.trigram_available", return_value=False)
+    def test_fuzzy_without_trigram(self, mock_available):
+        """Test fuzzy lookups fall back to substring matches"""
+        self.assertEqual(self._names({"fuzzy": "SSER"}), ["Dessert"])
+
+    @patch("recipe.autocomplete.trigram_available", return_value=True)
+    def test_fuzzy_uses_trigram_index(self, mock_available):
+        """Test fuzzy lookups use the indexed word similarity operator"""
+        sql = str(fuzzy_matches(Tag.objects.all(), "vegn").query)
+
+        self.assertIn('UPPER("core_tag"."name") %> VEGN', sql)
+        self.assertIn("WORD_SIMILARITY", sql)
+
+    @override_settings(AUTOCOMPLETE={"LIMIT": 10, "MAX_LIMIT": 50,
+                                     "TTL": 7})
+    def test_lookup_cache_ttl(self):
+        """Test lookups are cached for AUTOCOMPLETE["TTL"] seconds"""
+        list_cache = caches[settings.LIST_RESPONSE_CACHE["BACKEND"]]
+        with patch.object(list_cache, "set", wraps=list_cache.set) as set_:
+            self._names({"prefix": "veg"})
+            self.client.get(TAGS_URL)
+
+        timeouts = [
+            call.args[2] for call in set_.call_args_list
+            if call.args[0].startswith("list-response:")
+        ]
+        self.assertEqual(
+            timeouts, [7, settings.LIST_RESPONSE_CACHE["TTL"]]
+        )
+
+    def test_lookup_cached_until_tags_change(self):
+        """Test repeated lookups skip the tag table until a tag changes"""
+        self._names({"prefix": "veg"})
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(len(self._names({"prefix": "veg"})), 3)
+        self.assertEqual(len(ctx), 1)
+
+        Tag.objects.create(user=self.user, name="Vegetables")
+        self.assertIn("Vegetables", self._names({"prefix": "veg"}))
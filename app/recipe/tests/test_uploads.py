@@ -0,0 +1,180 @@
+"""
+Tests for the streaming image upload handler
+"""
+import io
+import struct
+import zlib
+
+from PIL import Image
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe
+from recipe.uploads import quota_used, read_image_header
+
+
+def image_upload_url(recipe_id):
+    return reverse("recipe:recipe-upload-image", args=[recipe_id])
+
+
+def image_bytes(size=(10, 10), fmt="JPEG", **kwargs):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, "orange").save(buffer, format=fmt, **kwargs)
+    return buffer.getvalue()
+
+
+def png_chunk(kind, data):
+    body = kind + data
+    return struct.pack(">I", len(data)) + body + \
+        struct.pack(">I", zlib.crc32(body))
+
+
+def png_bomb(width, height):
+    """A tiny PNG that declares the given size"""
+    ihdr = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return (
+        b"\x89PNG\r\n\x1a\n" + png_chunk(b"IHDR", ihdr) +
+        png_chunk(b"IDAT", zlib.compress(b"\0" * 1024)) +
+        png_chunk(b"IEND", b"")
+    )
+
+
+def upload(data, name="image.jpg"):
+    return {"image": SimpleUploadedFile(name, data)}
+
+
+def limits(**kwargs):
+    return override_settings(
+        RECIPE_IMAGE_UPLOAD={**settings.RECIPE_IMAGE_UPLOAD, **kwargs}
+    )
+
+
+class ReadImageHeaderTests(TestCase):
+    """Tests for reading image dimensions from a partial file"""
+
+    def test_reads_size_from_first_bytes(self):
+        """Test the size is found without the rest of the file"""
+        for fmt, kwargs in [
+            ("JPEG", {}),
+            ("PNG", {}),
+            ("WEBP", {"lossless": False}),
+            ("WEBP", {"lossless": True}),
+            ("WEBP", {"exif": Image.Exif()}),
+        ]:
+            with self.subTest(fmt=fmt, **kwargs):
+                data = image_bytes((321, 123), fmt, **kwargs)
+                found = read_image_header(data[:1024], ["JPEG", "PNG", "WEBP"])
+                self.assertEqual(found, (fmt, (321, 123)))
+
+    def test_needs_more_data(self):
+        """Test a truncated header asks for more data"""
+        data = image_bytes((50, 50), "JPEG")
+        self.assertIsNone(read_image_header(data[:20], ["JPEG"]))
+
+    def test_other_formats_not_identified(self):
+        """Test formats outside the allowed list are not opened"""
+        data = image_bytes((50, 50), "GIF")
+        self.assertIsNone(read_image_header(data, ["JPEG", "PNG"]))
+
+
+class ImageUploadLimitTests(TestCase):
+    """Tests for the limits enforced while an image streams in"""
+
+    def setUp(self):
+        caches[settings.RECIPE_IMAGE_UPLOAD["BACKEND"]].clear()
+        self.user = get_user_model().objects.create_user(
+            "user@gmail.com",
+            "pass123"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user, title="Sample", time_minutes=5, price="5.00"
+        )
+
+    def tearDown(self):
+        self.recipe.refresh_from_db()
+        self.recipe.image.delete()
+
+    def assertRejected(self, res, message):
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn(message, res.data["image"][0])
+        self.recipe.refresh_from_db()
+        self.assertFalse(self.recipe.image)
+
+    def test_decompression_bomb_rejected(self):
+        """Test a small file declaring huge dimensions is rejected"""
+        url = image_upload_url(self.recipe.id)
+        res = self.client.post(
+            url, upload(png_bomb(60000, 60000), "bomb.png"),
+            format="multipart",
+        )
+
+        self.assertRejected(res, "dimensions")
+
+    def test_too_many_pixels_rejected(self):
+        """Test the pixel limit applies below the dimension limit"""
+        url = image_upload_url(self.recipe.id)
+        with limits(MAX_PIXELS=5000):
+            res = self.client.post(
+                url, upload(image_bytes((100, 100))), format="multipart"
+            )
+
+        self.assertRejected(res, "dimensions")
+
+    def test_unsupported_format_rejected(self):
+        """Test only the configured formats are accepted"""
+        url = image_upload_url(self.recipe.id)
+        res = self.client.post(
+            url, upload(image_bytes(fmt="GIF"), "image.gif"),
+            format="multipart",
+        )
+
+        self.assertRejected(res, "valid image")
+
+    def test_file_too_large_rejected(self):
+        """Test uploads over MAX_BYTES are cut off"""
+        data = image_bytes((400, 400), "PNG")
+        url = image_upload_url(self.recipe.id)
+        with limits(MAX_BYTES=len(data) - 1):
+            res = self.client.post(url, upload(data), format="multipart")
+
+        self.assertRejected(res, "too large")
+
+    def test_daily_quota(self):
+        """Test accepted uploads count towards the daily quota"""
+        data = image_bytes((20, 20))
+        url = image_upload_url(self.recipe.id)
+        with limits(DAILY_QUOTA_BYTES=len(data) * 2):
+            for _ in range(2):
+                res = self.client.post(url, upload(data), format="multipart")
+                self.assertEqual(res.status_code, status.HTTP_200_OK)
+                self.recipe.refresh_from_db()
+                self.recipe.image.delete()
+            self.assertEqual(quota_used(self.user.id), len(data) * 2)
+
+            res = self.client.post(url, upload(data), format="multipart")
+
+        self.assertRejected(res, "quota")
+
+    def test_quota_per_user(self):
+        """Test one user's uploads do not use another user's quota"""
+        other = get_user_model().objects.create_user(
+            "other@gmail.com",
+            "pass123"
+        )
+        data = image_bytes((20, 20))
+        url = image_upload_url(self.recipe.id)
+        with limits(DAILY_QUOTA_BYTES=len(data)):
+            res = self.client.post(url, upload(data), format="multipart")
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(quota_used(other.id), 0)
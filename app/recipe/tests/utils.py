@@ -0,0 +1,34 @@
+"""
+Helpers shared by the recipe API tests
+"""
+from collections import Counter
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from core.querycheck import fingerprint
+
+
+class QueryCountMixin:
+    """Pin the number of queries an endpoint issues"""
+
+    def assertEndpointQueries(self, expected, method, url, *args, **kwargs):
+        """Call the endpoint and assert it ran exactly ``expected`` queries"""
+        with CaptureQueriesContext(connection) as ctx:
+            res = getattr(self.client, method)(url, *args, **kwargs)
+
+        executed = [query["sql"] for query in ctx.captured_queries]
+        # Group by shape, so an N+1 shows as one line with a count
+        shapes = Counter(fingerprint(sql) for sql in executed)
+        self.assertEqual(
+            len(executed),
+            expected,
+            "%s %s ran %d queries, expected %d:\n%s" % (
+                method.upper(), url, len(executed), expected,
+                "\n".join(
+                    "%3d x %s" % (count, shape)
+                    for shape, count in shapes.items()
+                ),
+            )
+        )
+        return res
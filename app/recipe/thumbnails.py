@@ -0,0 +1,147 @@
+"""
+Background generation of recipe image thumbnails
+"""
+import logging
+import multiprocessing
+import os
+import shutil
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from core.models import Recipe
+from core.storage import THUMBS_DIR, image_storage
+from core.versioning import bump_data_version
+from recipe.imaging import render_thumbnails
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def python_executable():
+    """Return the Python interpreter to spawn pool processes with.
+
+    Under uWSGI sys.executable is the uwsgi binary, which cannot run a
+    spawned child; use the python installed next to it instead.
+    """
+    if os.path.basename(sys.executable).startswith("python"):
+        return sys.executable
+    version = "python%d.%d" % sys.version_info[:2]
+    for directory in (os.path.dirname(sys.executable),
+                      os.path.join(sys.exec_prefix, "bin")):
+        for name in ("python", version, "python3"):
+            path = os.path.join(directory, name)
+            if os.access(path, os.X_OK):
+                return path
+    return shutil.which(version) or shutil.which("python3") \
+        or sys.executable
+
+
+def get_executor():
+    """Return this worker's process pool, starting it on first use"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # uWSGI workers run threads; never fork them.
+            context = multiprocessing.get_context("spawn")
+            context.set_executable(python_executable())
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.RECIPE_THUMBNAILS["WORKERS"],
+                mp_context=context,
+            )
+        return _executor
+
+
+def discard_executor(executor):
+    """Drop a broken pool, so the next job starts a new one"""
+    global _executor
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _job(recipe):
+    """Return the render_thumbnails arguments for a recipe's image"""
+    name = recipe.image.name
+    directory, filename = os.path.split(name)
+    return (
+        image_storage.path(name),
+        image_storage.path(os.path.join(directory, THUMBS_DIR)),
+        os.path.splitext(filename)[0],
+        settings.RECIPE_THUMBNAILS["WIDTHS"],
+        settings.RECIPE_THUMBNAILS["FORMATS"],
+    )
+
+
+def _record(recipe_id, user_id, image_name, derivatives):
+    """Store the derivative names on the recipe"""
+    directory = os.path.join(os.path.dirname(image_name), THUMBS_DIR)
+    thumbnails = {
+        fmt: {
+            width: os.path.join(directory, filename)
+            for width, filename in sizes.items()
+        }
+        for fmt, sizes in derivatives.items()
+    }
+    # Only record if the image was not replaced in the meantime.
+    updated = Recipe.objects.filter(
+        pk=recipe_id, image=image_name
+    ).update(thumbnails=thumbnails)
+    if updated:
+        bump_data_version(user_id)
+
+
+def _on_done(recipe_id, user_id, image_name, executor, future):
+    """Record a finished job from the pool's result thread"""
+    close_old_connections()
+    try:
+        _record(recipe_id, user_id, image_name, future.result())
+    except BrokenProcessPool:
+        # A child died, e.g. out of memory; the pool takes no more jobs.
+        logger.exception("thumbnail pool broke on recipe %s", recipe_id)
+        discard_executor(executor)
+    except Exception:
+        logger.exception("thumbnails failed for recipe %s", recipe_id)
+    finally:
+        close_old_connections()
+
+
+def _start(job):
+    """Submit a job, replacing the pool once if it is broken"""
+    executor = get_executor()
+    try:
+        return executor, executor.submit(render_thumbnails, *job)
+    except BrokenProcessPool:
+        discard_executor(executor)
+        executor = get_executor()
+        return executor, executor.submit(render_thumbnails, *job)
+
+
+def _submit(recipe_id, user_id, image_name, job):
+    """Generate thumbnails; a failure here never fails the upload"""
+    try:
+        if settings.RECIPE_THUMBNAILS["EAGER"]:
+            derivatives = render_thumbnails(*job)
+            _record(recipe_id, user_id, image_name, derivatives)
+            return
+        executor, future = _start(job)
+    except Exception:
+        logger.exception("thumbnails failed for recipe %s", recipe_id)
+        return
+    future.add_done_callback(
+        lambda f: _on_done(recipe_id, user_id, image_name, executor, f)
+    )
+
+
+def schedule_thumbnails(recipe):
+    """Generate the recipe's thumbnails once the upload is committed"""
+    job = _job(recipe)
+    args = (recipe.pk, recipe.user_id, recipe.image.name, job)
+    transaction.on_commit(lambda: _submit(*args))
@@ -0,0 +1,172 @@
+"""
+Streaming upload handling for recipe images
+"""
+import io
+import struct
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+from PIL import Image
+from rest_framework.exceptions import ValidationError
+
+# Buffer at most this much of a file while looking for its dimensions.
+# JPEG puts EXIF and ICC segments before the frame header.
+HEADER_LIMIT = 512 * 1024
+
+QUOTA_WINDOW = 24 * 60 * 60
+
+
+def _quota_cache():
+    return caches[settings.RECIPE_IMAGE_UPLOAD["BACKEND"]]
+
+
+def quota_key(user_id):
+    """Cache key holding the bytes a user uploaded in the current window"""
+    window = int(time.time()) // QUOTA_WINDOW
+    return f"image-upload-quota:{user_id}:{window}"
+
+
+def quota_used(user_id):
+    """Return the bytes a user uploaded in the current window"""
+    return _quota_cache().get(quota_key(user_id), 0)
+
+
+def charge_quota(user_id, size):
+    """Add an accepted upload to the user's quota usage"""
+    cache = _quota_cache()
+    key = quota_key(user_id)
+    cache.add(key, 0, QUOTA_WINDOW)
+    try:
+        cache.incr(key, size)
+    except ValueError:
+        # Expired between add() and incr().
+        cache.set(key, size, QUOTA_WINDOW)
+
+
+def _webp_size(header):
+    """Read a WebP canvas size from the RIFF header.
+
+    Pillow needs the whole file to open a WebP image, so the size is read
+    from the first chunk instead.
+    """
+    if len(header) < 30 or header[:4] != b"RIFF" or header[8:12] != b"WEBP":
+        return None
+    chunk = header[12:16]
+    if chunk == b"VP8X":
+        width = int.from_bytes(header[24:27], "little") + 1
+        height = int.from_bytes(header[27:30], "little") + 1
+    elif chunk == b"VP8 " and header[23:26] == b"\x9d\x01\x2a":
+        width, height = struct.unpack("<HH", header[26:30])
+        width, height = width & 0x3FFF, height & 0x3FFF
+    elif chunk == b"VP8L" and header[20] == 0x2F:
+        bits = int.from_bytes(header[21:25], "little")
+        width = (bits & 0x3FFF) + 1
+        height = ((bits >> 14) & 0x3FFF) + 1
+    else:
+        return None
+    return width, height
+
+
+def read_image_header(header, formats):
+    """Return (format, (width, height)) from the start of an image file.
+
+    Returns None while more data is needed. Pillow only parses the header
+    here; nothing is decoded.
+    """
+    if "WEBP" in formats:
+        size = _webp_size(header)
+        if size is not None:
+            return "WEBP", size
+    try:
+        with Image.open(io.BytesIO(header), formats=formats) as image:
+            return image.format, image.size
+    except Image.DecompressionBombError:
+        raise
+    except (OSError, SyntaxError, struct.error):
+        return None
+
+
+class ImageUploadHandler(FileUploadHandler):
+    """Stream an image upload to a temporary file and vet it on the way.
+
+    The format and dimensions are read from the first chunks, so
+    oversized or decompression bomb images are rejected before the rest
+    of the body is read. Size and the per-user daily quota are enforced
+    per chunk. Nothing beyond the header is kept in memory.
+    """
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.limits = settings.RECIPE_IMAGE_UPLOAD
+        user = getattr(request, "user", None)
+        self.user_id = user.pk if user is not None else None
+
+    def reject(self, message):
+        """Discard the partial upload and fail the request with a 400"""
+        self.upload_interrupted()
+        raise ValidationError({"image": [message]})
+
+    def _quota_left(self):
+        quota = self.limits["DAILY_QUOTA_BYTES"]
+        if not quota or self.user_id is None:
+            return None
+        return quota - quota_used(self.user_id)
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.header = bytearray()
+        self.checked = False
+        self.size = 0
+        self.quota_left = self._quota_left()
+        if self.quota_left is not None and self.quota_left <= 0:
+            raise ValidationError({"image": ["Daily upload quota exceeded."]})
+        self.file = TemporaryUploadedFile(
+            self.file_name, self.content_type, 0, self.charset,
+            self.content_type_extra,
+        )
+
+    def _check_header(self, complete=False):
+        try:
+            found = read_image_header(bytes(self.header), self.limits["FORMATS"])
+        except Image.DecompressionBombError:
+            self.reject("Image dimensions are too large.")
+        if found is None:
+            if complete or len(self.header) >= HEADER_LIMIT:
+                self.reject("Upload a valid image.")
+            return
+        fmt, (width, height) = found
+        if fmt not in self.limits["FORMATS"]:
+            self.reject(f"Unsupported image format {fmt}.")
+        if max(width, height) > self.limits["MAX_DIMENSION"] or \
+                width * height > self.limits["MAX_PIXELS"]:
+            self.reject("Image dimensions are too large.")
+        self.checked = True
+        self.header = None
+
+    def receive_data_chunk(self, raw_data, start):
+        self.size += len(raw_data)
+        if self.size > self.limits["MAX_BYTES"]:
+            self.reject("Image file is too large.")
+        if self.quota_left is not None and self.size > self.quota_left:
+            self.reject("Daily upload quota exceeded.")
+        if not self.checked:
+            self.header += raw_data
+            self._check_header()
+        self.file.write(raw_data)
+
+    def file_complete(self, file_size):
+        if not self.checked:
+            self._check_header(complete=True)
+        if self.user_id is not None:
+            charge_quota(self.user_id, file_size)
+        self.file.seek(0)
+        self.file.size = file_size
+        return self.file
+
+    def upload_interrupted(self):
+        if hasattr(self, "file"):
+            # Closing the named temporary file also removes it.
+            self.file.close()
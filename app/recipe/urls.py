@@ -1,12 +1,13 @@
 """Url mapping for recipe App"""
 
+from django.conf import settings
 from django.urls import (
     path,
     include
 )
 
 from rest_framework.routers import DefaultRouter
-from recipe import views
+from recipe import async_views, views
 
 router = DefaultRouter()
 router.register('recipes',views.RecipeViewSet)
@@ -19,4 +20,11 @@ app_name="recipe"
 
 urlpatterns = [
     path('',include(router.urls)),
-]
\ No newline at end of file
+]
+
+if settings.ASYNC_VIEWS:
+    # Unnamed so reverse() keeps resolving to the router's identical URLs.
+    urlpatterns = [
+        path("recipes/", async_views.AsyncRecipeListView.as_view()),
+        path("recipes/<int:pk>/", async_views.AsyncRecipeDetailView.as_view()),
+    ] + urlpatterns
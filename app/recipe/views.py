@@ -1,39 +1,123 @@
 """
 Views for the recipe API
 """
+import json
 
-from rest_framework.authentication import TokenAuthentication
+from django.conf import settings
+from django.http import StreamingHttpResponse
+
+from rest_framework.utils.encoders import JSONEncoder
 from rest_framework.permissions import IsAuthenticated
 from rest_framework import viewsets
+from core.authentication import CachedTokenAuthentication
 from core.models import Recipe, Tag, Ingredient
-from .serializers import RecipeSerializer, IngredientSerializer, RecipeDetailSerializer, TagSerializer,RecipeImageSerializer
+from .serializers import (
+    IngredientSerializer,
+    IngredientUsageSerializer,
+    RecipeDetailSerializer,
+    RecipeImageSerializer,
+    RecipeSerializer,
+    TagSerializer,
+    TagUsageSerializer,
+)
+from .querysets import (
+    only_for_serializer,
+    optimize_for_serializer,
+    related_ids_filter,
+    search_recipes,
+)
+from .pagination import RecipeCursorPagination, RecipeAttrCursorPagination
+from .parsers import NDJSONParser
+from .autocomplete import AutocompleteMixin
+from .caching import VersionedListCacheMixin
+from .rows import RowListMixin, RowSerializer
+from .thumbnails import schedule_thumbnails
+from .uploads import ImageUploadHandler
 from rest_framework import mixins
 from rest_framework import status
 from rest_framework.response import Response 
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.settings import api_settings
+from django.db import IntegrityError, transaction
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(VersionedListCacheMixin,
+                    RowListMixin,
+                    viewsets.ModelViewSet):
     """Viewset for the recipe APIs"""
     
     serializer_class = RecipeDetailSerializer
     queryset = Recipe.objects.all()
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
+    pagination_class = RecipeCursorPagination
+    # Most queries an action may run, whatever the number of recipes,
+    # tags or ingredients; enforced in tests by core.test_runner
+    query_budget = {
+        "list": 5,
+        "retrieve": 4,
+        "create": 16,
+        "update": 16,
+        "partial_update": 16,
+        "upload_image": 4,
+    }
     
+    def _params_to_ints(self, name):
+        """Convert a comma separated query param to a list of ids"""
+        value = self.request.query_params.get(name)
+        if not value:
+            return []
+        try:
+            return [int(str_id) for str_id in value.split(',')]
+        except ValueError:
+            raise ValidationError({name: ["Expected comma separated ids."]})
+
     def get_queryset(self):
         """Retreieve recipes for authenticated user. """
-        queryset = self.queryset
-        tags = self.request.query_params.get("tags")
-        ingredients = self.request.query_params.get("ingredients")
+        queryset = self.queryset.defer("search_vector")
+        tags = self._params_to_ints("tags")
+        ingredients = self._params_to_ints("ingredients")
+        match = self.request.query_params.get("match", "any")
+        if match not in ("any", "all"):
+            raise ValidationError({"match": ['Expected "any" or "all".']})
         
         if tags:
-            tags_id = [int(tag) for tag in tags.split(',')]
-            queryset = queryset.filter(tags__id__in=tags_id)
+            queryset = queryset.filter(
+                related_ids_filter(Recipe, "tags", tags, match == "all")
+            )
         if ingredients:
-            ingredients_id = [int(ing) for ing in ingredients.split(',')]
-            queryset = queryset.filter(ingredients__id__in=ingredients_id)
-        return queryset.filter(user=self.request.user).order_by('-id')
+            queryset = queryset.filter(
+                related_ids_filter(
+                    Recipe, "ingredients", ingredients, match == "all"
+                )
+            )
+        search = self.request.query_params.get("q", "").strip()
+        if search:
+            queryset = search_recipes(queryset, search)
+        queryset = queryset.filter(user=self.request.user).order_by('-id')
+        serializer = self.get_serializer()
+        queryset = optimize_for_serializer(queryset, serializer)
+        if getattr(serializer, "pruned", False):
+            queryset = only_for_serializer(queryset, serializer)
+        return queryset
+
+    def get_serializer(self, *args, **kwargs):
+        """Shape read responses with ?fields= / ?expand="""
+        if self.action in ("list", "retrieve", "export"):
+            kwargs.update(self.get_serializer_class().sparse_kwargs(
+                self.request.query_params
+            ))
+        return super().get_serializer(*args, **kwargs)
+
+    def get_row_serializer(self):
+        """Build list pages from .values() rows unless turned off"""
+        if self.action != "list" or not settings.RECIPE_ROW_SERIALIZER:
+            return None
+        serializer = self.get_serializer()
+        if not RowSerializer.supports(serializer):
+            return None
+        return RowSerializer(serializer)
     
     def get_serializer_class(self, *args, **kwargs):
         """return the serialzer class for the reques"""
@@ -52,20 +136,77 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def upload_image(self,request,pk=None):
         """Upload an image to recipe"""
         recie = self.get_object()
+        # Must be set before request.data parses the body.
+        request._request.upload_handlers = [
+            ImageUploadHandler(request._request)
+        ]
         serializer = self.get_serializer(recie,data=request.data)
         
         if serializer.is_valid():
-            serializer.save()
+            # Derivatives of the previous image no longer apply.
+            recipe = serializer.save(thumbnails={})
+            schedule_thumbnails(recipe)
             return Response(serializer.data,status=status.HTTP_200_OK)
         return Response(serializer.errors,status=status.HTTP_400_BAD_REQUEST)            
 
-class BaseRecipeViewSet(mixins.ListModelMixin,
+    @action(methods=["POST"], detail=False, url_path="bulk",
+            parser_classes=[api_settings.DEFAULT_PARSER_CLASSES[0],
+                            NDJSONParser])
+    def bulk(self, request):
+        """Create many recipes from a JSON array or NDJSON body"""
+        serializer = self.get_serializer(
+            data=request.data,
+            many=True,
+            allow_empty=False,
+            max_length=settings.RECIPE_BULK_MAX_ITEMS,
+        )
+        serializer.is_valid(raise_exception=True)
+        recipes = serializer.save(user=request.user)
+        return Response(
+            {"created": len(recipes), "ids": [recipe.id for recipe in recipes]},
+            status=status.HTTP_201_CREATED
+        )
+
+    def _export_lines(self, queryset):
+        """Yield one NDJSON line per recipe, a chunk at a time"""
+        size = settings.RECIPE_EXPORT_CHUNK_SIZE
+        chunk = []
+        for recipe in queryset.iterator(chunk_size=size):
+            chunk.append(recipe)
+            if len(chunk) == size:
+                yield from self._render_lines(chunk)
+                chunk = []
+        yield from self._render_lines(chunk)
+
+    def _render_lines(self, recipes):
+        """Serialize recipes to NDJSON lines"""
+        for item in self.get_serializer(recipes, many=True).data:
+            yield json.dumps(item, cls=JSONEncoder, ensure_ascii=False) + "\n"
+
+    @action(methods=["GET"], detail=False)
+    def export(self, request):
+        """Stream every recipe of the user as NDJSON"""
+        return StreamingHttpResponse(
+            self._export_lines(self.get_queryset()),
+            content_type=NDJSONParser.media_type
+        )
+
+class BaseRecipeViewSet(VersionedListCacheMixin,
+                        AutocompleteMixin,
+                        mixins.ListModelMixin,
                         mixins.DestroyModelMixin,
                         mixins.UpdateModelMixin,
                         viewsets.GenericViewSet):
     """Base ViewSet for recipe attribute"""
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
+    pagination_class = RecipeAttrCursorPagination
+    query_budget = {
+        "list": 2,
+        "usage": 1,
+        "partial_update": 5,
+        "destroy": 4,
+    }
     
     def get_queryset(self):
         """filter query set to authenicated user"""
@@ -74,16 +215,47 @@ class BaseRecipeViewSet(mixins.ListModelMixin,
         )
         queryset = self.queryset
         if assigned_only:
-            queryset = queryset.filter(recipe__isnull=False)
-        return queryset.filter(user=self.request.user).order_by("-name")    
+            queryset = queryset.filter(recipe_count__gt=0)
+        return queryset.filter(user=self.request.user).order_by("-name", "-id")    
+
+    def get_serializer_class(self):
+        if self.action == "usage":
+            return self.usage_serializer_class
+        return super().get_serializer_class()
+
+    @action(methods=["GET"], detail=False, url_path="usage")
+    def usage(self, request):
+        """List the most used ones, most recipes first"""
+        limits = settings.RECIPE_USAGE
+        try:
+            limit = int(request.query_params.get("limit", limits["LIMIT"]))
+        except ValueError:
+            raise ValidationError({"limit": ["Expected a number."]})
+        limit = max(1, min(limit, limits["MAX_LIMIT"]))
+        queryset = (
+            self.queryset.filter(user=request.user, recipe_count__gt=0)
+            .order_by("-recipe_count", "name")[:limit]
+        )
+        serializer = self.get_serializer(queryset, many=True)
+        return Response({"results": serializer.data})
+
+    def perform_update(self, serializer):
+        """Reject renaming to a name the user already has"""
+        try:
+            with transaction.atomic():
+                serializer.save()
+        except IntegrityError:
+            raise ValidationError({"name": ["You already have one with this name."]})
     
 class TagViewSet(BaseRecipeViewSet):
     """Viewset for tags"""
     serializer_class = TagSerializer
+    usage_serializer_class = TagUsageSerializer
     queryset = Tag.objects.all()
 
         
 class IngredientViewSet(BaseRecipeViewSet):
     """Mange ingredients"""
     serializer_class = IngredientSerializer
+    usage_serializer_class = IngredientUsageSerializer
     queryset = Ingredient.objects.all()
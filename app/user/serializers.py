@@ -8,6 +8,8 @@ from django.contrib.auth import (
 from rest_framework import serializers
 from django.utils.translation import gettext as _
 
+from core.tokens import revoke_tokens
+
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = get_user_model()
@@ -21,12 +23,21 @@ class UserSerializer(serializers.ModelSerializer):
     def update(self, instance, validated_data):
         """update and return user"""
         password = validated_data.pop('password',None)
-        user = super().update(instance,validated_data)
-        
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        fields = list(validated_data)
+        if password:
+            instance.set_password(password)
+            fields.append('password')
+        # The instance comes from the token auth cache and may be stale;
+        # saving every column would write back an old data_version and
+        # token_version, which only their own updates may change.
+        if fields:
+            instance.save(update_fields=fields)
         if password:
-            user.set_password(password)
-            user.save()
-        return user    
+            # Sessions opened with the old password end here.
+            revoke_tokens(instance)
+        return instance
             
 class AuthTokenSerializer(serializers.Serializer):
     """Serializer for the user token"""  
@@ -1,11 +1,23 @@
 """Test for the user api"""
 
 
-from django.test import TestCase
+import json
+
+from django.contrib.auth.hashers import identify_hasher, make_password
+from django.test import (
+    AsyncRequestFactory,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
 from django.urls import reverse
 from rest_framework.test import APIClient
 from rest_framework import status
 from django.contrib.auth import get_user_model
+from rest_framework.authtoken.models import Token
+
+from core.throttling import login_buckets
+from user.views import AsyncTokenView
 
 CREATE_USER_URL = reverse("user:create")
 TOKEN_URL = reverse("user:token")
@@ -20,6 +32,7 @@ class PublicUserTest(TestCase):
     """Test the public user API (in case not authenticated) """
     
     def setUp(self):
+        login_buckets.clear()
         self.client = APIClient()
     
     def test_create_user_success(self) :
@@ -139,5 +152,123 @@ class PrivetUserApiTest (TestCase):
         self.assertEqual(self.user.username,payload['username'])
         self.assertTrue(self.user.check_password(payload['password']))
         self.assertEqual(res.status_code,status.HTTP_200_OK)
-        
-        
\ No newline at end of file
+
+
+class LoginThrottleTest(TestCase):
+    """Test the login rate limits and password rehashing"""
+
+    def setUp(self):
+        login_buckets.clear()
+        self.client = APIClient()
+        self.user = create_user(email="user@example.com", password="pass123")
+
+    @override_settings(LOGIN_RATE_LIMIT={
+        "EMAIL_BURST": 2, "EMAIL_PER_MINUTE": 1,
+        "IP_BURST": 100, "IP_PER_MINUTE": 100, "MAXSIZE": 100,
+    })
+    def test_email_limited(self):
+        """Test attempts past the burst for one email get 429"""
+        payload = {"email": "User@example.com", "password": "wrong"}
+        for _ in range(2):
+            res = self.client.post(TOKEN_URL, payload)
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        res = self.client.post(TOKEN_URL, payload)
+        other = self.client.post(
+            TOKEN_URL, {"email": "other@example.com", "password": "x"}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(res["Retry-After"], "60")
+        self.assertEqual(other.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(LOGIN_RATE_LIMIT={
+        "EMAIL_BURST": 100, "EMAIL_PER_MINUTE": 100,
+        "IP_BURST": 1, "IP_PER_MINUTE": 1, "MAXSIZE": 100,
+    })
+    def test_ip_limited(self):
+        """Test one client cycling through emails is still limited"""
+        self.client.post(
+            TOKEN_URL, {"email": "a@example.com", "password": "x"}
+        )
+
+        res = self.client.post(
+            TOKEN_URL, {"email": "b@example.com", "password": "x"}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    @override_settings(LOGIN_RATE_LIMIT={
+        "EMAIL_BURST": 100, "EMAIL_PER_MINUTE": 100,
+        "IP_BURST": 1, "IP_PER_MINUTE": 1, "MAXSIZE": 100,
+    })
+    def test_ip_limit_ignores_forged_forwarded_for(self):
+        """Test a client cannot get a new IP bucket from X-Forwarded-For"""
+        # The client's header, then the address nginx appended
+        for i, forged in enumerate(["1.1.1.1", "2.2.2.2", "3.3.3.3"]):
+            res = self.client.post(
+                TOKEN_URL,
+                {"email": f"{i}@example.com", "password": "x"},
+                HTTP_X_FORWARDED_FOR=f"{forged}, 203.0.113.7",
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_login_rehashes_password(self):
+        """Test a login upgrades a PBKDF2 hash to the preferred hasher"""
+        self.user.password = make_password("pass123", hasher="pbkdf2_sha256")
+        self.user.save()
+
+        res = self.client.post(
+            TOKEN_URL, {"email": "user@example.com", "password": "pass123"}
+        )
+
+        self.user.refresh_from_db()
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(identify_hasher(self.user.password).algorithm,
+                         "scrypt")
+
+
+class AsyncTokenViewTest(TransactionTestCase):
+    """Test the ASGI token view; it authenticates on its own threads and
+    connections, so data has to be committed"""
+
+    def setUp(self):
+        login_buckets.clear()
+
+    async def test_async_token_view(self):
+        """Test the ASGI token view issues the same token as the sync one"""
+        user = await get_user_model().objects.acreate(email="a@example.com")
+        user.set_password("pass123")
+        await user.asave()
+        factory = AsyncRequestFactory()
+        view = AsyncTokenView.as_view()
+
+        res = await view(factory.post(
+            TOKEN_URL, {"email": "a@example.com", "password": "pass123"}
+        ))
+        bad = await view(factory.post(
+            TOKEN_URL, {"email": "a@example.com", "password": "wrong"}
+        ))
+
+        token = await Token.objects.aget(user=user)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(res.content), {"token": token.key})
+        self.assertEqual(bad.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("non_field_errors", json.loads(bad.content))
+
+    @override_settings(LOGIN_RATE_LIMIT={
+        "EMAIL_BURST": 1, "EMAIL_PER_MINUTE": 1,
+        "IP_BURST": 100, "IP_PER_MINUTE": 100, "MAXSIZE": 100,
+    })
+    async def test_async_token_view_limited(self):
+        """Test the ASGI token view applies the login rate limit"""
+        factory = AsyncRequestFactory()
+        view = AsyncTokenView.as_view()
+        payload = {"email": "a@example.com", "password": "wrong"}
+
+        await view(factory.post(TOKEN_URL, payload))
+        res = await view(factory.post(TOKEN_URL, payload))
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(res["Retry-After"], "60")
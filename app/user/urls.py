@@ -1,10 +1,20 @@
+from django.conf import settings
 from  django.urls import path
-from .views import CreateUserView, TokenView , ManagerUserView
+from .views import (
+    AsyncTokenView,
+    CreateUserView,
+    ManagerUserView,
+    RefreshTokenView,
+    TokenView,
+)
 
 app_name="user" # use for reverse url in testing.
 
 urlpatterns = [
     path("create/",CreateUserView.as_view(),name="create"),
-    path('token/',TokenView.as_view(),name='token'),
+    path('token/',
+         (AsyncTokenView if settings.ASYNC_VIEWS else TokenView).as_view(),
+         name='token'),
+    path('token/refresh/', RefreshTokenView.as_view(), name='token-refresh'),
     path('me/',ManagerUserView.as_view(),name='me')
 ]
@@ -1,10 +1,24 @@
 """
 View for user API ,
 """
-from rest_framework import generics, authentication , permissions
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection
+from rest_framework import generics, permissions, status
+from rest_framework.exceptions import Throttled
 from rest_framework.authtoken.views import ObtainAuthToken
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.views import APIView
 from rest_framework.settings import api_settings
 
+from core.async_views import AsyncAPIView
+from core.authentication import CachedTokenAuthentication
+from core.throttling import LoginRateThrottle
+from core.tokens import aissue_token, issue_token, rotate_token
+
 from .serializers import (
     UserSerializer,
     AuthTokenSerializer
@@ -19,10 +33,70 @@ class TokenView(ObtainAuthToken):
     """Create the new token for the user"""
     serializer_class = AuthTokenSerializer
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES # use the default render
-    
+    throttle_classes = [LoginRateThrottle]
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.serializer_class(
+            data=request.data, context={"request": request}
+        )
+        serializer.is_valid(raise_exception=True)
+        return Response(
+            {"token": issue_token(serializer.validated_data["user"])}
+        )
+
+
+login_executor = ThreadPoolExecutor(
+    settings.LOGIN_THREADS, thread_name_prefix="login"
+)
+
+
+def validate_login(serializer):
+    """Run authenticate() on a login thread. No request signals recycle
+    the thread's connection, so close it afterwards."""
+    try:
+        return serializer.is_valid()
+    finally:
+        connection.close()
+
+
+class AsyncTokenView(AsyncAPIView):
+    """TokenView for the ASGI deployment, using the async ORM"""
+    parser_classes = ObtainAuthToken.parser_classes
+    throttle_classes = TokenView.throttle_classes
+
+    async def post(self, request, *args, **kwargs):
+        drf_request = Request(
+            request, parsers=[parser() for parser in self.parser_classes]
+        )
+        for throttle in [throttle() for throttle in self.throttle_classes]:
+            if not throttle.allow_request(drf_request, self):
+                raise Throttled(throttle.wait())
+        serializer = AuthTokenSerializer(
+            data=drf_request.data, context={"request": drf_request}
+        )
+        # authenticate() has no async API, and hashing on the worker's
+        # shared sync thread would hold up every other sync call.
+        valid = sync_to_async(
+            validate_login, thread_sensitive=False, executor=login_executor
+        )
+        if not await valid(serializer):
+            return self.render(serializer.errors, status.HTTP_400_BAD_REQUEST)
+        token = await aissue_token(serializer.validated_data["user"])
+        return self.render({"token": token})
+
+
+class RefreshTokenView(APIView):
+    """Replace the caller's token with a new one"""
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        return Response({"token": rotate_token(request.user)})
+
+
 class ManagerUserView (generics.RetrieveUpdateAPIView):
     serializer_class = UserSerializer
-    authentication_classes = [authentication.TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [permissions.IsAuthenticated]
     
     
@@ -0,0 +1,4 @@
+uwsgi_pass              ${APP_HOST}:${APP_PORT};
+include                 /etc/nginx/uwsgi_params;
+# Replaces the client's header, so the last entry is always ours.
+uwsgi_param             HTTP_X_FORWARDED_FOR $proxy_add_x_forwarded_for;
@@ -5,9 +5,21 @@ server {
         alias /vol/static;
     } 
 
+    # Recipe images are named by the SHA-256 of their content, so a URL
+    # always serves the same bytes.
+    location /static/media/uploads/recipe/ {
+        alias /vol/static/media/uploads/recipe/;
+        add_header Cache-Control "public, max-age=31536000, immutable";
+    }
+
+    # Password hashing; served by the login workers under uWSGI
+    location = /api/user/token/ {
+        include                 /etc/nginx/login_pass.conf;
+    }
+
     location / {
-        uwsgi_pass              ${APP_HOST}:${APP_PORT};
-        include                 /etc/nginx/uwsgi_params;
+        # uWSGI or HTTP upstream, rendered by run.sh for SERVER_MODE
+        include                 /etc/nginx/app_pass.conf;
         client_max_body_size    10M;
     }
 }
@@ -2,5 +2,12 @@
  
 set -e 
 envsubst '${LISTEN_PORT} ${APP_HOST} ${APP_PORT}' < /etc/nginx/default.conf.tpl > /etc/nginx/conf.d/default.conf
+envsubst '${APP_HOST} ${APP_PORT}' < /etc/nginx/app_pass_${SERVER_MODE}.conf.tpl > /etc/nginx/app_pass.conf
 
-nginx -g "daemon off;"
\ No newline at end of file
+# uvicorn hashes on its own threads, so there is no separate login port
+if [ "$SERVER_MODE" = "wsgi" ]; then
+    export APP_PORT="$APP_LOGIN_PORT"
+fi
+envsubst '${APP_HOST} ${APP_PORT}' < /etc/nginx/app_pass_${SERVER_MODE}.conf.tpl > /etc/nginx/login_pass.conf
+
+nginx -g "daemon off;"
@@ -6,4 +6,26 @@ python manage.py wait_for_db
 python manage.py collectstatic --noinput
 python manage.py migrate
 
-uwsgi --socket :9000 --workers 4 --master --enable-threads --module app.wsgi
+# Per-worker metrics files of a previous run would be counted again.
+rm -rf "${METRICS_DIR:-/tmp/api-metrics}"
+
+if [ "${SERVER_MODE:-wsgi}" = "asgi" ]; then
+    exec uvicorn app.asgi:application --host 0.0.0.0 --port 9000 \
+        --workers "${WEB_WORKERS:-4}" --proxy-headers --forwarded-allow-ips '*'
+fi
+
+# Logins hash passwords, so they get their own workers on port 9001 and
+# a burst of them cannot take every API worker on port 9000.
+WEB_WORKERS="${WEB_WORKERS:-4}"
+LOGIN_WORKERS="${LOGIN_WORKERS:-1}"
+ALL_WORKERS=$((WEB_WORKERS + LOGIN_WORKERS))
+
+# API rate limit counters (core.throttling) live in a shared memory
+# cache, so every worker sees the same counts.
+THROTTLE_CACHE="name=throttle,items=${THROTTLE_CACHE_ITEMS:-100000},blocksize=8"
+
+uwsgi --socket :9000 --socket :9001 --workers "$ALL_WORKERS" \
+    --map-socket "0:$(seq -s, 1 "$WEB_WORKERS")" \
+    --map-socket "1:$(seq -s, $((WEB_WORKERS + 1)) "$ALL_WORKERS")" \
+    --cache2 "$THROTTLE_CACHE" \
+    --master --enable-threads --module app.wsgi